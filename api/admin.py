@@ -5,7 +5,8 @@ from .models import (
     Order, OrderItem, Patient, Allergy, MedicalHistory, PastProcedure,
     PatientVisit, Vitals, Medication, Prescription,
     AdverseDrugReaction, AdverseEventFollowingImmunization,
-    OrderHistory, PaymentTransaction, InventoryHistory
+    OrderHistory, PaymentTransaction, InventoryHistory, ReportJob, PharmacovigilanceSignal, ChangeLogEntry,
+    RevokedToken
 )
 
 @admin.register(User)
@@ -45,6 +46,26 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'order_date', 'status', 'total_amount', 'patient']
     list_filter = ['status', 'order_date']
 
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'report_type', 'status', 'requested_by', 'created_at', 'completed_at']
+    list_filter = ['report_type', 'status']
+
+@admin.register(PharmacovigilanceSignal)
+class PharmacovigilanceSignalAdmin(admin.ModelAdmin):
+    list_display = ['product_name', 'reaction_term', 'source', 'case_count', 'prr', 'ror_lower', 'detected_at']
+    list_filter = ['source']
+    search_fields = ['product_name', 'reaction_term']
+
+@admin.register(ChangeLogEntry)
+class ChangeLogEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model', 'object_id', 'action', 'facility_id', 'changed_at']
+    list_filter = ['model', 'action']
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['jti', 'user_id', 'revoked_at', 'expires_at']
+
 @admin.register(Prescription)
 class PrescriptionAdmin(admin.ModelAdmin):
     list_display = ['patient_visit', 'medication', 'dosage', 'is_dispensed']
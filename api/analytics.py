@@ -0,0 +1,114 @@
+# healthlink-backend/api/analytics.py
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce, PercentRank, Rank
+from django.utils import timezone
+
+from .models import Facility, InventoryHistory, PatientVisit, PaymentTransaction
+
+
+# Metrics compared across facilities. Rank 1 is the facility with the highest value.
+FACILITY_METRICS = ('stock_outs', 'dispensing_volume', 'revenue', 'visits')
+
+
+def count_subquery(queryset):
+    """
+    Correlated COUNT(*) over `queryset`, usable as an annotation on the outer row.
+    """
+    return Coalesce(Subquery(
+        queryset.order_by().annotate(_group=Value(1)).values('_group').annotate(_count=Count('id')).values('_count')
+    ), 0)
+
+
+def sum_subquery(queryset, field):
+    """
+    Correlated SUM(field) over `queryset` (a field name or expression), zero when nothing matches.
+    """
+    return Coalesce(Subquery(
+        queryset.order_by().annotate(_group=Value(1)).values('_group').annotate(_sum=Sum(field)).values('_sum')
+    ), Value(Decimal('0.00')))
+
+
+def period_bounds(start_date, end_date):
+    """
+    Aware [start, end) datetimes covering the given dates inclusively.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def facility_metric_annotations(start_date, end_date):
+    start, end = period_bounds(start_date, end_date)
+    dispensed = InventoryHistory.objects.filter(
+        stock_item__facility=OuterRef('pk'), transaction_type='Out',
+        transaction_date__gte=start, transaction_date__lt=end
+    )
+    return {
+        'stock_outs': count_subquery(dispensed.filter(new_stock_level__lte=0)),
+        'dispensing_volume': sum_subquery(dispensed, F('quantity_change') * -1), # 'Out' rows are negative
+        'revenue': sum_subquery(PaymentTransaction.objects.filter(
+            processed_by__facility=OuterRef('pk'), transaction_date__gte=start, transaction_date__lt=end
+        ), 'amount'),
+        'visits': count_subquery(PatientVisit.objects.filter(
+            facility=OuterRef('pk'), visit_date__gte=start, visit_date__lt=end
+        )),
+    }
+
+
+def _facility_queryset(facility_ids):
+    queryset = Facility.objects.all()
+    if facility_ids is not None:
+        queryset = queryset.filter(pk__in=facility_ids)
+    return queryset
+
+
+def compare_facilities_with_windows(start_date, end_date, facility_ids=None):
+    """
+    Per-facility metrics with ranks and percentiles computed by the database.
+    """
+    windows = {}
+    for metric in FACILITY_METRICS:
+        windows[f'{metric}_rank'] = Window(Rank(), order_by=F(metric).desc())
+        windows[f'{metric}_percentile'] = Window(PercentRank(), order_by=F(metric).asc())
+    rows = _facility_queryset(facility_ids).annotate(
+        **facility_metric_annotations(start_date, end_date)
+    ).annotate(**windows).values('id', 'name', *FACILITY_METRICS, *windows).order_by('name')
+    return list(rows)
+
+
+def rank_rows(rows):
+    """
+    Adds RANK() (descending) and PERCENT_RANK() (ascending) for every metric,
+    matching what the database window functions return.
+    """
+    total = len(rows)
+    for metric in FACILITY_METRICS:
+        values = [row[metric] for row in rows]
+        for row in rows:
+            value = row[metric]
+            row[f'{metric}_rank'] = 1 + sum(1 for other in values if other > value)
+            below = sum(1 for other in values if other < value)
+            row[f'{metric}_percentile'] = below / (total - 1) if total > 1 else 0.0
+    return sorted(rows, key=lambda row: row['name'])
+
+
+def compare_facilities_ranked_in_python(start_date, end_date, facility_ids=None):
+    """
+    Fallback for backends without window functions: the per-facility metrics
+    come from the same single query, and the ranks are computed here.
+    """
+    rows = _facility_queryset(facility_ids).annotate(
+        **facility_metric_annotations(start_date, end_date)
+    ).values('id', 'name', *FACILITY_METRICS)
+    return rank_rows(list(rows))
+
+
+def compare_facilities(start_date, end_date, facility_ids=None):
+    if connection.features.supports_over_clause:
+        return compare_facilities_with_windows(start_date, end_date, facility_ids)
+    return compare_facilities_ranked_in_python(start_date, end_date, facility_ids)
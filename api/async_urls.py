@@ -0,0 +1,29 @@
+# api/async_urls.py
+#
+# Async variants of the read-heavy endpoints, mounted ahead of api.urls by the
+# ASGI profile (healthlink_backend.asgi_urls). Paths and names match the
+# synchronous routes they replace; writes on them still run the synchronous code.
+
+from django.urls import path, include
+from rest_framework.routers import SimpleRouter
+
+from .async_views import (
+    AsyncStockItemViewSet, AsyncPatientListCreateView, AsyncPatientRetrieveUpdateDestroyView,
+    AsyncStockLevelReportView, AsyncMedicationUsageReportView, AsyncExpiringMedicationsReportView,
+    AsyncInsuranceDispensingReportView
+)
+
+router = SimpleRouter()
+router.register(r'stockitems', AsyncStockItemViewSet, basename='stockitem')
+
+urlpatterns = [
+    path('patients/', AsyncPatientListCreateView.as_view(), name='patient-list-create'),
+    path('patients/<int:pk>/', AsyncPatientRetrieveUpdateDestroyView.as_view(), name='patient-detail'),
+
+    path('reports/stock-level/', AsyncStockLevelReportView.as_view(), name='stock-level-report'),
+    path('reports/medication-usage/', AsyncMedicationUsageReportView.as_view(), name='medication-usage-report'),
+    path('reports/expiring-medications/', AsyncExpiringMedicationsReportView.as_view(), name='expiring-medications-report'),
+    path('reports/insurance-dispensing/', AsyncInsuranceDispensingReportView.as_view(), name='insurance-dispensing-report'),
+
+    path('', include(router.urls)),
+]
@@ -0,0 +1,196 @@
+# healthlink-backend/api/async_views.py
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .conditional import ConditionalGetMixin, make_etag
+from .pagination import apaginate_page_number
+from .report_cache import cached_report
+from .views import (
+    StockItemViewSet, PatientListCreateView, PatientRetrieveUpdateDestroyView,
+    StockLevelReportView, MedicationUsageReportView, ExpiringMedicationsReportView,
+    InsuranceDispensingReportView, parse_report_date_range
+)
+
+
+async def aserialize(serializer):
+    # Rendering runs in the request's worker thread: it doesn't hold up the event
+    # loop, and a relation the queryset didn't load can still be fetched lazily.
+    return await sync_to_async(lambda: serializer.data)()
+
+
+class AsyncAPIViewMixin:
+    """
+    Serves a DRF view's `async def` handlers as a native async view under ASGI.
+
+    Authentication, permission and throttle checks may query the database, so
+    they run in a thread before the handler is awaited. Methods the view
+    still handles synchronously (writes, OPTIONS) go through DRF's regular
+    dispatch in a thread, so a variant only overrides the handlers it makes
+    async and keeps the rest of its base view.
+    """
+    view_is_async = True
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        # ViewSetMixin builds its own view function, which Django doesn't mark as async.
+        return markcoroutinefunction(super().as_view(*args, **kwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None) if method in self.http_method_names else None
+        if not iscoroutinefunction(handler):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def afilter_queryset(self):
+        # Filter backends may validate their params against the database.
+        return await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+
+    def is_conditional(self):
+        return isinstance(self, ConditionalGetMixin) and self._has_conditional_field()
+
+
+class AsyncListModelMixin:
+    """
+    ListModelMixin.list() on the async ORM, with page-number pagination and the
+    conditional GET handling of ConditionalGetMixin. Other paginators fall back
+    to the view's synchronous list() in a thread.
+    """
+    async def list(self, request, *args, **kwargs):
+        paginator = self.paginator
+        if paginator is not None and not isinstance(paginator, PageNumberPagination):
+            return await sync_to_async(super().list)(request, *args, **kwargs)
+
+        queryset = await self.afilter_queryset()
+        etag = last_modified = count = None
+        if self.is_conditional():
+            state = await queryset.order_by().aaggregate(last_modified=Max(self.conditional_field), count=Count('pk'))
+            count, last_modified = state['count'], state['last_modified']
+            etag = make_etag(request, count, last_modified)
+            response = self.precondition_response(request, etag, last_modified)
+            if response is not None:
+                return self.set_validators(response, etag, last_modified)
+        elif paginator is not None:
+            count = await queryset.acount()
+
+        page = None
+        if paginator is not None:
+            page = await apaginate_page_number(paginator, queryset, request, count)
+        if page is not None:
+            response = self.get_paginated_response(await aserialize(self.get_serializer(page, many=True)))
+        else:
+            rows = [row async for row in queryset]
+            response = Response(await aserialize(self.get_serializer(rows, many=True)))
+        return self.set_validators(response, etag, last_modified) if etag else response
+
+
+class AsyncRetrieveModelMixin:
+    """
+    RetrieveModelMixin.retrieve() with the object read by aget().
+    """
+    async def aget_object(self):
+        queryset = await self.afilter_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        await sync_to_async(self.check_object_permissions)(self.request, instance)
+        return instance
+
+    async def retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        if not self.is_conditional():
+            return Response(await aserialize(self.get_serializer(instance)))
+
+        last_modified = getattr(instance, self.conditional_field)
+        etag = make_etag(request, instance.pk, last_modified)
+        response = self.precondition_response(request, etag, last_modified)
+        if response is None:
+            response = Response(await aserialize(self.get_serializer(instance)))
+        return self.set_validators(response, etag, last_modified)
+
+
+# --- StockItem Views ---
+class AsyncStockItemViewSet(AsyncAPIViewMixin, AsyncListModelMixin, AsyncRetrieveModelMixin, StockItemViewSet):
+    pass
+
+
+# --- Patient Views ---
+class AsyncPatientListCreateView(AsyncAPIViewMixin, AsyncListModelMixin, PatientListCreateView):
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
+
+
+class AsyncPatientRetrieveUpdateDestroyView(AsyncAPIViewMixin, AsyncRetrieveModelMixin, PatientRetrieveUpdateDestroyView):
+    async def get(self, request, *args, **kwargs):
+        return await self.retrieve(request, *args, **kwargs)
+
+
+# --- Inventory Reporting ---
+class AsyncStockLevelReportView(AsyncAPIViewMixin, StockLevelReportView):
+    @cached_report
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.astream_export(queryset, export_format)
+        return await sync_to_async(self.stock_level_response)([item async for item in queryset])
+
+
+class AsyncMedicationUsageReportView(AsyncAPIViewMixin, MedicationUsageReportView):
+    @cached_report
+    async def get(self, request, *args, **kwargs):
+        usage_data = self.get_usage_queryset(*parse_report_date_range(request.query_params))
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.astream_export(usage_data, export_format)
+        return self.usage_response([row async for row in usage_data])
+
+
+class AsyncExpiringMedicationsReportView(AsyncAPIViewMixin, ExpiringMedicationsReportView):
+    @cached_report
+    async def get(self, request, *args, **kwargs):
+        bucket = self.get_bucket(request)
+        queryset = self.get_queryset()
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.astream_export(queryset, export_format)
+
+        if bucket:
+            page = await self.paginator.apaginate_counted_queryset(queryset, request, await queryset.acount(), view=self)
+            return self.get_paginated_response(await aserialize(self.get_serializer(page, many=True)))
+        return self.bucket_summary_response([row async for row in self.get_bucket_summary_rows(queryset)])
+
+
+class AsyncInsuranceDispensingReportView(AsyncAPIViewMixin, InsuranceDispensingReportView):
+    @cached_report
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_request_queryset(request)
+        rows = self.get_report_rows(queryset)
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.astream_export(rows, export_format)
+
+        totals = await queryset.aaggregate(**self.get_total_aggregates())
+        page = await self.paginator.apaginate_counted_queryset(rows, request, totals.pop('transaction_count'), view=self)
+        response = self.get_paginated_response(page)
+        response.data['totals'] = totals
+        return response
@@ -0,0 +1,225 @@
+# healthlink-backend/api/authentication.py
+
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import RevokedToken, Role
+
+
+# Loaded with the user, so role checks and facility scoping don't query again.
+USER_RELATIONS = ('role', 'facility')
+
+# Claims a token needs to be authenticated without loading its user (JWT_STATELESS_AUTH).
+USER_CLAIMS = ('username', 'is_superuser', 'role_id', 'role', 'facility_id')
+# User fields behind those claims.
+USER_CLAIM_FIELDS = ('username', 'is_superuser', 'is_active', 'role_id', 'facility_id')
+# Changing one of these revokes the user's tokens: stateless tokens are never
+# checked against the password hash, so a new password has to revoke them too.
+TOKEN_REVOKING_FIELDS = (*USER_CLAIM_FIELDS, 'password')
+# Issue time in fractional epoch seconds. iat is whole seconds, which can't
+# tell a token issued just before a revocation from one issued just after it.
+ISSUED_AT_CLAIM = 'issued_at'
+
+
+def user_queryset():
+    return get_user_model()._default_manager.select_related(*USER_RELATIONS)
+
+
+def add_user_claims(token, user):
+    """
+    Signs the user's name, role, facility and super admin flag into `token`,
+    and the time it's issued at to the microsecond.
+    """
+    token[ISSUED_AT_CLAIM] = token.current_time.timestamp()
+    token['username'] = user.username
+    token['is_superuser'] = user.is_superuser
+    token['role_id'] = user.role_id
+    token['role'] = user.role.name if user.role_id else None
+    token['facility_id'] = user.facility_id
+    return token
+
+
+def _as_saved(instance):
+    # Marks an instance built from claims as an existing row, so it can be
+    # assigned to foreign keys like one loaded from the database.
+    instance._state.adding = False
+    instance._state.db = router.db_for_read(type(instance))
+    return instance
+
+
+def claims_user(validated_token):
+    """
+    A User built from the token's claims, without a query. Only the claimed
+    fields are set: it's meant for permission checks and facility scoping
+    and must never be saved. user.facility is still loaded on first access.
+    """
+    user_model = get_user_model()
+    user = user_model(
+        # simplejwt may sign the id as a string.
+        pk=user_model._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM]), username=validated_token['username'],
+        is_superuser=validated_token['is_superuser'], is_active=True, facility_id=validated_token['facility_id'],
+    )
+    if validated_token['role_id'] is not None:
+        user.role = _as_saved(Role(id=validated_token['role_id'], name=validated_token['role']))
+    return _as_saved(user)
+
+
+# --- Token denylist ---
+# Each process keeps the unexpired RevokedToken rows in memory and reloads
+# them every JWT_DENYLIST_REFRESH_SECONDS, so checking a token costs no query
+# and a revocation made by another process applies within that delay.
+_denylist_lock = threading.Lock()
+_denylist = (None, frozenset(), {}) # (monotonic load time, revoked jtis, {str(user id): revoked up to, fractional epoch seconds})
+
+
+def get_token_denylist():
+    global _denylist
+    max_age = getattr(settings, 'JWT_DENYLIST_REFRESH_SECONDS', 30)
+    if _denylist[0] is None or time.monotonic() - _denylist[0] >= max_age:
+        with _denylist_lock:
+            if _denylist[0] is None or time.monotonic() - _denylist[0] >= max_age:
+                loaded_at, jtis, users = time.monotonic(), set(), {}
+                rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', 'user_id', 'revoked_at')
+                for jti, user_id, revoked_at in rows:
+                    if jti:
+                        jtis.add(jti)
+                    else:
+                        users[str(user_id)] = max(users.get(str(user_id), 0), revoked_at.timestamp())
+                _denylist = (loaded_at, frozenset(jtis), users)
+    return _denylist[1:]
+
+
+def reload_token_denylist():
+    global _denylist
+    _denylist = (None, *_denylist[1:])
+
+
+def is_token_revoked(token):
+    jtis, users = get_token_denylist()
+    if token.get(api_settings.JTI_CLAIM) in jtis:
+        return True
+    # simplejwt may sign the user id as a string.
+    revoked_up_to = users.get(str(token.get(api_settings.USER_ID_CLAIM)))
+    if revoked_up_to is None:
+        return False
+    # Tokens without the exact issue time count as issued at the start of their
+    # iat second, so one issued in the second of a revocation is revoked.
+    return token.get(ISSUED_AT_CLAIM, token.get('iat', 0)) < revoked_up_to
+
+
+def _denylist_changed():
+    # Expired entries can go; nothing references them, so without loading them first.
+    expired = RevokedToken.objects.filter(expires_at__lte=timezone.now())
+    expired._raw_delete(expired.db)
+    reload_token_denylist()
+    transaction.on_commit(reload_token_denylist)
+
+
+def revoke_token(token):
+    """
+    Revokes one access or refresh token until it expires.
+    """
+    RevokedToken.objects.get_or_create(jti=token[api_settings.JTI_CLAIM], defaults={
+        'user_id': token.get(api_settings.USER_ID_CLAIM),
+        'expires_at': datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+    })
+    _denylist_changed()
+
+
+def revoke_user_tokens(user_ids):
+    """
+    Revokes every token issued to the users so far, e.g. because the role or
+    facility their tokens claim has changed.
+    """
+    revoked_at = timezone.now()
+    expires_at = revoked_at + max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    RevokedToken.objects.bulk_create([
+        RevokedToken(user_id=user_id, revoked_at=revoked_at, expires_at=expires_at) for user_id in user_ids
+    ])
+    _denylist_changed()
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues token pairs carrying the user's role, facility and super admin
+    flag, so JWT_STATELESS_AUTH can authenticate them without a query.
+    """
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuses revoked refresh tokens and signs the user's current role and
+    facility into the new access token.
+    """
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_token_revoked(refresh):
+            raise InvalidToken(_("Token has been revoked"))
+        data = super().validate(attrs)
+        user = user_queryset().get(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+        data['access'] = str(add_user_claims(AccessToken(data['access']), user))
+        return data
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    simplejwt's JWTAuthentication, refusing revoked tokens and loading the
+    user's role and facility in the same query as the user. With
+    JWT_STATELESS_AUTH, tokens carrying the user claims are authenticated
+    from those alone; older tokens still load the user.
+    """
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_("Token has been revoked"))
+        return validated_token
+
+    def get_user(self, validated_token):
+        if getattr(settings, 'JWT_STATELESS_AUTH', False) and all(claim in validated_token for claim in USER_CLAIMS):
+            return claims_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = user_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class SelectRelatedModelBackend(ModelBackend):
+    """
+    Django's ModelBackend, loading a session user's role and facility in the
+    same query as the user.
+    """
+    def get_user(self, user_id):
+        try:
+            user = user_queryset().get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
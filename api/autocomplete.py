@@ -0,0 +1,137 @@
+# healthlink-backend/api/autocomplete.py
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Medication, StockItem
+from .search import search_tokens
+
+
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+VERSION_KEY = 'autocomplete:version'
+
+# Indexed models: result key -> (model, facility id lookup, filters).
+AUTOCOMPLETE_SOURCES = {
+    'stock_items': (StockItem, 'facility_id', {'is_active': True}),
+    'medications': (Medication, 'stock_item__facility_id', {}),
+}
+SOURCES_BY_MODEL = {model: source for source, (model, _, _) in AUTOCOMPLETE_SOURCES.items()}
+
+
+def get_autocomplete_version():
+    # Starts from the clock rather than 1, so a cache that was cleared or
+    # restarted can't hand out a version an older index was built at.
+    return cache.get_or_set(VERSION_KEY, time.time_ns, timeout=None)
+
+
+def bump_autocomplete_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        pass # Not set yet: the next lookup starts a fresh version
+
+
+def invalidate_autocomplete():
+    """
+    Marks every process's index stale now and again once the current
+    transaction commits, so an index rebuilt from the uncommitted state
+    isn't kept.
+    """
+    bump_autocomplete_version()
+    transaction.on_commit(bump_autocomplete_version)
+
+
+class PrefixIndex:
+    """
+    (normalised name, id, facility id, name) entries sorted by name. Each word
+    of a name starts an entry of its own, so 'amox' finds 'Co-amoxiclav'.
+    """
+    def __init__(self, rows):
+        self.rows = {} # id -> (name, facility id)
+        entries = []
+        for pk, name, facility_id in rows:
+            self.rows[pk] = (name, facility_id)
+            tokens = search_tokens(name)
+            for start in range(len(tokens)):
+                entries.append((' '.join(tokens[start:]), pk, facility_id, name))
+        entries.sort()
+        self.entries = entries
+        self.keys = [entry[0] for entry in entries]
+
+    def lookup(self, query, limit, facility_id=None):
+        """
+        Up to `limit` {id, name, facility} matches in name order. With a
+        facility, only its own entries and the shared ones (no facility).
+        """
+        prefix = ' '.join(search_tokens(query))
+        if not prefix:
+            return []
+        results, seen = [], set()
+        position = bisect_left(self.keys, prefix)
+        while position < len(self.keys) and len(results) < limit and self.keys[position].startswith(prefix):
+            _, pk, entry_facility_id, name = self.entries[position]
+            position += 1
+            if pk in seen or (facility_id is not None and entry_facility_id not in (facility_id, None)):
+                continue
+            seen.add(pk)
+            results.append({'id': pk, 'name': name, 'facility': entry_facility_id})
+        return results
+
+
+_build_lock = threading.Lock()
+_state = (None, {}) # (version, {source: PrefixIndex}) of this process
+
+
+def get_autocomplete_indexes():
+    """
+    This process's indexes, rebuilt with one query per model when a write
+    has bumped the shared version since they were built.
+    """
+    global _state
+    version = get_autocomplete_version()
+    if _state[0] != version:
+        with _build_lock:
+            if _state[0] != version:
+                indexes = {}
+                for source, (model, facility_lookup, filters) in AUTOCOMPLETE_SOURCES.items():
+                    rows = model.objects.filter(**filters).values_list('pk', 'name', facility_lookup)
+                    indexes[source] = PrefixIndex(rows.iterator())
+                _state = (version, indexes)
+    return _state[1]
+
+
+def _indexed_row(source, instance):
+    # (name, facility id) the index would hold for `instance`, or None if it's left out.
+    _, facility_lookup, filters = AUTOCOMPLETE_SOURCES[source]
+    if any(getattr(instance, field) != value for field, value in filters.items()):
+        return None
+    facility_id = instance
+    for attr in facility_lookup.split('__'):
+        facility_id = getattr(facility_id, attr, None)
+    return (instance.name, facility_id)
+
+
+def autocomplete_row_changed(instance):
+    """
+    False if this process's index is current and already matches `instance`
+    as saved, e.g. after a dispense that only changed the stock level, so
+    the write needn't make every process rebuild.
+    """
+    version, indexes = _state
+    source = SOURCES_BY_MODEL.get(type(instance))
+    if source is None or version is None or version != get_autocomplete_version():
+        return True
+    return indexes[source].rows.get(instance.pk) != _indexed_row(source, instance)
+
+
+def autocomplete(query, limit=DEFAULT_AUTOCOMPLETE_LIMIT, facility_id=None):
+    return {
+        source: index.lookup(query, limit, facility_id)
+        for source, index in get_autocomplete_indexes().items()
+    }
@@ -0,0 +1,146 @@
+# healthlink-backend/api/batch.py
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+from django.urls import Resolver404, resolve, reverse
+
+
+READ_ONLY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+ALLOWED_METHODS = READ_ONLY_METHODS | {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+# Parent request META that describes the batch request itself rather than its parts.
+BATCH_ONLY_META = {
+    'QUERY_STRING', 'CONTENT_TYPE', 'CONTENT_LENGTH',
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE',
+}
+
+# Sub-response headers passed back to the client.
+RETURNED_HEADERS = ('ETag', 'Last-Modified', 'Location')
+
+
+class SubRequestError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def build_subrequest(request, spec):
+    """
+    Returns (resolver match, request) for one {method, path, body, headers} item.
+
+    The sub-request is authenticated as the batch request's user without
+    running authentication again. Raises SubRequestError for malformed items
+    and paths outside the API.
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('path'), str):
+        raise SubRequestError(400, "Each sub-request needs a path.")
+    method = str(spec.get('method', 'GET')).upper()
+    if method not in ALLOWED_METHODS:
+        raise SubRequestError(405, f'Method "{method}" not allowed.')
+
+    path, _, query = spec['path'].partition('?')
+    api_root = reverse('api-root')
+    if not path.startswith(api_root):
+        raise SubRequestError(404, f"Sub-request paths must start with {api_root}.")
+    try:
+        match = resolve('/' + path[len(api_root):], urlconf='api.urls')
+    except Resolver404:
+        raise SubRequestError(404, "Not found.")
+    if match.url_name == 'batch':
+        raise SubRequestError(400, "Batches cannot be nested.")
+
+    body = b'' if spec.get('body') is None else json.dumps(spec['body'], cls=DjangoJSONEncoder).encode()
+    environ = {key: value for key, value in request.META.items() if key not in BATCH_ONLY_META}
+    environ.update({
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query,
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': BytesIO(body),
+    })
+    if body:
+        environ['CONTENT_TYPE'] = 'application/json'
+    for name, value in (spec.get('headers') or {}).items():
+        environ['HTTP_' + str(name).upper().replace('-', '_')] = str(value)
+
+    subrequest = WSGIRequest(environ)
+    # DRF's Request authenticates with these instead of the configured authenticators.
+    subrequest._force_auth_user = request.user
+    subrequest._force_auth_token = request.auth
+    return match, subrequest
+
+
+def _response_body(response):
+    if hasattr(response, 'data'):
+        return response.data
+    if response.streaming or not response.content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return response.content.decode(response.charset)
+
+
+def run_subrequest(request, spec):
+    """
+    Dispatches one sub-request in-process and returns its {status, headers, body}.
+    """
+    try:
+        match, subrequest = build_subrequest(request, spec)
+    except SubRequestError as exc:
+        return {'status': exc.status_code, 'headers': {}, 'body': {'detail': exc.detail}}
+    try:
+        response = match.func(subrequest, *match.args, **match.kwargs)
+    except Exception:
+        # One failing sub-request must not take the rest of the batch down with it.
+        return {'status': 500, 'headers': {}, 'body': {'detail': "Internal server error."}}
+    headers = {name: response[name] for name in RETURNED_HEADERS if response.has_header(name)}
+    return {'status': response.status_code, 'headers': headers, 'body': _response_body(response)}
+
+
+def uses_in_memory_database():
+    name = str(connection.settings_dict.get('NAME') or '')
+    return connection.vendor == 'sqlite' and (name == ':memory:' or 'mode=memory' in name)
+
+
+def _is_read_only(spec):
+    return isinstance(spec, dict) and str(spec.get('method', 'GET')).upper() in READ_ONLY_METHODS
+
+
+def _run_in_worker(request, spec):
+    try:
+        return run_subrequest(request, spec)
+    finally:
+        # Worker threads get their own connections; don't leave them open.
+        connections.close_all()
+
+
+def run_batch(request, specs):
+    """
+    Runs `specs` in order on the request's thread and DB connection. With
+    BATCH_MAX_WORKERS above 1, consecutive read-only sub-requests run side by
+    side in a thread pool instead; writes still run alone and in order.
+    """
+    max_workers = getattr(settings, 'BATCH_MAX_WORKERS', 1)
+    if max_workers <= 1 or uses_in_memory_database():
+        # A worker thread could not see an in-memory database (or an open test transaction).
+        return [run_subrequest(request, spec) for spec in specs]
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        index = 0
+        while index < len(specs):
+            end = index
+            while end < len(specs) and _is_read_only(specs[end]):
+                end += 1
+            if end > index:
+                results.extend(executor.map(partial(_run_in_worker, request), specs[index:end]))
+                index = end
+            else:
+                results.append(run_subrequest(request, specs[index]))
+                index += 1
+    return results
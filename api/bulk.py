@@ -0,0 +1,170 @@
+# healthlink-backend/api/bulk.py
+
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers, status
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+
+from .sync import record_changes
+
+
+class PrefetchedPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that resolves keys from objects loaded up front with
+    one in_bulk() query, instead of one query per item.
+    """
+    def __init__(self, objects=None, **kwargs):
+        self.objects = objects or {}
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.objects:
+            self.fail('does_not_exist', pk_value=data)
+        return self.objects[pk]
+
+
+def _unique_field_sets(model):
+    # Single-column unique fields and unique_together sets, as tuples of field names.
+    field_sets = [(field.name,) for field in model._meta.concrete_fields if field.unique and not field.primary_key]
+    field_sets.extend(tuple(names) for names in model._meta.unique_together)
+    return field_sets
+
+
+class BulkCreateMixin:
+    """
+    Lets a list-create endpoint accept a JSON array as well as a single object.
+
+    Items are validated one by one so that invalid ones are reported by index
+    without holding back the rest. Foreign keys are loaded with one query per
+    field and uniqueness is checked with one query per unique field set (both
+    against the database and within the payload). The valid rows are then
+    written with bulk_create(), which skips save() and model signals; views
+    that rely on those override perform_bulk_create().
+    """
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        max_items = getattr(settings, 'BULK_CREATE_MAX_ITEMS', 500)
+        if len(request.data) > max_items:
+            return Response(
+                {"detail": f"A bulk request may contain at most {max_items} items."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        valid, errors = self.validate_bulk(request.data)
+        if not valid:
+            return Response({"created": [], "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer_class = self.get_serializer_class()
+        model = serializer_class.Meta.model
+        try:
+            with transaction.atomic():
+                instances = self.perform_bulk_create([model(**data) for _, data in valid])
+                # bulk_create() skips the post_save signal that feeds the sync change log.
+                record_changes(model, instances, 'upsert')
+        except IntegrityError:
+            # Another request wrote a conflicting row after our uniqueness checks.
+            return Response(
+                {"detail": "The items conflict with records created concurrently; please retry."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        # Re-read through the view's queryset so related names load with its select_related().
+        created = self.get_queryset().in_bulk([instance.pk for instance in instances])
+        data = self.get_serializer([created[instance.pk] for instance in instances], many=True).data
+        rows = [dict(row, index=index) for (index, _), row in zip(valid, data)]
+        return Response(
+            {"created": rows, "errors": errors},
+            status=status.HTTP_207_MULTI_STATUS if errors else status.HTTP_201_CREATED
+        )
+
+    def get_bulk_child(self, items):
+        """
+        The item serializer with per-item database lookups replaced by prefetched ones.
+        """
+        child = self.get_serializer()
+        for name, field in list(child.fields.items()):
+            if type(field) is PrimaryKeyRelatedField and not field.read_only:
+                to_pk = field.get_queryset().model._meta.pk.to_python
+                pks = set()
+                for item in items:
+                    try:
+                        pks.add(to_pk(item.get(name)))
+                    except (AttributeError, TypeError, ValueError, DjangoValidationError):
+                        continue
+                pks.discard(None)
+                objects = field.get_queryset().in_bulk(pks) if pks else {}
+                field = child.fields[name] = PrefetchedPrimaryKeyRelatedField(objects=objects, **field._kwargs)
+            # Uniqueness is checked for the whole batch in validate_bulk().
+            field.validators = [validator for validator in field.validators if not isinstance(validator, UniqueValidator)]
+        child.validators = [validator for validator in child.validators if not isinstance(validator, UniqueTogetherValidator)]
+        return child
+
+    def validate_bulk(self, items):
+        """
+        Returns ([(index, validated_data)], [{"index": ..., "errors": ...}]).
+        """
+        child = self.get_bulk_child(items)
+        valid, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+
+        model = type(child).Meta.model
+        for field_names in _unique_field_sets(model):
+            conflicts = self.find_unique_conflicts(model, field_names, valid)
+            message = f"{model._meta.verbose_name} with this {', '.join(field_names)} already exists."
+            key = field_names[0] if len(field_names) == 1 else api_settings.NON_FIELD_ERRORS_KEY
+            for index in conflicts:
+                errors[index] = {key: [message]}
+            valid = [(index, data) for index, data in valid if index not in conflicts]
+        return valid, [{"index": index, "errors": errors[index]} for index in sorted(errors)]
+
+    @staticmethod
+    def find_unique_conflicts(model, field_names, valid):
+        """
+        Indices of items whose `field_names` values already exist in the database
+        or repeat an earlier item. Items with a NULL in the set never conflict.
+        """
+        keys = {}
+        for index, data in valid:
+            key = tuple(data.get(name) for name in field_names)
+            if all(value is not None for value in key):
+                keys[index] = key
+        if not keys:
+            return set()
+
+        if len(field_names) == 1:
+            condition = Q(**{f'{field_names[0]}__in': {key[0] for key in keys.values()}})
+        else:
+            condition = reduce(or_, (Q(**dict(zip(field_names, key))) for key in set(keys.values())))
+        existing = set(model.objects.filter(condition).values_list(*field_names))
+
+        conflicts, seen = set(), set()
+        for index, key in keys.items():
+            # Model instances in related keys compare by pk, matching the values_list() ids.
+            comparable = tuple(getattr(value, 'pk', value) for value in key)
+            if comparable in existing or comparable in seen:
+                conflicts.add(index)
+            seen.add(comparable)
+        return conflicts
+
+    def perform_bulk_create(self, instances):
+        return self.get_serializer_class().Meta.model.objects.bulk_create(instances)
@@ -0,0 +1,239 @@
+# healthlink-backend/api/clinical_search.py
+
+import html
+import re
+from collections import namedtuple
+from datetime import datetime
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MedicalHistory, PastProcedure, PatientVisit
+from .search import search_tokens
+
+
+DEFAULT_CLINICAL_SEARCH_LIMIT = 20
+MAX_CLINICAL_SEARCH_LIMIT = 100
+# Query words after this many are ignored.
+MAX_CLINICAL_QUERY_TOKENS = 10
+# Words of context a snippet shows around the matches.
+SNIPPET_TOKENS = 16
+SNIPPET_CONTEXT_CHARS = 60
+
+# Snippets are escaped for HTML and the matches wrapped in these.
+HIGHLIGHT_START, HIGHLIGHT_END = '<mark>', '</mark>'
+ELLIPSIS = '…'
+# FTS5 marks matches with these before the snippet is escaped; they can't occur in the text.
+_MATCH_START, _MATCH_END = '\x02', '\x03'
+
+# Indexed models: result type -> (model, text fields, date field, facility field or None).
+# Medical history and past procedures belong to the patient rather than a
+# facility, so every facility's staff find them.
+CLINICAL_SOURCES = {
+    'visit': (PatientVisit, ('reason', 'diagnosis', 'notes'), 'visit_date', 'facility'),
+    'medical_history': (MedicalHistory, ('condition', 'notes'), 'diagnosis_date', None),
+    'past_procedure': (PastProcedure, ('procedure_name', 'notes'), 'procedure_date', None),
+}
+CLINICAL_TYPES = list(CLINICAL_SOURCES)
+TYPES_BY_MODEL = {model: kind for kind, (model, _, _, _) in CLINICAL_SOURCES.items()}
+
+ClinicalDocument = namedtuple('ClinicalDocument', 'type id patient_id facility_id date body')
+
+
+def clinical_document(instance):
+    """
+    The ClinicalDocument indexed for a visit, medical history entry or past procedure.
+    """
+    kind = TYPES_BY_MODEL[type(instance)]
+    _, text_fields, date_field, facility_field = CLINICAL_SOURCES[kind]
+    recorded = getattr(instance, date_field)
+    if isinstance(recorded, datetime):
+        recorded = timezone.localdate(recorded)
+    return ClinicalDocument(
+        kind, instance.pk, instance.patient_id,
+        getattr(instance, f'{facility_field}_id') if facility_field else None,
+        recorded.isoformat() if recorded else None,
+        '\n'.join(value for value in (getattr(instance, field) for field in text_fields) if value),
+    )
+
+
+def _highlighted(snippet):
+    return html.escape(snippet).replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+
+
+def _result(kind, pk, patient_id, facility_id, recorded_on, snippet):
+    return {'type': kind, 'id': pk, 'patient': patient_id, 'facility': facility_id, 'date': recorded_on, 'snippet': snippet}
+
+
+class FTS5ClinicalSearch:
+    """
+    SQLite FTS5 over the narrative fields, with Porter stemming so 'fevers'
+    finds 'fever'. Every query word must match; the best bm25() ranked
+    matches come first, or the newest with ordering='-date'. Records saved
+    before the backend was enabled are only found after
+    `python manage.py rebuild_search_index`. The table is created by
+    migration 0015 on SQLite only.
+    """
+    name = 'fts5'
+    table = 'api_clinical_search_fts'
+
+    def __init__(self):
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured("The 'fts5' clinical search backend needs SQLite.")
+
+    @staticmethod
+    def rowid(kind, pk):
+        # One rowid space for all the models, so a record is replaced or removed by rowid.
+        return pk * len(CLINICAL_TYPES) + CLINICAL_TYPES.index(kind)
+
+    def index(self, instances, replace=True):
+        documents = [clinical_document(instance) for instance in instances]
+        with connection.cursor() as cursor:
+            if replace:
+                cursor.executemany(
+                    f"DELETE FROM {self.table} WHERE rowid = %s",
+                    [(self.rowid(document.type, document.id),) for document in documents]
+                )
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, body, type, object_id, patient_id, facility_id, recorded_on) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [
+                    (self.rowid(document.type, document.id), document.body, document.type, document.id,
+                     document.patient_id, document.facility_id, document.date)
+                    for document in documents
+                ]
+            )
+
+    def remove(self, instances):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s",
+                [(self.rowid(TYPES_BY_MODEL[type(instance)], instance.pk),) for instance in instances]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, query, facility_id=None, start_date=None, end_date=None, types=None,
+               ordering='rank', limit=DEFAULT_CLINICAL_SEARCH_LIMIT, offset=0):
+        tokens = search_tokens(query)[:MAX_CLINICAL_QUERY_TOKENS]
+        if not tokens:
+            return []
+        # Tokens are letters and digits only, so quoting them is enough.
+        conditions, params = [f"{self.table} MATCH %s"], [' '.join(f'"{token}"' for token in tokens)]
+        if facility_id is not None:
+            conditions.append("(facility_id = %s OR facility_id IS NULL)")
+            params.append(facility_id)
+        if start_date:
+            conditions.append("recorded_on >= %s")
+            params.append(start_date.isoformat())
+        if end_date:
+            conditions.append("recorded_on <= %s")
+            params.append(end_date.isoformat())
+        if types:
+            conditions.append(f"type IN ({', '.join(['%s'] * len(types))})")
+            params.extend(types)
+        order_by = "recorded_on DESC, rowid DESC" if ordering == '-date' else "rank"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT type, object_id, patient_id, facility_id, recorded_on, "
+                f"snippet({self.table}, 0, %s, %s, %s, %s) FROM {self.table} "
+                f"WHERE {' AND '.join(conditions)} ORDER BY {order_by} LIMIT %s OFFSET %s",
+                (_MATCH_START, _MATCH_END, ELLIPSIS, SNIPPET_TOKENS, *params, limit, offset)
+            )
+            rows = cursor.fetchall()
+        return [_result(*row[:5], _highlighted(row[5])) for row in rows]
+
+
+class ScanClinicalSearch:
+    """
+    Case-insensitive substring matching on the models' own columns, for
+    databases without FTS5. Nothing to index, but every search scans the
+    tables; results are newest first whatever the ordering asked for.
+    """
+    name = 'scan'
+
+    def index(self, instances, replace=True):
+        pass
+
+    def remove(self, instances):
+        pass
+
+    def clear(self):
+        pass
+
+    @staticmethod
+    def snippet(body, tokens):
+        pattern = re.compile('|'.join(re.escape(token) for token in tokens), re.IGNORECASE)
+        first = pattern.search(body)
+        start = max(first.start() - SNIPPET_CONTEXT_CHARS, 0) if first else 0
+        end = min((first.end() if first else 0) + SNIPPET_CONTEXT_CHARS, len(body))
+        marked = pattern.sub(lambda match: f'{_MATCH_START}{match.group()}{_MATCH_END}', body[start:end])
+        return _highlighted(f"{ELLIPSIS if start else ''}{marked}{ELLIPSIS if end < len(body) else ''}")
+
+    def search(self, query, facility_id=None, start_date=None, end_date=None, types=None,
+               ordering='rank', limit=DEFAULT_CLINICAL_SEARCH_LIMIT, offset=0):
+        tokens = search_tokens(query)[:MAX_CLINICAL_QUERY_TOKENS]
+        if not tokens:
+            return []
+        documents = []
+        for kind in types or CLINICAL_TYPES:
+            model, text_fields, date_field, facility_field = CLINICAL_SOURCES[kind]
+            queryset = model.objects.all()
+            for token in tokens:
+                queryset = queryset.filter(reduce(or_, [Q(**{f'{field}__icontains': token}) for field in text_fields]))
+            if facility_id is not None and facility_field:
+                queryset = queryset.filter(Q(**{f'{facility_field}_id': facility_id}) | Q(**{f'{facility_field}__isnull': True}))
+            date_lookup = f'{date_field}__date' if model._meta.get_field(date_field).get_internal_type() == 'DateTimeField' else date_field
+            if start_date:
+                queryset = queryset.filter(**{f'{date_lookup}__gte': start_date})
+            if end_date:
+                queryset = queryset.filter(**{f'{date_lookup}__lte': end_date})
+            # Enough of each model's newest matches to fill the requested page once merged.
+            documents.extend(map(clinical_document, queryset.order_by(f'-{date_field}', '-pk')[:offset + limit]))
+
+        documents.sort(key=lambda document: (document.date or '', document.id), reverse=True)
+        return [
+            _result(*document[:5], self.snippet(document.body, tokens))
+            for document in documents[offset:offset + limit]
+        ]
+
+
+CLINICAL_SEARCH_BACKENDS = {backend.name: backend for backend in (FTS5ClinicalSearch, ScanClinicalSearch)}
+
+
+def get_clinical_search_backend():
+    name = getattr(settings, 'CLINICAL_SEARCH_BACKEND', None) or ('fts5' if connection.vendor == 'sqlite' else 'scan')
+    if name not in CLINICAL_SEARCH_BACKENDS:
+        raise ImproperlyConfigured(f"Unknown CLINICAL_SEARCH_BACKEND {name!r}.")
+    return CLINICAL_SEARCH_BACKENDS[name]()
+
+
+def index_clinical_records(instances):
+    get_clinical_search_backend().index(instances)
+
+
+def rebuild_clinical_search_index(batch_size=2000):
+    """
+    Rebuilds the clinical index of the configured backend from every visit,
+    medical history entry and past procedure. Returns the number indexed.
+    """
+    backend = get_clinical_search_backend()
+    count = 0
+    with transaction.atomic():
+        backend.clear()
+        for model, text_fields, date_field, facility_field in CLINICAL_SOURCES.values():
+            fields = [*text_fields, date_field, 'patient', *([facility_field] if facility_field else [])]
+            records = model.objects.order_by('pk').only(*fields)
+            last_pk = 0
+            while batch := list(records.filter(pk__gt=last_pk)[:batch_size]):
+                backend.index(batch, replace=False)
+                count += len(batch)
+                last_pk = batch[-1].pk
+    return count
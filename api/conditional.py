@@ -0,0 +1,114 @@
+# healthlink-backend/api/conditional.py
+
+import hashlib
+from functools import partial
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .pagination import KeysetPagination, PrecountedPaginator
+
+
+def make_etag(request, *parts):
+    """
+    Weak ETag for `parts` as rendered at this URL (query string included) and media type.
+    """
+    key = ':'.join(str(part) for part in (*parts, request.get_full_path(), request.accepted_media_type))
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET requests carrying If-None-Match / If-Modified-Since with
+    304 Not Modified before anything is serialised.
+
+    Detail validators come from the object's (pk, updated_at). List validators
+    come from MAX(updated_at) and COUNT(*) over the filtered queryset, read in one
+    aggregate whose count is reused by page-number pagination. Edits to related
+    rows the serializer names or expands (e.g. a patient's name on a payment) do
+    not change those validators.
+
+    Keyset-paginated lists read their page once and take the validators from
+    the rendered page and its links, so a deep page still costs the same as the
+    first; the page is serialised even when the answer is 304.
+    """
+    conditional_field = 'updated_at'
+
+    def _has_conditional_field(self):
+        try:
+            self.get_queryset().model._meta.get_field(self.conditional_field)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def conditional_response(self, request, etag, last_modified, build_response):
+        """
+        Returns the 304 (or 412) response when the client's validators match,
+        otherwise build_response(), with ETag and Last-Modified set on either.
+        """
+        response = self.precondition_response(request, etag, last_modified)
+        if response is None:
+            response = build_response()
+        return self.set_validators(response, etag, last_modified)
+
+    @staticmethod
+    def precondition_response(request, etag, last_modified):
+        """
+        The 304 (or 412) response when the client's validators match, else None.
+        """
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(int(last_modified.timestamp()))
+        return response
+
+    def list_validators(self, request, queryset):
+        """
+        (etag, last_modified) for the list response over `queryset`.
+        """
+        paginator = self.paginator
+        state = queryset.order_by().aggregate(last_modified=Max(self.conditional_field), count=Count('pk'))
+        if isinstance(paginator, PageNumberPagination):
+            # Spare the paginator its own COUNT(*).
+            paginator.django_paginator_class = partial(PrecountedPaginator, count=state['count'])
+        return make_etag(request, state['count'], state['last_modified']), state['last_modified']
+
+    def page_validators(self, request, response):
+        """
+        (etag, last_modified) for the rendered keyset page in `response`.
+        """
+        modified = (row.get(self.conditional_field) for row in response.data['results'])
+        last_modified = max(filter(None, (parse_datetime(value) for value in modified if isinstance(value, str))), default=None)
+        return make_etag(request, response.data), last_modified
+
+    def list(self, request, *args, **kwargs):
+        if not self._has_conditional_field():
+            return super().list(request, *args, **kwargs)
+        if isinstance(self.paginator, KeysetPagination):
+            response = super().list(request, *args, **kwargs)
+            etag, last_modified = self.page_validators(request, response)
+            return self.set_validators(self.precondition_response(request, etag, last_modified) or response, etag, last_modified)
+        etag, last_modified = self.list_validators(request, self.filter_queryset(self.get_queryset()))
+        return self.conditional_response(
+            request, etag, last_modified, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if not self._has_conditional_field():
+            return Response(self.get_serializer(instance).data)
+        last_modified = getattr(instance, self.conditional_field)
+        etag = make_etag(request, instance.pk, last_modified)
+        return self.conditional_response(
+            request, etag, last_modified, lambda: Response(self.get_serializer(instance).data)
+        )
@@ -0,0 +1,202 @@
+# healthlink-backend/api/dedup.py
+
+from collections import defaultdict, namedtuple
+from itertools import combinations, groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DuplicatePatientCandidate, Patient
+from .search import normalise_search_text, search_tokens
+
+
+READ_CHUNK_SIZE = 5000
+
+# Blocks larger than this (a very common surname, say) are compared by
+# sorted neighbourhood instead: each record only against the next
+# SORTED_WINDOW records in name order, so no block costs more than linear time.
+MAX_BLOCK_SIZE = 200
+SORTED_WINDOW = 20
+
+# Weights of the similarity score; a shared phone number adds PHONE_BONUS.
+NAME_WEIGHT = 0.8
+BIRTH_DATE_WEIGHT = 0.2
+PHONE_BONUS = 0.1
+
+_SOUNDEX_DIGITS = {
+    letter: str(digit)
+    for digit, letters in enumerate(['aeiouyhw', 'bfpv', 'cgjkqsxz', 'dt', 'l', 'mn', 'r'])
+    for letter in letters
+}
+
+PatientRecord = namedtuple('PatientRecord', 'id first_name last_name date_of_birth gender national_id phone_number')
+
+
+def soundex(name):
+    """
+    American Soundex code of a name, e.g. 'Uwase' -> 'U200'; '' if it has no letters.
+    """
+    return _soundex(normalise_search_text(name))
+
+
+def _soundex(normalised_name):
+    letters = [char for char in normalised_name if 'a' <= char <= 'z']
+    if not letters:
+        return ''
+    code, previous = letters[0].upper(), _SOUNDEX_DIGITS[letters[0]]
+    for letter in letters[1:]:
+        digit = _SOUNDEX_DIGITS[letter]
+        if digit != '0' and digit != previous:
+            code += digit
+        if letter not in 'hw': # h and w don't separate letters with the same code
+            previous = digit
+    return (code + '000')[:4]
+
+
+def jaro_winkler(first, second, prefix_scale=0.1):
+    """
+    Jaro-Winkler similarity of two strings, from 0 (nothing shared) to 1 (equal).
+    """
+    if first == second:
+        return 1.0 if first else 0.0
+    if not first or not second:
+        return 0.0
+
+    window = max(max(len(first), len(second)) // 2 - 1, 0)
+    second_matched = [False] * len(second)
+    first_matches = []
+    for i, char in enumerate(first):
+        end = i + window + 1
+        j = second.find(char, max(i - window, 0), end)
+        while j != -1 and second_matched[j]:
+            j = second.find(char, j + 1, end)
+        if j != -1:
+            second_matched[j] = True
+            first_matches.append(char)
+    matches = len(first_matches)
+    if not matches:
+        return 0.0
+
+    second_matches = [char for char, matched in zip(second, second_matched) if matched]
+    transpositions = sum(a != b for a, b in zip(first_matches, second_matches)) / 2
+    jaro = (matches / len(first) + matches / len(second) + (matches - transpositions) / matches) / 3
+
+    prefix = 0
+    for a, b in zip(first[:4], second[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def normalise_patient(row):
+    """
+    A PatientRecord from a (pk, first_name, last_name, date_of_birth, gender,
+    national_id, phone_number) row, with names and identifiers normalised.
+    """
+    pk, first_name, last_name, date_of_birth, gender, national_id, phone_number = row
+    return PatientRecord(
+        pk, ' '.join(search_tokens(first_name)), ' '.join(search_tokens(last_name)), date_of_birth, gender,
+        ''.join(search_tokens(national_id)), ''.join(char for char in phone_number or '' if char.isdigit()),
+    )
+
+
+def similarity(a, b):
+    """
+    How likely two PatientRecords are the same person, from 0 to 1.
+    """
+    names = (jaro_winkler(a.first_name, b.first_name) + jaro_winkler(a.last_name, b.last_name)) / 2
+    if a.first_name[:1] == b.last_name[:1] and a.last_name[:1] == b.first_name[:1]:
+        # First and last name may have been entered the other way round
+        names = max(names, (jaro_winkler(a.first_name, b.last_name) + jaro_winkler(a.last_name, b.first_name)) / 2)
+    if a.date_of_birth == b.date_of_birth:
+        birth = 1.0
+    elif (a.date_of_birth.day, a.date_of_birth.month) == (b.date_of_birth.month, b.date_of_birth.day):
+        birth = 0.8 # Day and month swapped
+    else:
+        birth = 0.5 if a.date_of_birth.year == b.date_of_birth.year else 0.0
+
+    score = NAME_WEIGHT * names + BIRTH_DATE_WEIGHT * birth
+    if a.phone_number and a.phone_number == b.phone_number:
+        score = min(1.0, score + PHONE_BONUS)
+    if a.national_id and b.national_id and a.national_id != b.national_id:
+        score /= 2 # Two registered IDs: rarely one person
+    return score
+
+
+def blocking_keys(record):
+    """
+    The blocks a normalise_patient() record is compared in: same surname
+    code, birth year, gender and first initial; and, to catch typos that
+    change a code or initial and names entered the other way round, same
+    birth date, gender and either name's code.
+
+    A pair only found by neither (a typo in the first initial and different
+    birth dates) scores at most 0.8 x names + 0.1 + a phone bonus, below the
+    default threshold unless the phone numbers match.
+    """
+    surname_code, given_code = _soundex(record.last_name), _soundex(record.first_name)
+    keys = []
+    if surname_code:
+        keys.append(f'surname:{surname_code}:{record.first_name[:1]}:{record.date_of_birth.year}:{record.gender}')
+    for code in dict.fromkeys(code for code in (given_code, surname_code) if code):
+        keys.append(f'name:{code}:{record.date_of_birth.isoformat()}:{record.gender}')
+    return keys
+
+
+def block_pairs(records):
+    if len(records) <= MAX_BLOCK_SIZE:
+        return combinations(records, 2)
+    records = sorted(records, key=attrgetter('last_name', 'first_name'))
+    return ((a, b) for index, a in enumerate(records) for b in records[index + 1:index + 1 + SORTED_WINDOW])
+
+
+def find_duplicate_candidates(rows, min_score):
+    """
+    Yields (patient_a id, patient_b id, score, blocking key) for each pair of
+    records scoring at least `min_score`, patient_a being the lower id.
+
+    `rows` are normalise_patient() input rows ordered by date of birth. Every
+    blocking key includes the birth year, so the rows are processed one birth
+    year at a time and only pairs sharing a block are compared.
+    """
+    for _, year_rows in groupby(rows, key=lambda row: row[3].year):
+        blocks = defaultdict(list)
+        for record in map(normalise_patient, year_rows):
+            for key in blocking_keys(record):
+                blocks[key].append(record)
+
+        compared = set()
+        for key, records in blocks.items():
+            for a, b in block_pairs(records):
+                pair = (a.id, b.id) if a.id < b.id else (b.id, a.id)
+                if pair in compared:
+                    continue # Already compared in another block
+                compared.add(pair)
+                score = similarity(a, b)
+                if score >= min_score:
+                    yield (*pair, score, key)
+
+
+def run_duplicate_detection(min_score=None):
+    """
+    Recomputes the pending duplicate candidates; reviewed pairs are kept as
+    they are and not raised again. Returns the number of candidates pending.
+    """
+    if min_score is None:
+        min_score = getattr(settings, 'DEDUP_MIN_SCORE', 0.9)
+    rows = Patient.objects.order_by('date_of_birth').values_list(
+        'pk', 'first_name', 'last_name', 'date_of_birth', 'gender', 'national_id', 'phone_number'
+    ).iterator(chunk_size=READ_CHUNK_SIZE)
+    candidates = [
+        DuplicatePatientCandidate(patient_a_id=a_id, patient_b_id=b_id, score=round(score, 4), blocking_key=key)
+        for a_id, b_id, score, key in find_duplicate_candidates(rows, min_score)
+    ]
+    with transaction.atomic():
+        # Nothing references candidates, so they can go without loading them first.
+        pending = DuplicatePatientCandidate.objects.filter(status='Pending')
+        pending._raw_delete(pending.db)
+        # A pair already reviewed keeps its decision.
+        DuplicatePatientCandidate.objects.bulk_create(candidates, batch_size=1000, ignore_conflicts=True)
+        return DuplicatePatientCandidate.objects.filter(status='Pending').count()
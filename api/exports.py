@@ -0,0 +1,126 @@
+# healthlink-backend/api/exports.py
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+# Rows fetched from the database per round trip while streaming an export.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class CSVStreamRenderer(BaseRenderer):
+    """
+    Registers the 'csv' format with DRF content negotiation.
+    The actual body is produced by ReportExportMixin as a stream.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only reached for non-streamed responses (e.g. validation errors).
+        return json.dumps(data, cls=DjangoJSONEncoder).encode(self.charset)
+
+
+class NDJSONStreamRenderer(BaseRenderer):
+    """
+    Registers the 'ndjson' format with DRF content negotiation.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode(self.charset)
+
+
+class _Echo:
+    """
+    File-like object whose write() hands the value back, so csv.writer
+    can be used to format one row at a time.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_formatter(header):
+    """
+    Returns (leading lines, row formatter) for a CSV export.
+    """
+    writer = csv.writer(_Echo())
+    return [writer.writerow(header)], writer.writerow
+
+
+def ndjson_formatter(header):
+    encoder = DjangoJSONEncoder()
+    return [], lambda row: encoder.encode(dict(zip(header, row))) + '\n'
+
+
+STREAM_WRITERS = {
+    'csv': csv_formatter,
+    'ndjson': ndjson_formatter,
+}
+
+
+def iter_export(queryset, export_columns, export_format):
+    """
+    Yields the formatted export of `queryset`, one row at a time.
+    """
+    leading, format_row = STREAM_WRITERS[export_format]([column for column, _ in export_columns])
+    yield from leading
+    rows = queryset.values_list(*(lookup for _, lookup in export_columns))
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield format_row(row)
+
+
+async def aiter_export(queryset, export_columns, export_format):
+    """
+    iter_export() for async views; chunks are read with aiterator(), so the
+    event loop keeps serving other requests while each one is fetched.
+    """
+    leading, format_row = STREAM_WRITERS[export_format]([column for column, _ in export_columns])
+    for line in leading:
+        yield line
+    # values() rather than values_list(): aiterator() starts the values_list()
+    # iterable on the event loop, where it would open its cursor right away.
+    lookups = [lookup for _, lookup in export_columns]
+    async for row in queryset.values(*lookups).aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield format_row([row[lookup] for lookup in lookups])
+
+
+class ReportExportMixin:
+    """
+    Adds a streaming export mode (?format=csv or ?format=ndjson) to a report view.
+
+    Views declare `export_columns` as (header, lookup) pairs and hand their
+    filtered queryset to stream_export(), or astream_export() from async
+    handlers. Rows are pulled with values_list().iterator() (aiterator()) so
+    memory stays flat no matter how large the report is.
+    """
+    export_columns = ()
+    export_filename = 'report'
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [CSVStreamRenderer, NDJSONStreamRenderer]
+
+    def get_export_format(self, request):
+        renderer = getattr(request, 'accepted_renderer', None)
+        export_format = getattr(renderer, 'format', None)
+        return export_format if export_format in STREAM_WRITERS else None
+
+    def stream_export(self, queryset, export_format):
+        return self.export_response(iter_export(queryset, self.export_columns, export_format), export_format)
+
+    def astream_export(self, queryset, export_format):
+        return self.export_response(aiter_export(queryset, self.export_columns, export_format), export_format)
+
+    def export_response(self, lines, export_format):
+        renderer = CSVStreamRenderer if export_format == 'csv' else NDJSONStreamRenderer
+        response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        filename = f"{self.export_filename}-{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
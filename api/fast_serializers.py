@@ -0,0 +1,332 @@
+# healthlink-backend/api/fast_serializers.py
+
+import decimal
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, models
+from django.db.models import Case, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Concat
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .models import Patient
+from .pagination import KeysetPagination
+
+
+def full_name_expression(prefix=''):
+    """
+    Database-side Patient.get_full_name() for the patient reached through `prefix`.
+    """
+    return Concat(F(f'{prefix}first_name'), Value(' '), F(f'{prefix}last_name'), output_field=models.CharField())
+
+
+def patient_full_name_expression(path):
+    """
+    Database-side `obj.<path>.get_full_name() if obj.<path> else None`.
+    """
+    return Case(
+        When(**{f'{path}__isnull': True}, then=Value(None)),
+        default=full_name_expression(f'{path}__'),
+        output_field=models.CharField(),
+    )
+
+
+# Model methods used as serializer sources, with their database-side equivalents.
+METHOD_EXPRESSIONS = {
+    Patient: {'get_full_name': full_name_expression},
+}
+
+UTC_ZONE_KEYS = {'UTC', 'Etc/UTC'}
+
+# Marks a serializer field DRF always skips (its source doesn't exist on the model).
+SKIP = object()
+
+
+def _is_passthrough(serializer_field, model_field):
+    # True when to_representation() would return the value .values() already gives us.
+    if isinstance(serializer_field, PrimaryKeyRelatedField):
+        return serializer_field.pk_field is None
+    if model_field is None:
+        return isinstance(serializer_field, serializers.CharField)
+    if isinstance(serializer_field, serializers.ChoiceField):
+        return all(isinstance(key, str) for key in serializer_field.choices)
+    if isinstance(serializer_field, serializers.BooleanField):
+        return isinstance(model_field, models.BooleanField)
+    if isinstance(serializer_field, serializers.IntegerField):
+        return isinstance(model_field, (models.IntegerField, models.AutoField))
+    if isinstance(serializer_field, serializers.CharField):
+        return isinstance(model_field, (models.CharField, models.TextField))
+    return False
+
+
+def _datetime_converter(field):
+    """
+    DateTimeField.to_representation() with the current timezone looked up once per page.
+
+    Values come as the database driver returns them (see database_datetime()):
+    naive ones are in the connection's time zone, which is what the backend
+    converter skipped there would have made them aware in.
+    """
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601 or hasattr(field, 'timezone'):
+        def bind_default(current_timezone):
+            database_timezone = connection.timezone
+
+            def convert_default(value):
+                if value.tzinfo is None and database_timezone is not None:
+                    value = value.replace(tzinfo=database_timezone)
+                return field.to_representation(value)
+            return convert_default
+        return bind_default
+
+    def bind(current_timezone):
+        database_timezone = connection.timezone
+        # Values already in UTC need no conversion when the output is UTC as well.
+        utc_output = current_timezone is not None and getattr(current_timezone, 'key', None) in UTC_ZONE_KEYS
+        utc_database = database_timezone is dt_timezone.utc
+
+        def convert(value):
+            if value.tzinfo is None and database_timezone is not None:
+                value = value.replace(tzinfo=database_timezone)
+            if current_timezone is None or value.tzinfo is None:
+                return field.to_representation(value)
+            try:
+                text = value.astimezone(current_timezone).isoformat()
+            except OverflowError:
+                return field.to_representation(value)
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+        def convert_utc(value):
+            tzinfo = value.tzinfo
+            if tzinfo is None and utc_database:
+                return value.isoformat() + 'Z'
+            if tzinfo is dt_timezone.utc:
+                return value.isoformat()[:-6] + 'Z'
+            return convert(value)
+
+        return convert_utc if utc_output else convert
+    return bind
+
+
+def database_datetime(lookup):
+    """
+    The datetime column at `lookup` as the database driver returns it. Without
+    a DateTimeField output the backend's converter, which makes naive values
+    aware one call at a time, is skipped; _datetime_converter() does it instead.
+    """
+    return ExpressionWrapper(F(lookup), output_field=models.Field())
+
+
+def _decimal_converter(field):
+    # DecimalField.to_representation() for values the database already returns quantized.
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return lambda current_timezone: field.to_representation
+    places, max_digits = field.decimal_places, field.max_digits
+
+    def convert(value):
+        if isinstance(value, decimal.Decimal) and value.is_finite():
+            # Already quantized when the point sits `places` from the end; a leading
+            # '0' or '-' only makes the digit count stricter than DRF's.
+            text = f'{value:f}'
+            if (text[-places - 1] == '.' if places else '.' not in text) and (
+                max_digits is None or len(text) - (places > 0) <= max_digits
+            ):
+                return text
+        return field.to_representation(value)
+    return lambda current_timezone: convert
+
+
+def _converter(serializer_field, model_field):
+    """
+    A function of the current timezone returning the value converter, or None
+    when the .values() output can be used as is.
+    """
+    if _is_passthrough(serializer_field, model_field):
+        return None
+    if isinstance(serializer_field, serializers.DateTimeField):
+        return _datetime_converter(serializer_field)
+    if isinstance(serializer_field, serializers.DecimalField):
+        return _decimal_converter(serializer_field)
+    if type(serializer_field) is serializers.CharField:
+        # CharField.to_representation() is str(), e.g. for an id shown as text.
+        return lambda current_timezone: str
+    return lambda current_timezone: serializer_field.to_representation
+
+
+def _resolve_source(model, source_attrs):
+    """
+    Returns (lookup or expression, model field or None, presence keys), SKIP, or None
+    when the source can't be computed from .values().
+
+    Presence keys are the nullable foreign keys on the way: when one is NULL,
+    DRF skips the field, so the fast path has to as well.
+    """
+    path, presence = [], []
+    for index, attr in enumerate(source_attrs):
+        last = index == len(source_attrs) - 1
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            method = METHOD_EXPRESSIONS.get(model, {}).get(attr)
+            if method is not None and last:
+                return method(''.join(f'{part}__' for part in path)), None, presence
+            if not hasattr(model, attr):
+                return SKIP
+            return None
+        if field.many_to_many or field.one_to_many or not field.concrete:
+            return None
+        path.append(attr)
+        if field.is_relation and not last:
+            if field.null:
+                presence.append('__'.join(path))
+            model = field.related_model
+    return '__'.join(path), field, presence
+
+
+class FieldPlan:
+    """
+    A serializer's read-only representation as one .values_list() projection
+    and the columns each field is read from. A row is turned into its dict with
+    one itemgetter and zip(); only the fields that need it are converted after.
+    """
+    def __init__(self, values, expressions, steps):
+        self.values = values
+        self.expressions = expressions
+        columns = {key: index for index, key in enumerate([*values, *expressions])}
+        self.width = len(columns)
+        self.names = tuple(name for name, _, _, _ in steps)
+        field_columns = [columns[key] for _, key, _, _ in steps]
+        self.pick = itemgetter(*field_columns) if len(field_columns) > 1 else lambda row: (row[field_columns[0]],)
+        # (position in the row's values, converter factory) for the fields that need converting.
+        self.converters = [(index, converter) for index, (_, _, converter, _) in enumerate(steps) if converter is not None]
+        # Presence columns -> the fields DRF leaves out when a nullable foreign key
+        # on their source path, read from one of those columns, is NULL.
+        optional = {}
+        for name, _, _, presence in steps:
+            if presence:
+                optional.setdefault(tuple(columns[presence_key] for presence_key in presence), []).append(name)
+        self.optional = list(optional.items())
+
+    def project(self, queryset, extra=None):
+        """
+        The .values_list() rows for `queryset`. Expressions in `extra` are appended
+        after the plan's own columns, starting at index `width`.
+        """
+        expressions = {**self.expressions, **(extra or {})}
+        if expressions:
+            queryset = queryset.annotate(**expressions)
+        return queryset.values_list(*self.values, *expressions)
+
+    def render(self, rows):
+        current_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        names, pick, optional = self.names, self.pick, self.optional
+        converters = [(index, converter(current_timezone)) for index, converter in self.converters]
+        data = []
+        append = data.append
+        for row in rows:
+            values = list(pick(row))
+            for index, convert in converters:
+                value = values[index]
+                if value is not None:
+                    values[index] = convert(value)
+            item = dict(zip(names, values))
+            for presence, optional_names in optional:
+                for column in presence:
+                    if row[column] is None:
+                        for name in optional_names:
+                            del item[name]
+                        break
+            append(item)
+        return data
+
+
+@lru_cache(maxsize=256)
+def compile_field_plan(serializer_class, field_names):
+    """
+    Compiles the plan for `serializer_class` restricted to `field_names`, or
+    returns None if any of those fields can't be rendered from .values() rows.
+    """
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    declared = getattr(serializer.Meta, 'fast_field_expressions', {})
+    values, expressions, steps = [], {}, []
+
+    def key_for(lookup):
+        if '__' not in lookup:
+            if lookup not in values:
+                values.append(lookup)
+            return lookup
+        alias = f'_fast_{len(expressions)}'
+        expressions[alias] = F(lookup)
+        return alias
+
+    fields = serializer.fields
+    for name in field_names:
+        field = fields[name]
+        if field.write_only:
+            continue
+        if name in declared:
+            alias = f'_fast_{len(expressions)}'
+            expressions[alias] = declared[name]
+            steps.append((name, alias, None, ()))
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            return None
+        resolved = _resolve_source(model, field.source_attrs)
+        if resolved is SKIP:
+            continue
+        if resolved is None:
+            return None
+        lookup, model_field, presence = resolved
+        if isinstance(field, serializers.DateTimeField) and isinstance(model_field, models.DateTimeField):
+            key = f'_fast_{len(expressions)}'
+            expressions[key] = database_datetime(lookup)
+        elif isinstance(lookup, str):
+            key = key_for(lookup)
+        else:
+            key = f'_fast_{len(expressions)}'
+            expressions[key] = lookup
+        presence_keys = tuple(key_for(presence_lookup) for presence_lookup in presence)
+        steps.append((name, key, _converter(field, model_field), presence_keys))
+    return FieldPlan(values, expressions, steps)
+
+
+def get_field_plan(serializer):
+    fields = serializer.fields
+    if any(isinstance(field, serializers.BaseSerializer) for field in fields.values()):
+        # Expanded (?expand=) relations render whole objects, not columns.
+        return None
+    return compile_field_plan(type(serializer), tuple(fields))
+
+
+class FastListMixin:
+    """
+    Renders the list action from .values() rows through a FieldPlan
+    instead of building model instances and running the serializer per row.
+    The output is the same as the serializer's; views whose serializer can't be
+    compiled fall back to the regular list.
+    """
+    def list(self, request, *args, **kwargs):
+        plan = get_field_plan(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if isinstance(self.paginator, KeysetPagination):
+            # Cursor links encode the leading ordering column of the page's edge rows.
+            position = self.paginator.get_ordering(request, queryset, self)[0].lstrip('-')
+            self.paginator.position_getter = itemgetter(plan.width)
+            queryset = plan.project(queryset, {'_fast_position': F(position)})
+        else:
+            queryset = plan.project(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page))
+        return Response(plan.render(queryset))
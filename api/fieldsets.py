@@ -0,0 +1,242 @@
+# healthlink-backend/api/fieldsets.py
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.query import ModelIterable
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_list(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def get_sparse_fieldset(request):
+    """
+    The (fields, omit) name sets a GET request asks for; both empty when it asks for nothing.
+    """
+    if request is None or request.method != 'GET':
+        return set(), set()
+    return parse_field_list(request.query_params.get(FIELDS_PARAM)), parse_field_list(request.query_params.get(OMIT_PARAM))
+
+
+def get_expansion(request):
+    """
+    The relations a GET request asks to expand, as a tree:
+    `?expand=supplier,patient_visit.patient` gives {'supplier': {}, 'patient_visit': {'patient': {}}}.
+    """
+    if request is None or request.method != 'GET':
+        return {}
+    tree = {}
+    for path in parse_field_list(request.query_params.get(EXPAND_PARAM)):
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+class SparseFieldsetMixin:
+    """
+    Lets GET requests trim a serializer's output with `?fields=a,b` and/or `?omit=c`.
+
+    Only the top-level serializer (or the child of a top-level list) is trimmed.
+    Serializers whose method fields read model columns declare them in
+    `Meta.sparse_field_sources` so SparseFieldsetFilter can still defer the rest.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_sparse_root():
+            return fields
+        wanted, omitted = get_sparse_fieldset(self.context.get('request'))
+        if wanted:
+            fields = {name: field for name, field in fields.items() if name in wanted}
+        for name in omitted:
+            fields.pop(name, None)
+        return fields
+
+    def _is_sparse_root(self):
+        return _is_root(self)
+
+
+def _is_root(serializer):
+    # The top-level serializer, or the child of a top-level list.
+    parent = serializer.parent
+    return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+
+def _serializer_class(name):
+    # Expandable fields name their serializers so that they can refer to ones defined later.
+    from . import serializers as api_serializers
+    return getattr(api_serializers, name)
+
+
+class ExpandableFieldsMixin:
+    """
+    Lets GET requests embed related objects in place of their ids with
+    `?expand=supplier,patient_visit.patient`.
+
+    `Meta.expandable_fields` maps relation names to the names of the serializers
+    that render them; to-many relations render as lists. Dotted paths expand
+    through the nested serializer's own expandable fields, and names that
+    aren't expandable are ignored. ExpansionFilter loads everything the
+    expanded output reads along with the queryset.
+    """
+    def __init__(self, *args, expand=None, **kwargs):
+        self._expand = expand
+        super().__init__(*args, **kwargs)
+
+    def get_expansion(self):
+        if self._expand is not None:
+            return self._expand
+        if _is_root(self):
+            return get_expansion(self.context.get('request'))
+        return {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name, nested in self.get_expansion().items():
+            if name not in expandable:
+                continue
+            relation = self.Meta.model._meta.get_field(name)
+            serializer_class = _serializer_class(expandable[name])
+            kwargs = {'expand': nested} if issubclass(serializer_class, ExpandableFieldsMixin) else {}
+            fields[name] = serializer_class(many=relation.one_to_many or relation.many_to_many, read_only=True, **kwargs)
+        return fields
+
+
+def _column_path(model, source_attrs):
+    """
+    Maps a serializer field's source to an `.only()` path.
+
+    Returns '' when the attribute does not exist on the model (DRF skips such
+    read-only fields), and None when the value is computed and can't be narrowed.
+    """
+    parts = []
+    for index, attr in enumerate(source_attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            if not hasattr(model, attr):
+                return ''
+            if not parts:
+                return None
+            # A method or property of a related model: load that row in full.
+            prefix = '__'.join(parts)
+            return [f'{prefix}__{column.name}' for column in model._meta.concrete_fields]
+        if field.many_to_many or field.one_to_many or not field.concrete:
+            return None
+        parts.append(attr)
+        if field.is_relation and index < len(source_attrs) - 1:
+            model = field.related_model
+    return '__'.join(parts)
+
+
+def projected_columns(serializer):
+    """
+    The model columns `serializer` needs, or None if they can't all be determined.
+    """
+    model = serializer.Meta.model
+    sources = getattr(serializer.Meta, 'sparse_field_sources', {})
+    columns = {model._meta.pk.name}
+    for name, field in serializer.fields.items():
+        if name in sources:
+            columns.update(sources[name])
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            return None
+        path = _column_path(model, field.source_attrs)
+        if path is None:
+            return None
+        if isinstance(path, list):
+            columns.update(path)
+        elif path:
+            columns.add(path)
+    return columns
+
+
+class SparseFieldsetFilter(BaseFilterBackend):
+    """
+    Narrows the queryset to the columns a `?fields=` / `?omit=` request actually
+    renders, joining only the relations those columns live on.
+    """
+    def filter_queryset(self, request, queryset, view):
+        wanted, omitted = get_sparse_fieldset(request)
+        if not (wanted or omitted) or queryset._iterable_class is not ModelIterable:
+            return queryset
+        if get_expansion(request):
+            # Expanded objects are rendered in full; ExpansionFilter loads them.
+            return queryset
+        serializer = view.get_serializer()
+        if not isinstance(serializer, SparseFieldsetMixin) or serializer.Meta.model is not queryset.model:
+            return queryset
+
+        columns = projected_columns(serializer)
+        if columns is None:
+            return queryset
+        relations = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+        # The foreign keys being traversed must be loaded too.
+        for relation in list(relations):
+            parts = relation.split('__')
+            columns.update('__'.join(parts[:index]) for index in range(1, len(parts) + 1))
+
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
+
+
+def related_lookups(serializer):
+    """
+    The (select_related, prefetch_related) lookups that load every relation
+    `serializer` reads, nested serializers included.
+    """
+    model = serializer.Meta.model
+    sources = getattr(serializer.Meta, 'sparse_field_sources', {})
+    selects, prefetches = set(), []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            child_selects, child_prefetches = related_lookups(field.child)
+            queryset = field.child.Meta.model._default_manager.select_related(*child_selects)
+            prefetches.append(Prefetch(field.source, queryset=queryset.prefetch_related(*child_prefetches)))
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            child_selects, child_prefetches = related_lookups(field)
+            selects.add(field.source)
+            selects.update(f'{field.source}__{lookup}' for lookup in child_selects)
+            prefetches.extend(
+                Prefetch(f'{field.source}__{prefetch.prefetch_through}', queryset=prefetch.queryset)
+                for prefetch in child_prefetches
+            )
+            continue
+        if name in sources:
+            columns = sources[name]
+        elif isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            continue
+        else:
+            path = _column_path(model, field.source_attrs)
+            columns = path if isinstance(path, list) else [path or '']
+        selects.update(column.rsplit('__', 1)[0] for column in columns if '__' in column)
+    return selects, prefetches
+
+
+class ExpansionFilter(BaseFilterBackend):
+    """
+    Adds the select_related() / prefetch_related() lookups an `?expand=`
+    request needs, so that expanded objects never cost a query per row.
+    """
+    def filter_queryset(self, request, queryset, view):
+        if not get_expansion(request) or queryset._iterable_class is not ModelIterable:
+            return queryset
+        serializer = view.get_serializer()
+        if not isinstance(serializer, ExpandableFieldsMixin) or serializer.Meta.model is not queryset.model:
+            return queryset
+        selects, prefetches = related_lookups(serializer)
+        return queryset.select_related(*selects).prefetch_related(*prefetches)
@@ -1,5 +1,6 @@
 import django_filters
 from .models import StockItem, Patient, Order, Prescription
+from .search import get_patient_search_backend
 
 class StockItemFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains')
@@ -16,11 +17,8 @@ class PatientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(method='filter_by_name')
 
     def filter_by_name(self, queryset, name, value):
-        return queryset.filter(
-            first_name__icontains=value
-        ) | queryset.filter(
-            last_name__icontains=value
-        )
+        # Prefix match on name, national ID and phone tokens, best matches first.
+        return get_patient_search_backend().search(queryset, value)
 
     class Meta:
         model = Patient
@@ -0,0 +1,141 @@
+# healthlink-backend/api/management/commands/benchmark_async_reports.py
+
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.batch import uses_in_memory_database
+from api.models import User, StockItem, InventoryHistory
+
+
+ASGI_URLCONF = 'healthlink_backend.asgi_urls'
+
+
+async def asgi_get(application, url, token):
+    """
+    Sends one GET through an ASGI application and returns the response status.
+    """
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    response_status = None
+
+    async def receive():
+        if body:
+            return body.pop()
+        await asyncio.Future() # The client never disconnects
+
+    async def send(message):
+        nonlocal response_status
+        if message['type'] == 'http.response.start':
+            response_status = message['status']
+
+    await application(scope, receive, send)
+    return response_status
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency of the stock lookups made while dispensing when they arrive behind a "
+        "burst of slow medication usage reports: once served by a fixed pool of WSGI worker threads, "
+        "once by the ASGI profile on a single event loop. Needs a file-backed database; the benchmark "
+        "data is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help="Inventory history rows the report aggregates.")
+        parser.add_argument('--workers', type=int, default=4, help="WSGI worker threads.")
+        parser.add_argument('--reports', type=int, default=8, help="Slow reports started before the lookups.")
+        parser.add_argument('--lookups', type=int, default=20, help="Stock lookups sent behind the reports.")
+
+    def handle(self, *args, **options):
+        if uses_in_memory_database():
+            raise CommandError("The benchmark needs a file-backed database that worker threads can share.")
+
+        user, stock_items = self.seed(options['rows'])
+        try:
+            token = str(AccessToken.for_user(user))
+            report_urls = [
+                # Distinct date ranges, so no report is served from the report cache.
+                f'/api/reports/medication-usage/?start_date={date(2000, 1, 1) + timedelta(days=index)}&end_date={date.today()}'
+                for index in range(options['reports'])
+            ]
+            lookup_urls = [f'/api/stockitems/{stock_items[index % len(stock_items)].pk}/' for index in range(options['lookups'])]
+
+            wsgi = self.run_wsgi(options['workers'], report_urls, lookup_urls, token)
+            with override_settings(ROOT_URLCONF=ASGI_URLCONF):
+                asgi = asyncio.run(self.run_asgi(report_urls, lookup_urls, token))
+        finally:
+            InventoryHistory.objects.filter(stock_item__in=stock_items)._raw_delete(InventoryHistory.objects.db)
+            StockItem.objects.filter(pk__in=[item.pk for item in stock_items])._raw_delete(StockItem.objects.db)
+            user.delete()
+
+        self.stdout.write(f"{options['reports']} slow reports, then {options['lookups']} stock lookups:")
+        self.summarise(f"WSGI, {options['workers']} worker threads", *wsgi)
+        self.summarise("ASGI, 1 event loop", *asgi)
+
+    def seed(self, rows):
+        # Inserted without signals; handle() removes them the same way.
+        user = User.objects.create(username='benchmark-async-reports', is_superuser=True)
+        stock_items = StockItem.objects.bulk_create([StockItem(name=f'Benchmark Stock Item {index}') for index in range(50)])
+        InventoryHistory.objects.bulk_create([
+            InventoryHistory(
+                stock_item=stock_items[index % 50], transaction_type='Out', quantity_change=Decimal('-1.00'),
+                new_stock_level=Decimal('10.00'), processed_by=user
+            )
+            for index in range(rows)
+        ], batch_size=5000)
+        return user, stock_items
+
+    def run_wsgi(self, workers, report_urls, lookup_urls, token):
+        """
+        Requests queue for a fixed pool of threads, as with a threaded WSGI server.
+        """
+        def timed_get(url, submitted):
+            try:
+                response = Client(HTTP_AUTHORIZATION=f'Bearer {token}').get(url)
+                return response.status_code, time.perf_counter() - submitted
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            reports = [pool.submit(timed_get, url, time.perf_counter()) for url in report_urls]
+            lookups = [pool.submit(timed_get, url, time.perf_counter()) for url in lookup_urls]
+            return [future.result() for future in reports], [future.result() for future in lookups]
+
+    async def run_asgi(self, report_urls, lookup_urls, token):
+        application = ASGIHandler()
+
+        async def timed_get(url):
+            submitted = time.perf_counter()
+            response_status = await asgi_get(application, url, token)
+            return response_status, time.perf_counter() - submitted
+
+        reports = [asyncio.create_task(timed_get(url)) for url in report_urls]
+        lookups = [asyncio.create_task(timed_get(url)) for url in lookup_urls]
+        return await asyncio.gather(*reports), await asyncio.gather(*lookups)
+
+    def summarise(self, label, reports, lookups):
+        failed = [response_status for response_status, _ in [*reports, *lookups] if response_status != 200]
+        if failed:
+            raise CommandError(f"{label}: {len(failed)} requests failed (status {failed[0]}).")
+        lookup_ms = sorted(seconds * 1000 for _, seconds in lookups)
+        report_ms = [seconds * 1000 for _, seconds in reports]
+        self.stdout.write(
+            f"  {label}: stock lookups median {statistics.median(lookup_ms):,.0f} ms, "
+            f"max {lookup_ms[-1]:,.0f} ms; reports median {statistics.median(report_ms):,.0f} ms"
+        )
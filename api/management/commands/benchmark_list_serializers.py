@@ -0,0 +1,113 @@
+# healthlink-backend/api/management/commands/benchmark_list_serializers.py
+
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import FastListMixin, compile_field_plan
+from api.models import (
+    User, Patient, PatientVisit, Medication, Prescription, PaymentTransaction, StockItem, InventoryHistory
+)
+from api.views import (
+    PatientVisitListCreateView, PrescriptionListCreateView,
+    PaymentTransactionListCreateView, InventoryHistoryListCreateView
+)
+
+
+BENCHMARKED_VIEWS = (
+    PatientVisitListCreateView, PrescriptionListCreateView,
+    PaymentTransactionListCreateView, InventoryHistoryListCreateView,
+)
+# Speedup on 1,000-row pages a view needs before it lists through FastListMixin.
+TARGET_SPEEDUP = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the serializer and fast read paths of the high-volume list endpoints on pages "
+        f"of --rows rows, flagging those below the {TARGET_SPEEDUP}x target. Test data is created "
+        "inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows per page.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per path; the best one is reported.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            self.seed(rows)
+            for view_class in BENCHMARKED_VIEWS:
+                self.benchmark(view_class, rows, repeat)
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        users = User.objects.bulk_create([User(username=f'benchmark-user-{index}') for index in range(20)])
+        patients = Patient.objects.bulk_create([
+            Patient(first_name='Benchmark', last_name=f'Patient {index}', date_of_birth=date(1990, 1, 1), gender='F')
+            for index in range(50)
+        ])
+        medication = Medication.objects.create(name='Benchmark Medication')
+        stock_item = StockItem.objects.create(name='Benchmark Stock Item')
+        visits = PatientVisit.objects.bulk_create([
+            PatientVisit(patient=patients[index % 50], reason='Benchmark', attending_physician=users[index % 20] if index % 3 else None)
+            for index in range(rows)
+        ])
+        Prescription.objects.bulk_create([
+            Prescription(
+                patient_visit=visits[index], medication=medication, dosage='1 tablet', frequency='Daily',
+                duration_days=5, prescribed_by=users[index % 20] if index % 2 else None
+            )
+            for index in range(rows)
+        ])
+        PaymentTransaction.objects.bulk_create([
+            PaymentTransaction(
+                patient=patients[index % 50] if index % 4 else None, amount=Decimal('12.50'),
+                payment_method='Cash', processed_by=users[index % 20]
+            )
+            for index in range(rows)
+        ])
+        InventoryHistory.objects.bulk_create([
+            InventoryHistory(
+                stock_item=stock_item if index % 5 else None, transaction_type='Out',
+                quantity_change=Decimal('-1.00'), new_stock_level=Decimal('10.00'), processed_by=users[index % 20]
+            )
+            for index in range(rows)
+        ])
+
+    def benchmark(self, view_class, rows, repeat):
+        serializer_class = view_class.serializer_class
+        queryset = view_class.queryset
+        plan = compile_field_plan(serializer_class, tuple(serializer_class().fields))
+        if plan is None:
+            raise CommandError(f"{serializer_class.__name__} has no fast read path.")
+
+        def serializer_path():
+            return JSONRenderer().render(serializer_class(queryset.all()[:rows], many=True).data)
+
+        def fast_path():
+            return JSONRenderer().render(plan.render(plan.project(queryset.all())[:rows]))
+
+        if serializer_path() != fast_path():
+            raise CommandError(f"{view_class.__name__}: fast output differs from the serializer output.")
+
+        slow, fast = self.best_time(serializer_path, repeat), self.best_time(fast_path, repeat)
+        enabled = 'FastListMixin' if issubclass(view_class, FastListMixin) else 'serializer list'
+        self.stdout.write(
+            f"{view_class.__name__} ({enabled}): serializer {rows / slow:,.0f} rows/s, "
+            f"fast {rows / fast:,.0f} rows/s, {slow / fast:.1f}x"
+            f"{'' if slow / fast >= TARGET_SPEEDUP else f' (below the {TARGET_SPEEDUP}x target)'}"
+        )
+
+    @staticmethod
+    def best_time(run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,19 @@
+# healthlink-backend/api/management/commands/detect_duplicate_patients.py
+
+from django.core.management.base import BaseCommand
+
+from api.dedup import run_duplicate_detection
+
+
+class Command(BaseCommand):
+    help = (
+        "Finds pairs of patient records that may be the same person and queues them for review. "
+        "Pending candidates are replaced; confirmed and dismissed pairs are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-score', type=float, help="Lowest similarity (0-1) to queue a pair.")
+
+    def handle(self, *args, **options):
+        count = run_duplicate_detection(min_score=options['min_score'])
+        self.stdout.write(self.style.SUCCESS(f"{count} duplicate candidates pending review."))
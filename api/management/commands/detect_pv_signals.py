@@ -0,0 +1,23 @@
+# healthlink-backend/api/management/commands/detect_pv_signals.py
+
+from django.core.management.base import BaseCommand
+
+from api.pharmacovigilance import run_signal_detection
+
+
+class Command(BaseCommand):
+    help = "Recomputes pharmacovigilance signals (PRR/ROR) over the ADR and AEFI reports and replaces the stored ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['ADR', 'AEFI'], action='append', help="Only recompute this source. May be repeated.")
+        parser.add_argument('--min-cases', type=int, help="Minimum reports for a product/reaction pair.")
+        parser.add_argument('--min-prr', type=float, help="Minimum proportional reporting ratio.")
+        parser.add_argument('--min-chi-squared', type=float, help="Minimum Yates-corrected chi-squared.")
+
+    def handle(self, *args, **options):
+        counts = run_signal_detection(
+            sources=options['source'] or ('ADR', 'AEFI'),
+            min_cases=options['min_cases'], min_prr=options['min_prr'], min_chi_squared=options['min_chi_squared'],
+        )
+        for source, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f"{source}: {count} signals flagged."))
@@ -0,0 +1,30 @@
+# healthlink-backend/api/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+
+from api.clinical_search import get_clinical_search_backend, rebuild_clinical_search_index
+from api.search import get_patient_search_backend, rebuild_patient_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes every patient's search key and rebuilds the patient search index of "
+        "PATIENT_SEARCH_BACKEND, then the clinical notes index of CLINICAL_SEARCH_BACKEND."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Records indexed per query.")
+        parser.add_argument(
+            '--only', choices=['patients', 'clinical'],
+            help="Rebuild just the patient search or the clinical notes index."
+        )
+
+    def handle(self, *args, **options):
+        if options['only'] != 'clinical':
+            count = rebuild_patient_search_index(batch_size=options['batch_size'])
+            backend = get_patient_search_backend()
+            self.stdout.write(self.style.SUCCESS(f"{count} patients indexed for '{backend.name}' search."))
+        if options['only'] != 'patients':
+            count = rebuild_clinical_search_index(batch_size=options['batch_size'])
+            backend = get_clinical_search_backend()
+            self.stdout.write(self.style.SUCCESS(f"{count} clinical records indexed for '{backend.name}' search."))
@@ -0,0 +1,31 @@
+# healthlink-backend/api/management/commands/run_report_jobs.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.report_jobs import claim_next_report_job, run_report_job
+
+
+class Command(BaseCommand):
+    help = "Processes queued report jobs outside the web workers. Runs until interrupted unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process every pending job, then exit.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to wait between polls when the queue is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_report_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Running report job {job.id} ({job.report_type})...")
+            job = run_report_job(job)
+            if job.status == 'Completed':
+                self.stdout.write(self.style.SUCCESS(f"Report job {job.id} completed with {job.row_count} rows."))
+            else:
+                self.stdout.write(self.style.ERROR(f"Report job {job.id} failed: {job.error}"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:10
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_adversedrugreaction_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='amount_covered_by_insurance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Amount paid by insurance', max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))]),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='insurance_policy_number',
+            field=models.CharField(blank=True, help_text="Patient's insurance policy number", max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='patient_paid_amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Amount paid by the patient out-of-pocket', max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))]),
+        ),
+    ]
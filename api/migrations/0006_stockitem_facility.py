@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockitem',
+            name='facility',
+            field=models.ForeignKey(blank=True, help_text='Facility that holds this stock.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_items', to='api.facility'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_stockitem_facility'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['facility', 'expiry_date'], name='api_stockit_facilit_c6cb62_idx'),
+        ),
+    ]
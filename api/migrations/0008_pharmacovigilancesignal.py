@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_stockitem_facility_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PharmacovigilanceSignal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('ADR', 'Adverse Drug Reaction'), ('AEFI', 'Adverse Event Following Immunization')], max_length=10)),
+                ('product_name', models.CharField(help_text='Medication or vaccine name the signal is about.', max_length=255)),
+                ('reaction_term', models.CharField(help_text='Normalised reaction term taken from the report descriptions.', max_length=255)),
+                ('case_count', models.PositiveIntegerField(help_text='Reports mentioning both the product and the reaction (a).')),
+                ('product_report_count', models.PositiveIntegerField(help_text='Reports for the product (a + b).')),
+                ('term_report_count', models.PositiveIntegerField(help_text='Reports mentioning the reaction (a + c).')),
+                ('total_report_count', models.PositiveIntegerField(help_text='All reports considered (a + b + c + d).')),
+                ('prr', models.FloatField(help_text='Proportional reporting ratio.')),
+                ('prr_lower', models.FloatField()),
+                ('prr_upper', models.FloatField()),
+                ('ror', models.FloatField(help_text='Reporting odds ratio.')),
+                ('ror_lower', models.FloatField()),
+                ('ror_upper', models.FloatField()),
+                ('chi_squared', models.FloatField(help_text='Yates-corrected chi-squared statistic.')),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('medication', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pharmacovigilance_signals', to='api.medication')),
+            ],
+            options={
+                'verbose_name': 'Pharmacovigilance Signal',
+                'verbose_name_plural': 'Pharmacovigilance Signals',
+                'ordering': ['source', '-ror_lower'],
+                'indexes': [models.Index(fields=['source', 'product_name'], name='api_pharmac_source_39c4a9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_pharmacovigilancesignal'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='inventoryhistory',
+            options={'ordering': ['-transaction_date', '-id'], 'verbose_name': 'Inventory History', 'verbose_name_plural': 'Inventory History'},
+        ),
+        migrations.AlterModelOptions(
+            name='orderhistory',
+            options={'ordering': ['-change_date', '-id'], 'verbose_name': 'Order History', 'verbose_name_plural': 'Order History'},
+        ),
+        migrations.AlterModelOptions(
+            name='patientvisit',
+            options={'ordering': ['-visit_date', '-id'], 'verbose_name': 'Patient Visit', 'verbose_name_plural': 'Patient Visits'},
+        ),
+        migrations.AlterModelOptions(
+            name='paymenttransaction',
+            options={'ordering': ['-transaction_date', '-id'], 'verbose_name': 'Payment Transaction', 'verbose_name_plural': 'Payment Transactions'},
+        ),
+        migrations.AddIndex(
+            model_name='inventoryhistory',
+            index=models.Index(fields=['-transaction_date', '-id'], name='api_invento_transac_d8f136_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderhistory',
+            index=models.Index(fields=['-change_date', '-id'], name='api_orderhi_change__821334_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientvisit',
+            index=models.Index(fields=['-visit_date', '-id'], name='api_patient_visit_d_764eba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['-transaction_date', '-id'], name='api_payment_transac_259450_idx'),
+        ),
+    ]
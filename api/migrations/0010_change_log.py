@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_change_log(apps, schema_editor):
+    # Existing records get one upsert entry each, so a first sync from token 0
+    # returns everything.
+    ChangeLogEntry = apps.get_model('api', 'ChangeLogEntry')
+    sources = [
+        ('Patient', None), ('Medication', None), ('StockItem', 'facility_id'),
+        ('PatientVisit', 'facility_id'), ('Vitals', 'patient_visit__facility_id'),
+        ('Prescription', 'patient_visit__facility_id'),
+    ]
+    for model_name, facility_lookup in sources:
+        model = apps.get_model('api', model_name)
+        rows = model.objects.order_by('pk')
+        rows = rows.values_list('pk', facility_lookup) if facility_lookup else rows.values_list('pk', 'pk')
+        ChangeLogEntry.objects.bulk_create(
+            [
+                ChangeLogEntry(
+                    model=model_name.lower(), object_id=pk, action='upsert',
+                    facility_id=facility_id if facility_lookup else None
+                )
+                for pk, facility_id in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(help_text="Model label of the changed record, e.g. 'patient'.", max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('upsert', 'Created or Updated'), ('delete', 'Deleted')], max_length=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('facility', models.ForeignKey(blank=True, db_constraint=False, help_text='Facility the record belongs to; empty for records every facility syncs.', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.facility')),
+            ],
+            options={
+                'verbose_name': 'Change Log Entry',
+                'verbose_name_plural': 'Change Log',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['facility', 'id'], name='api_changel_facilit_d7d899_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_change_log, migrations.RunPython.noop),
+    ]
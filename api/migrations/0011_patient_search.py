@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from api.search import patient_search_key
+
+
+def backfill_search_keys(apps, schema_editor):
+    # Existing patients get their search key and token rows, the B-tree
+    # backend's index. The FTS5 table is filled by rebuild_search_index.
+    Patient = apps.get_model('api', 'Patient')
+    PatientSearchToken = apps.get_model('api', 'PatientSearchToken')
+    patients = list(Patient.objects.only('first_name', 'last_name', 'national_id', 'phone_number'))
+    for patient in patients:
+        patient.search_key = patient_search_key(patient)
+    Patient.objects.bulk_update(patients, ['search_key'], batch_size=1000)
+    PatientSearchToken.objects.bulk_create(
+        [
+            PatientSearchToken(patient_id=patient.pk, token=token)
+            for patient in patients for token in patient.search_key.split()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='search_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=300),
+        ),
+        migrations.CreateModel(
+            name='PatientSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='api.patient')),
+            ],
+            options={
+                'unique_together': {('token', 'patient')},
+            },
+        ),
+        migrations.RunPython(backfill_search_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_patient_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicatePatientCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Similarity of the two records, from 0 to 1.')),
+                ('blocking_key', models.CharField(help_text="Block the pair was compared in, e.g. 'surname:U200:A:1990:F'.", max_length=100)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Confirmed', 'Confirmed'), ('Dismissed', 'Dismissed')], default='Pending', max_length=20)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('patient_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.patient')),
+                ('patient_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.patient')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_duplicate_candidates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Duplicate Patient Candidate',
+                'verbose_name_plural': 'Duplicate Patient Candidates',
+                'ordering': ['-score', 'id'],
+                'indexes': [models.Index(fields=['status', '-score'], name='api_duplica_status_a527aa_idx')],
+                'unique_together': {('patient_a', 'patient_b')},
+            },
+        ),
+    ]
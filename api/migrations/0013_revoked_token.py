@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_duplicate_patient_candidate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(blank=True, help_text="ID of the revoked token; empty when revoking all of a user's tokens.", max_length=255, null=True, unique=True)),
+                ('revoked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True, help_text='When the tokens this entry covers have all expired.')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, help_text='User whose tokens issued up to revoked_at are all revoked.', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Revoked Token',
+                'verbose_name_plural': 'Revoked Tokens',
+                'ordering': ['-revoked_at'],
+            },
+        ),
+    ]
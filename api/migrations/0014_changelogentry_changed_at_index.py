@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_revoked_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['changed_at'], name='api_changel_changed_0dbe04_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_clinical_search_table(apps, schema_editor):
+    # FTS5 is SQLite only; other databases use the 'scan' clinical search backend.
+    # Only the body is tokenized; the other columns are stored for filtering and results.
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS api_clinical_search_fts USING fts5("
+            "body, type UNINDEXED, object_id UNINDEXED, patient_id UNINDEXED, facility_id UNINDEXED, "
+            "recorded_on UNINDEXED, tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_clinical_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS api_clinical_search_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_changelogentry_changed_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_clinical_search_table, drop_clinical_search_table),
+    ]
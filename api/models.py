@@ -78,6 +78,7 @@ class StockItem(models.Model):
     sale_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, validators=[MinValueValidator(Decimal('0.00'))])
     expiry_date = models.DateField(null=True, blank=True)
     supplier = models.ForeignKey('api.Supplier', on_delete=models.SET_NULL, null=True, blank=True, related_name='stock_items')
+    facility = models.ForeignKey(Facility, on_delete=models.CASCADE, null=True, blank=True, related_name='stock_items', help_text="Facility that holds this stock.")
     reorder_level = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), validators=[MinValueValidator(Decimal('0.00'))], help_text="Minimum stock level before reordering is triggered.")
     location = models.CharField(max_length=255, blank=True, null=True, help_text="Physical location of the stock item in the facility.")
     is_active = models.BooleanField(default=True, help_text="Is the stock item currently in use or available?")
@@ -89,6 +90,9 @@ class StockItem(models.Model):
     class Meta:
         unique_together = ('name', 'supplier') # Ensures that a stock item from a specific supplier is unique
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['facility', 'expiry_date']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.current_stock} {self.unit}s)"
@@ -184,6 +188,8 @@ class Patient(models.Model):
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(max_length=255, blank=True, null=True)
     national_id = models.CharField(max_length=50, unique=True, blank=True, null=True)
+    # Normalised name, national ID and phone tokens; see api/search.py.
+    search_key = models.CharField(max_length=300, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -196,6 +202,61 @@ class Patient(models.Model):
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        from .search import patient_search_key
+        self.search_key = patient_search_key(self)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'search_key'}
+        super().save(*args, **kwargs)
+
+
+class PatientSearchToken(models.Model):
+    """
+    One row per token of a patient's search key. Prefix searches are range
+    scans of the (token, patient) index.
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('token', 'patient')
+
+    def __str__(self):
+        return f"{self.token} -> {self.patient_id}"
+
+
+# --- Duplicate Patient Candidate Model ---
+class DuplicatePatientCandidate(models.Model):
+    """
+    Two patient records that may be the same person, found in batch by
+    `python manage.py detect_duplicate_patients` and reviewed by staff.
+    patient_a is the older record (lower id).
+    """
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Confirmed', 'Confirmed'),
+        ('Dismissed', 'Dismissed'),
+    ]
+
+    patient_a = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+')
+    patient_b = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(help_text="Similarity of the two records, from 0 to 1.")
+    blocking_key = models.CharField(max_length=100, help_text="Block the pair was compared in, e.g. 'surname:U200:A:1990:F'.")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_duplicate_candidates')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    detected_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Duplicate Patient Candidate'
+        verbose_name_plural = 'Duplicate Patient Candidates'
+        ordering = ['-score', 'id']
+        unique_together = ('patient_a', 'patient_b')
+        indexes = [models.Index(fields=['status', '-score'])]
+
+    def __str__(self):
+        return f"Patients {self.patient_a_id} / {self.patient_b_id} ({self.score:.2f}, {self.status})"
+
 
 # --- Allergy Model ---
 class Allergy(models.Model):
@@ -273,7 +334,8 @@ class PatientVisit(models.Model):
     class Meta:
         verbose_name = 'Patient Visit'
         verbose_name_plural = 'Patient Visits'
-        ordering = ['-visit_date']
+        ordering = ['-visit_date', '-id']
+        indexes = [models.Index(fields=['-visit_date', '-id'])] # keyset pagination order
 
     def __str__(self):
         return f"Visit for {self.patient.get_full_name()} on {self.visit_date.strftime('%Y-%m-%d')}"
@@ -389,7 +451,8 @@ class OrderHistory(models.Model):
     class Meta:
         verbose_name = 'Order History'
         verbose_name_plural = 'Order History'
-        ordering = ['-change_date']
+        ordering = ['-change_date', '-id']
+        indexes = [models.Index(fields=['-change_date', '-id'])] # keyset pagination order
 
     def __str__(self):
         return f"Order {self.order.id} - {self.action} on {self.change_date.strftime('%Y-%m-%d %H:%M')}"
@@ -411,6 +474,9 @@ class PaymentTransaction(models.Model):
     payment_method = models.CharField(max_length=50, choices=PAYMENT_METHOD_CHOICES)
     transaction_date = models.DateTimeField(default=timezone.now)
     processed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='processed_payments')
+    amount_covered_by_insurance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), validators=[MinValueValidator(Decimal('0.00'))], help_text="Amount paid by insurance")
+    patient_paid_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), validators=[MinValueValidator(Decimal('0.00'))], help_text="Amount paid by the patient out-of-pocket")
+    insurance_policy_number = models.CharField(max_length=255, blank=True, null=True, help_text="Patient's insurance policy number")
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -418,7 +484,8 @@ class PaymentTransaction(models.Model):
     class Meta:
         verbose_name = 'Payment Transaction'
         verbose_name_plural = 'Payment Transactions'
-        ordering = ['-transaction_date']
+        ordering = ['-transaction_date', '-id']
+        indexes = [models.Index(fields=['-transaction_date', '-id'])] # keyset pagination order
 
     def __str__(self):
         return f"Payment of {self.amount} by {self.patient.get_full_name() if self.patient else 'N/A'} ({self.payment_method})"
@@ -446,7 +513,140 @@ class InventoryHistory(models.Model):
     class Meta:
         verbose_name = 'Inventory History'
         verbose_name_plural = 'Inventory History'
-        ordering = ['-transaction_date']
+        ordering = ['-transaction_date', '-id']
+        indexes = [models.Index(fields=['-transaction_date', '-id'])] # keyset pagination order
+
+    def __str__(self):
+        return f"Inventory change for {self.stock_item.name if self.stock_item else 'Deleted Item'} - {self.transaction_type} of {self.quantity_change}"
+
+# --- Report Job Model ---
+class ReportJob(models.Model):
+    REPORT_TYPE_CHOICES = [
+        ('medication-usage', 'Medication Usage'),
+        ('insurance-dispensing', 'Insurance Dispensing'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    report_type = models.CharField(max_length=50, choices=REPORT_TYPE_CHOICES)
+    params = models.JSONField(default=dict, blank=True, help_text="Query parameters the report is computed with.")
+    output_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    facility = models.ForeignKey(Facility, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    result_file = models.CharField(max_length=500, blank=True, null=True, help_text="Path of the generated report on local storage.")
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Report Job'
+        verbose_name_plural = 'Report Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Report job {self.id} ({self.report_type}) - {self.status}"
+
+
+# --- Pharmacovigilance Signal Model ---
+class PharmacovigilanceSignal(models.Model):
+    SOURCE_CHOICES = [
+        ('ADR', 'Adverse Drug Reaction'),
+        ('AEFI', 'Adverse Event Following Immunization'),
+    ]
+
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    medication = models.ForeignKey(Medication, on_delete=models.SET_NULL, null=True, blank=True, related_name='pharmacovigilance_signals')
+    product_name = models.CharField(max_length=255, help_text="Medication or vaccine name the signal is about.")
+    reaction_term = models.CharField(max_length=255, help_text="Normalised reaction term taken from the report descriptions.")
+    case_count = models.PositiveIntegerField(help_text="Reports mentioning both the product and the reaction (a).")
+    product_report_count = models.PositiveIntegerField(help_text="Reports for the product (a + b).")
+    term_report_count = models.PositiveIntegerField(help_text="Reports mentioning the reaction (a + c).")
+    total_report_count = models.PositiveIntegerField(help_text="All reports considered (a + b + c + d).")
+    prr = models.FloatField(help_text="Proportional reporting ratio.")
+    prr_lower = models.FloatField()
+    prr_upper = models.FloatField()
+    ror = models.FloatField(help_text="Reporting odds ratio.")
+    ror_lower = models.FloatField()
+    ror_upper = models.FloatField()
+    chi_squared = models.FloatField(help_text="Yates-corrected chi-squared statistic.")
+    detected_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Pharmacovigilance Signal'
+        verbose_name_plural = 'Pharmacovigilance Signals'
+        ordering = ['source', '-ror_lower']
+        indexes = [models.Index(fields=['source', 'product_name'])]
+
+    def __str__(self):
+        return f"{self.source} signal: {self.product_name} - {self.reaction_term} (PRR {self.prr:.2f})"
+
+
+# --- Change Log Model (delta sync) ---
+class ChangeLogEntry(models.Model):
+    """
+    One row per create, update or delete of a record offline clients sync.
+    The auto-increment id is the change token clients pass back as ?since=.
+    """
+    ACTION_CHOICES = [
+        ('upsert', 'Created or Updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    model = models.CharField(max_length=50, help_text="Model label of the changed record, e.g. 'patient'.")
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Kept after the facility is gone so tombstones stay scoped.
+    facility = models.ForeignKey(
+        Facility, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+',
+        help_text="Facility the record belongs to; empty for records every facility syncs."
+    )
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Change Log Entry'
+        verbose_name_plural = 'Change Log'
+        ordering = ['id']
+        indexes = [models.Index(fields=['facility', 'id']), models.Index(fields=['changed_at'])]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.model} {self.object_id}"
+
+
+# --- Revoked Token Model (stateless JWT denylist) ---
+class RevokedToken(models.Model):
+    """
+    A revoked JWT, by its jti, or every token of a user issued up to
+    revoked_at, e.g. after their role or facility changed. Rows are only
+    needed until the tokens they cover have expired.
+    """
+    jti = models.CharField(max_length=255, unique=True, null=True, blank=True, help_text="ID of the revoked token; empty when revoking all of a user's tokens.")
+    # Kept after the user is gone so their tokens stay revoked.
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+',
+        help_text="User whose tokens issued up to revoked_at are all revoked."
+    )
+    revoked_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True, help_text="When the tokens this entry covers have all expired.")
+
+    class Meta:
+        verbose_name = 'Revoked Token'
+        verbose_name_plural = 'Revoked Tokens'
+        ordering = ['-revoked_at']
 
     def __str__(self):
-        return f"Inventory change for {self.stock_item.name if self.stock_item else 'Deleted Item'} - {self.transaction_type} of {self.quantity_change}"
\ No newline at end of file
+        return f"Token {self.jti}" if self.jti else f"Tokens of user {self.user_id} up to {self.revoked_at}"
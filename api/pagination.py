@@ -0,0 +1,87 @@
+# healthlink-backend/api/pagination.py
+
+from django.core.paginator import InvalidPage, Paginator as DjangoPaginator
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PrecountedPaginator(DjangoPaginator):
+    """
+    Django paginator that can be handed a row count computed elsewhere
+    (e.g. in the same aggregate as report totals) instead of issuing its own COUNT(*).
+    """
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.__dict__['count'] = count # Prime the cached_property
+
+
+async def apaginate_page_number(paginator, queryset, request, count):
+    """
+    PageNumberPagination.paginate_queryset() for async views: `count` is
+    supplied by the caller and the page is read with the async ORM.
+    """
+    paginator.request = request
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+
+    django_paginator = PrecountedPaginator(queryset, page_size, count=count)
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        paginator.page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    if django_paginator.num_pages > 1 and paginator.template is not None:
+        paginator.display_page_controls = True
+
+    paginator.page.object_list = [row async for row in paginator.page.object_list]
+    return paginator.page.object_list
+
+
+class ReportPagination(PageNumberPagination):
+    """
+    Page-number pagination for report endpoints, with a client-selectable page size.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_counted_queryset(self, queryset, request, count, view=None):
+        self.django_paginator_class = lambda object_list, per_page: PrecountedPaginator(object_list, per_page, count=count)
+        return self.paginate_queryset(queryset, request, view=view)
+
+    async def apaginate_counted_queryset(self, queryset, request, count, view=None):
+        return await apaginate_page_number(self, queryset, request, count)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination for append-heavy tables. A page is selected with a WHERE on
+    the leading ordering column rather than an OFFSET, and no COUNT(*) is run, so
+    deep pages cost the same as the first one.
+
+    Subclasses set `ordering` to an indexed ordering that ends in `id`, which keeps
+    rows sharing a timestamp in a stable order across pages.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    # Reads the leading ordering column from a page row that isn't a model instance
+    # (see FastListMixin, whose rows are .values_list() tuples).
+    position_getter = None
+
+    def _get_position_from_instance(self, instance, ordering):
+        if self.position_getter is not None:
+            return str(self.position_getter(instance))
+        return super()._get_position_from_instance(instance, ordering)
+
+
+class TransactionDateCursorPagination(KeysetPagination):
+    ordering = ('-transaction_date', '-id')
+
+
+class ChangeDateCursorPagination(KeysetPagination):
+    ordering = ('-change_date', '-id')
+
+
+class VisitDateCursorPagination(KeysetPagination):
+    ordering = ('-visit_date', '-id')
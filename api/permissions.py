@@ -1,5 +1,35 @@
 
 from rest_framework import permissions
+from rest_framework.exceptions import ParseError, PermissionDenied
+
+
+def has_role(request, role_name):
+    """
+    Whether the requesting user has the named role. The authentication
+    classes load the role with the user (see api/authentication.py), so
+    this is an in-memory check however many permissions an OR-chain tries.
+    """
+    role = getattr(request.user, 'role', None) if request.user.is_authenticated else None
+    return role is not None and role.name == role_name
+
+def effective_facility_id(request):
+    """
+    The facility a request's data is scoped to: a staff member's own
+    facility, or for super admins the one picked with `?facility=`, None
+    meaning every facility. Staff without a facility are refused rather than
+    shown every facility's data.
+    """
+    if not request.user.is_superuser:
+        if request.user.facility_id is None:
+            raise PermissionDenied("Your account is not assigned to a facility.")
+        return request.user.facility_id
+    facility = request.query_params.get('facility')
+    if not facility:
+        return None
+    try:
+        return int(facility)
+    except ValueError:
+        raise ParseError("facility must be an integer id.")
 
 class IsSuperAdmin(permissions.BasePermission):
     """
@@ -13,33 +43,32 @@ class IsFacilityAdmin(permissions.BasePermission):
     Custom permission to only allow facility admins.
     """
     def has_permission(self, request, view):
-        return (request.user.is_authenticated and 
-                request.user.role and 
-                request.user.role.name == 'Facility Admin')
+        return has_role(request, 'Facility Admin')
 
 class IsDoctor(permissions.BasePermission):
     """
     Custom permission to only allow doctors.
     """
     def has_permission(self, request, view):
-        return (request.user.is_authenticated and 
-                request.user.role and 
-                request.user.role.name == 'Doctor')
+        return has_role(request, 'Doctor')
 
 class IsNurse(permissions.BasePermission):
     """
     Custom permission to only allow nurses.
     """
     def has_permission(self, request, view):
-        return (request.user.is_authenticated and 
-                request.user.role and 
-                request.user.role.name == 'Nurse')
+        return has_role(request, 'Nurse')
 
 class IsPharmacist(permissions.BasePermission):
     """
     Custom permission to only allow pharmacists.
     """
     def has_permission(self, request, view):
-        return (request.user.is_authenticated and 
-                request.user.role and 
-                request.user.role.name == 'Pharmacist')
+        return has_role(request, 'Pharmacist')
+
+class IsRegionalManager(permissions.BasePermission):
+    """
+    Custom permission to only allow regional managers.
+    """
+    def has_permission(self, request, view):
+        return has_role(request, 'Regional Manager')
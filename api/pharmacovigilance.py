@@ -0,0 +1,195 @@
+# healthlink-backend/api/pharmacovigilance.py
+
+import re
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AdverseDrugReaction, AdverseEventFollowingImmunization, Medication, PharmacovigilanceSignal
+
+
+# Reaction descriptions are free text; terms are separated by list punctuation or new lines.
+TERM_SEPARATORS = re.compile(r'[,;/\n]+')
+MAX_TERM_LENGTH = 255
+
+# Two-sided 95% normal quantile used for the log-scale confidence intervals.
+Z_95 = 1.959963984540054
+
+READ_CHUNK_SIZE = 5000
+
+
+def normalise_reaction_terms(description):
+    """
+    Splits a free-text reaction description into distinct, lower-cased terms.
+    """
+    terms = []
+    for part in TERM_SEPARATORS.split(description or ''):
+        term = ' '.join(part.split()).strip(' .:-').lower()[:MAX_TERM_LENGTH]
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def build_report_pairs(reports):
+    """
+    Encodes (product_key, description) rows as integer codes.
+
+    Returns (product_keys, terms, report_products, pair_reports, pair_terms) where
+    report_products holds one product code per report and each (report, term)
+    mention is listed once in pair_reports/pair_terms.
+    """
+    product_codes, term_codes = {}, {}
+    report_products, pair_reports, pair_terms = [], [], []
+    for product_key, description in reports:
+        terms = normalise_reaction_terms(description)
+        if not terms:
+            continue
+        report_index = len(report_products)
+        report_products.append(product_codes.setdefault(product_key, len(product_codes)))
+        for term in terms:
+            pair_reports.append(report_index)
+            pair_terms.append(term_codes.setdefault(term, len(term_codes)))
+    return (
+        list(product_codes), list(term_codes),
+        np.asarray(report_products, dtype=np.int64),
+        np.asarray(pair_reports, dtype=np.int64),
+        np.asarray(pair_terms, dtype=np.int64),
+    )
+
+
+def disproportionality(a, product_totals, term_totals, total):
+    """
+    PRR, ROR (with 95% CIs) and Yates chi-squared for every product/term pair at once.
+
+    `a` holds the pair counts and `product_totals`/`term_totals` the matching
+    marginal report counts. Pairs with an empty cell get a 0.5 (Haldane) correction
+    so that every ratio stays finite.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(product_totals, dtype=np.float64) - a
+    c = np.asarray(term_totals, dtype=np.float64) - a
+    d = float(total) - a - b - c
+
+    chi_squared = np.zeros_like(a)
+    denominator = (a + b) * (c + d) * (a + c) * (b + d)
+    np.divide(
+        total * np.square(np.maximum(np.abs(a * d - b * c) - total / 2, 0)),
+        denominator, out=chi_squared, where=denominator > 0
+    )
+
+    correction = np.where((a == 0) | (b == 0) | (c == 0) | (d == 0), 0.5, 0.0)
+    a, b, c, d = a + correction, b + correction, c + correction, d + correction
+
+    prr = (a / (a + b)) / (c / (c + d))
+    prr_se = np.sqrt(1 / a - 1 / (a + b) + 1 / c - 1 / (c + d))
+    ror = (a * d) / (b * c)
+    ror_se = np.sqrt(1 / a + 1 / b + 1 / c + 1 / d)
+    return {
+        'prr': prr,
+        'prr_lower': prr * np.exp(-Z_95 * prr_se),
+        'prr_upper': prr * np.exp(Z_95 * prr_se),
+        'ror': ror,
+        'ror_lower': ror * np.exp(-Z_95 * ror_se),
+        'ror_upper': ror * np.exp(Z_95 * ror_se),
+        'chi_squared': chi_squared,
+    }
+
+
+def detect_signals(reports, min_cases=None, min_prr=None, min_chi_squared=None):
+    """
+    Scores every product/term pair in `reports` and returns the flagged ones.
+
+    A pair is flagged when it meets the Evans criteria (at least `min_cases`
+    reports, PRR >= `min_prr`, chi-squared >= `min_chi_squared`) and the lower
+    bound of the ROR confidence interval is above 1.
+    """
+    if min_cases is None:
+        min_cases = getattr(settings, 'PV_SIGNAL_MIN_CASES', 3)
+    if min_prr is None:
+        min_prr = getattr(settings, 'PV_SIGNAL_MIN_PRR', 2.0)
+    if min_chi_squared is None:
+        min_chi_squared = getattr(settings, 'PV_SIGNAL_MIN_CHI_SQUARED', 4.0)
+
+    product_keys, terms, report_products, pair_reports, pair_terms = build_report_pairs(reports)
+    total = len(report_products)
+    if not pair_terms.size:
+        return []
+
+    # Contingency cell `a` for every observed pair, plus the table margins.
+    pair_products = report_products[pair_reports]
+    pair_codes, a = np.unique(pair_products * len(terms) + pair_terms, return_counts=True)
+    products, term_indices = np.divmod(pair_codes, len(terms))
+    product_totals = np.bincount(report_products, minlength=len(product_keys))[products]
+    term_totals = np.bincount(pair_terms, minlength=len(terms))[term_indices]
+
+    stats = disproportionality(a, product_totals, term_totals, total)
+    flagged = np.flatnonzero(
+        (a >= min_cases) & (stats['prr'] >= min_prr)
+        & (stats['chi_squared'] >= min_chi_squared) & (stats['ror_lower'] > 1)
+    )
+
+    signals = []
+    for index in flagged:
+        signal = {name: float(values[index]) for name, values in stats.items()}
+        signal.update({
+            'product_key': product_keys[products[index]],
+            'reaction_term': terms[term_indices[index]],
+            'case_count': int(a[index]),
+            'product_report_count': int(product_totals[index]),
+            'term_report_count': int(term_totals[index]),
+            'total_report_count': total,
+        })
+        signals.append(signal)
+    return signals
+
+
+def adr_reports():
+    return AdverseDrugReaction.objects.filter(medication__isnull=False).order_by().values_list(
+        'medication_id', 'reaction_description'
+    ).iterator(chunk_size=READ_CHUNK_SIZE)
+
+
+def aefi_reports():
+    # Vaccine names are free text too: group them case-insensitively and
+    # report each under the first spelling seen.
+    display_names = {}
+    for name, description in AdverseEventFollowingImmunization.objects.order_by('id').values_list(
+        'immunization_name', 'event_description'
+    ).iterator(chunk_size=READ_CHUNK_SIZE):
+        name = ' '.join(name.split())
+        yield display_names.setdefault(name.lower(), name), description
+
+
+def _signal_records(source, signals):
+    if source == 'ADR':
+        names = dict(Medication.objects.filter(
+            pk__in={signal['product_key'] for signal in signals}
+        ).values_list('pk', 'name'))
+    detected_at = timezone.now()
+    records = []
+    for signal in signals:
+        product_key = signal.pop('product_key')
+        if source == 'ADR':
+            signal.update(medication_id=product_key, product_name=names.get(product_key, '')[:255])
+        else:
+            signal['product_name'] = product_key[:255]
+        records.append(PharmacovigilanceSignal(source=source, detected_at=detected_at, **signal))
+    return records
+
+
+def run_signal_detection(sources=('ADR', 'AEFI'), **thresholds):
+    """
+    Recomputes the signals for each source and replaces the stored ones.
+    Returns the number of flagged signals per source.
+    """
+    readers = {'ADR': adr_reports, 'AEFI': aefi_reports}
+    counts = {}
+    for source in sources:
+        records = _signal_records(source, detect_signals(readers[source](), **thresholds))
+        with transaction.atomic():
+            PharmacovigilanceSignal.objects.filter(source=source).delete()
+            PharmacovigilanceSignal.objects.bulk_create(records)
+        counts[source] = len(records)
+    return counts
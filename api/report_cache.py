@@ -0,0 +1,150 @@
+# healthlink-backend/api/report_cache.py
+
+import hashlib
+from functools import wraps
+from inspect import iscoroutinefunction
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .permissions import effective_facility_id
+
+
+# Reports are versioned per facility they're filtered to; those reading every
+# facility's data use this scope, which every ledger write bumps along with
+# the facilities it touched.
+ALL_FACILITIES = 'all'
+
+# Query params that never change the report body.
+UNCACHED_PARAMS = {'format'}
+
+
+def get_report_cache():
+    return caches[getattr(settings, 'REPORT_CACHE_ALIAS', 'default')]
+
+
+def _version_key(scope):
+    return f'report-version:{scope}'
+
+
+def get_report_version(scope):
+    """
+    Returns the current ledger version for a facility id (or ALL_FACILITIES).
+    """
+    return get_report_cache().get_or_set(_version_key(scope), 1, timeout=None)
+
+
+def bump_report_version(facility_id):
+    """
+    Invalidates every cached report that depends on the given facility's ledger.
+    """
+    cache = get_report_cache()
+    scopes = {ALL_FACILITIES} if facility_id is None else {facility_id, ALL_FACILITIES}
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            # Counter evicted or never read yet; any value not used before will do.
+            cache.set(_version_key(scope), 2, timeout=None)
+
+
+def invalidate_ledger_reports(facility_ids):
+    """
+    Bumps each facility's report version now and again once the current
+    transaction commits, so a report computed while the write was still
+    uncommitted is not served afterwards.
+    """
+    for facility_id in facility_ids:
+        bump_report_version(facility_id)
+        transaction.on_commit(lambda facility_id=facility_id: bump_report_version(facility_id))
+
+
+def normalise_query_params(query_params):
+    """
+    Order-independent, blank-free encoding of the request's query string.
+    """
+    items = sorted(
+        (key, value)
+        for key, values in query_params.lists() if key not in UNCACHED_PARAMS
+        for value in values if value != ''
+    )
+    return urlencode(items)
+
+
+def build_report_cache_key(view_name, query_params, facility_id, version):
+    params_digest = hashlib.sha1(normalise_query_params(query_params).encode()).hexdigest()
+    return f'report:{view_name}:facility={facility_id}:v{version}:{params_digest}'
+
+
+def report_facility(view, request):
+    """
+    The facility a report's rows are filtered to, or ALL_FACILITIES. This is
+    the filter the view applies, not the user's own facility: views set
+    `report_facility_scoped = True` when they filter to effective_facility_id(),
+    and every other report reads all facilities' rows.
+    """
+    if not getattr(view, 'report_facility_scoped', False):
+        return ALL_FACILITIES
+    facility_id = effective_facility_id(request)
+    return ALL_FACILITIES if facility_id is None else facility_id
+
+
+def _report_cache_timeout():
+    return getattr(settings, 'REPORT_CACHE_TIMEOUT', 300)
+
+
+def _is_export(view, request):
+    return hasattr(view, 'get_export_format') and bool(view.get_export_format(request))
+
+
+def _cached_report_lookup(view, request):
+    """
+    (cache key, cached Response or None) for a report request. Streaming
+    exports are never cached and get no key.
+    """
+    if _is_export(view, request):
+        return None, None
+    facility = report_facility(view, request)
+    key = build_report_cache_key(type(view).__name__, request.query_params, facility, get_report_version(facility))
+    data = get_report_cache().get(key)
+    return key, (Response(data, status=status.HTTP_200_OK) if data is not None else None)
+
+
+def _store_report(key, response):
+    if key is not None and isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+        get_report_cache().set(key, response.data, timeout=_report_cache_timeout())
+    return response
+
+
+def cached_report(handler):
+    """
+    Caches the body of a successful report response.
+
+    The key is built from the view, the normalised query params, the
+    facility the report is filtered to (see report_facility()) and that
+    facility's ledger version, so a write only invalidates its own
+    facility's reports and the all-facility ones. Streaming exports are
+    never cached. Coroutine handlers do the same cache lookups in a thread.
+    """
+    if iscoroutinefunction(handler):
+        @wraps(handler)
+        async def async_wrapper(self, request, *args, **kwargs):
+            key, cached = await sync_to_async(_cached_report_lookup)(self, request)
+            if cached is not None:
+                return cached
+            response = await handler(self, request, *args, **kwargs)
+            return await sync_to_async(_store_report)(key, response)
+        return async_wrapper
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key, cached = _cached_report_lookup(self, request)
+        if cached is not None:
+            return cached
+        return _store_report(key, handler(self, request, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,83 @@
+# healthlink-backend/api/report_jobs.py
+
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .exports import iter_export
+from .models import ReportJob
+
+
+def get_report_view_class(report_type):
+    """
+    Maps a ReportJob.report_type to the report view that knows how to build it.
+    """
+    from .views import MedicationUsageReportView, InsuranceDispensingReportView # Avoid a circular import
+    return {
+        'medication-usage': MedicationUsageReportView,
+        'insurance-dispensing': InsuranceDispensingReportView,
+    }[report_type]
+
+
+def get_report_job_root():
+    root = Path(getattr(settings, 'REPORT_JOB_ROOT', Path(settings.BASE_DIR) / 'report_jobs'))
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def requeue_stale_report_jobs():
+    """
+    Moves 'Running' jobs that haven't been updated for REPORT_JOB_STALE_SECONDS
+    back to 'Pending', so a job whose worker died is run again. Returns how many.
+    """
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'REPORT_JOB_STALE_SECONDS', 3600))
+    return ReportJob.objects.filter(status='Running', updated_at__lt=stale_before).update(
+        status='Pending', started_at=None, updated_at=timezone.now()
+    )
+
+
+def claim_next_report_job():
+    """
+    Atomically moves the oldest pending job to 'Running' and returns it,
+    after re-queueing stale running ones.
+    Safe to call from several worker processes at once.
+    """
+    requeue_stale_report_jobs()
+    pending_ids = ReportJob.objects.filter(status='Pending').order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in pending_ids:
+        claimed = ReportJob.objects.filter(id=job_id, status='Pending').update(
+            status='Running', started_at=timezone.now(), updated_at=timezone.now()
+        )
+        if claimed:
+            return ReportJob.objects.get(id=job_id)
+    return None
+
+
+def run_report_job(job):
+    """
+    Computes the job's report and writes it to local storage.
+    The job ends up either 'Completed' with result_file set, or 'Failed' with error set.
+    """
+    view = get_report_view_class(job.report_type)()
+    path = get_report_job_root() / f'report-job-{job.id}.{job.output_format}'
+    row_count = 0
+    try:
+        queryset = view.get_job_queryset(job.params)
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            for line in iter_export(queryset, view.export_columns, job.output_format):
+                output.write(line)
+                row_count += 1
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        job.status = 'Failed'
+        job.error = str(e)
+    else:
+        job.status = 'Completed'
+        job.result_file = str(path)
+        # CSV output starts with a header line
+        job.row_count = row_count - 1 if job.output_format == 'csv' else row_count
+    job.completed_at = timezone.now()
+    job.save()
+    return job
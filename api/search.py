@@ -0,0 +1,225 @@
+# healthlink-backend/api/search.py
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+
+from .models import Patient, PatientSearchToken
+
+
+# Longer tokens are cut to this length, in stored keys and in queries alike.
+MAX_TOKEN_LENGTH = 64
+# Query tokens after this many are ignored.
+MAX_QUERY_TOKENS = 5
+# Index entries counted per query token when picking the one to scan first.
+SELECTIVITY_PROBE_LIMIT = 10000
+# The FTS5 backend returns at most this many of the best ranked matches.
+MAX_RANKED_RESULTS = 500
+
+_WORD = re.compile(r'[^\W_]+')
+_NUMBER_QUERY = re.compile(r'[\d\s+().-]+')
+
+
+def normalise_search_text(value):
+    """
+    Lowercases `value` and strips its accents: 'Élodie' becomes 'elodie'.
+    """
+    if not value or value.isascii():
+        return (value or '').lower()
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def search_tokens(value):
+    return [token[:MAX_TOKEN_LENGTH] for token in _WORD.findall(normalise_search_text(value))]
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def patient_search_key(patient):
+    """
+    The tokens of a patient's first and last name, then the national ID and
+    the phone number's digits as one token each, space-separated.
+    """
+    tokens = [*search_tokens(patient.first_name), *search_tokens(patient.last_name)]
+    tokens.append(''.join(search_tokens(patient.national_id)))
+    tokens.append(_digits(patient.phone_number))
+    return ' '.join(dict.fromkeys(token[:MAX_TOKEN_LENGTH] for token in tokens if token))
+
+
+def query_tokens(query):
+    """
+    The search tokens of a query. A query of digits and phone punctuation is
+    one token, so '0788 123 456' finds the number however it was typed.
+    """
+    if _NUMBER_QUERY.fullmatch(query):
+        digits = _digits(query)
+        return [digits[:MAX_TOKEN_LENGTH]] if digits else []
+    return list(dict.fromkeys(search_tokens(query)))[:MAX_QUERY_TOKENS]
+
+
+def _prefix_range(prefix):
+    # Strings starting with `prefix` sort in [prefix, upper) in code point order,
+    # which is SQLite's default (binary) collation.
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class BTreePatientSearch:
+    """
+    Prefix search over PatientSearchToken. Every query token must be the
+    prefix of one of the patient's tokens; a patient scores 2 for each query
+    token matching a whole token and 1 for a prefix match, and the best
+    scores come first.
+    """
+    name = 'btree'
+
+    def index(self, patients, replace=True):
+        """
+        Stores the tokens of `patients`, which are saved and have their search_key set.
+        """
+        if replace:
+            PatientSearchToken.objects.filter(patient__in=[patient.pk for patient in patients]).delete()
+        PatientSearchToken.objects.bulk_create([
+            PatientSearchToken(patient_id=patient.pk, token=token)
+            for patient in patients for token in patient.search_key.split()
+        ])
+
+    def remove(self, patient_ids):
+        pass # Token rows go with the patient (on_delete=CASCADE)
+
+    def clear(self):
+        PatientSearchToken.objects.all()._raw_delete(PatientSearchToken.objects.db)
+
+    @staticmethod
+    def prefix_matches(token, queryset=None):
+        low, high = _prefix_range(token)
+        return (PatientSearchToken.objects.all() if queryset is None else queryset).filter(token__gte=low, token__lt=high)
+
+    def narrowest_token(self, tokens):
+        # A common first name can match far more patients than a longer but rarer
+        # surname prefix, so count index entries (up to a cap) rather than guess.
+        if len(tokens) == 1:
+            return tokens[0]
+        return min(tokens, key=lambda token: (self.prefix_matches(token)[:SELECTIVITY_PROBE_LIMIT].count(), -len(token)))
+
+    def search(self, queryset, query):
+        tokens = query_tokens(query)
+        if not tokens:
+            return queryset.none()
+        # Candidates come from one index range scan, for the narrowest token; the
+        # other tokens are checked per candidate.
+        driving = self.narrowest_token(tokens)
+        queryset = queryset.filter(pk__in=self.prefix_matches(driving).values('patient_id'))
+        rank = Value(0)
+        for token in tokens:
+            patient_tokens = PatientSearchToken.objects.filter(patient=OuterRef('pk'))
+            if token != driving:
+                queryset = queryset.filter(Exists(self.prefix_matches(token, patient_tokens)))
+            exact = Exists(patient_tokens.filter(token=token))
+            rank = rank + Case(When(exact, then=Value(2)), default=Value(1))
+        return queryset.annotate(search_rank=rank).order_by('-search_rank', *Patient._meta.ordering, 'pk')
+
+
+class FTS5PatientSearch(BTreePatientSearch):
+    """
+    SQLite FTS5 over the search keys, ranked by bm25(); only the best
+    MAX_RANKED_RESULTS matches are returned. The token rows are kept up to
+    date as well, so switching back to 'btree' needs no rebuild. Patients saved before the backend was enabled are only found after
+    `python manage.py rebuild_search_index`.
+    """
+    name = 'fts5'
+    table = 'api_patient_search_fts'
+
+    def __init__(self):
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured("The 'fts5' patient search backend needs SQLite.")
+
+    def ensure_table(self, cursor):
+        # Prefix indexes make the 2 and 3 character lookups of as-you-type searches cheap.
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "search_key, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+    def index(self, patients, replace=True):
+        super().index(patients, replace=replace)
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            if replace:
+                cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(patient.pk,) for patient in patients])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, search_key) VALUES (%s, %s)",
+                [(patient.pk, patient.search_key) for patient in patients]
+            )
+
+    def remove(self, patient_ids):
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in patient_ids])
+
+    def clear(self):
+        super().clear()
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.execute(f"DELETE FROM {self.table}")
+
+    def search(self, queryset, query):
+        tokens = query_tokens(query)
+        if not tokens:
+            return queryset.none()
+        # Tokens are letters and digits only, so quoting them is enough.
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            self.ensure_table(cursor)
+            # bm25() can only be read in FTS5's own query: as a correlated
+            # subquery it would rerun the MATCH for every patient.
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s ORDER BY rank LIMIT %s",
+                (match, MAX_RANKED_RESULTS)
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return queryset.none()
+        rank = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)], output_field=IntegerField())
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+PATIENT_SEARCH_BACKENDS = {backend.name: backend for backend in (BTreePatientSearch, FTS5PatientSearch)}
+
+
+def get_patient_search_backend():
+    name = getattr(settings, 'PATIENT_SEARCH_BACKEND', 'btree')
+    if name not in PATIENT_SEARCH_BACKENDS:
+        raise ImproperlyConfigured(f"Unknown PATIENT_SEARCH_BACKEND {name!r}.")
+    return PATIENT_SEARCH_BACKENDS[name]()
+
+
+def index_patients(patients):
+    get_patient_search_backend().index(patients)
+
+
+def rebuild_patient_search_index(batch_size=2000):
+    """
+    Recomputes every patient's search key and rebuilds the index of the
+    configured backend. Returns the number of patients indexed.
+    """
+    backend = get_patient_search_backend()
+    patients = Patient.objects.order_by('pk').only('first_name', 'last_name', 'national_id', 'phone_number')
+    count = last_pk = 0
+    with transaction.atomic():
+        backend.clear()
+        while batch := list(patients.filter(pk__gt=last_pk)[:batch_size]):
+            for patient in batch:
+                patient.search_key = patient_search_key(patient)
+            # bulk_update() leaves updated_at alone: rebuilding the index isn't an edit.
+            Patient.objects.bulk_update(batch, ['search_key'])
+            backend.index(batch, replace=False)
+            count += len(batch)
+            last_pk = batch[-1].pk
+    return count
@@ -1,20 +1,35 @@
 # api/serializers.py
 
 from rest_framework import serializers
+from .fieldsets import ExpandableFieldsMixin, SparseFieldsetMixin
+from .fast_serializers import patient_full_name_expression
 from .models import (
     User, Facility, Role, StockItem, Supplier, SupplierStockItem,
     Order, OrderItem, Patient, Allergy, MedicalHistory, PastProcedure,
     PatientVisit, Vitals, Medication, Prescription,
     AdverseDrugReaction, AdverseEventFollowingImmunization,
-    OrderHistory, PaymentTransaction, InventoryHistory
+    OrderHistory, PaymentTransaction, InventoryHistory, ReportJob, PharmacovigilanceSignal,
+    DuplicatePatientCandidate
 )
 
 # --- User Serializers ---
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'phone_number', 'address', 'facility', 'role', 'first_name', 'last_name']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {'facility': 'FacilitySerializer', 'role': 'RoleSerializer'}
+
+class PublicUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    The user fields anyone who can see a record may see, for expanding who
+    created, processed or reviewed it. The contact details stay behind
+    /api/users/.
+    """
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+        read_only_fields = fields
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
@@ -58,7 +73,7 @@ class UserLoginSerializer(serializers.Serializer):
 
 
 # --- Facility Serializers ---
-class FacilitySerializer(serializers.ModelSerializer):
+class FacilitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Facility
         fields = '__all__'
@@ -66,7 +81,7 @@ class FacilitySerializer(serializers.ModelSerializer):
 
 
 # --- Role Serializers ---
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = '__all__'
@@ -74,17 +89,22 @@ class RoleSerializer(serializers.ModelSerializer):
 
 
 # --- StockItem Serializers ---
-class StockItemSerializer(serializers.ModelSerializer):
+class StockItemSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     changed_by_username = serializers.CharField(source='changed_by.username', read_only=True)
     class Meta:
         model = StockItem
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at', 'changed_by']
+        expandable_fields = {
+            'supplier': 'SupplierSerializer',
+            'facility': 'FacilitySerializer',
+            'created_by': 'PublicUserSerializer',
+        }
 
 
 # --- Supplier Serializers ---
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
@@ -92,17 +112,18 @@ class SupplierSerializer(serializers.ModelSerializer):
 
 
 # --- SupplierStockItem Serializers ---
-class SupplierStockItemSerializer(serializers.ModelSerializer):
+class SupplierStockItemSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     stock_item_name = serializers.CharField(source='stock_item.name', read_only=True)
     class Meta:
         model = SupplierStockItem
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {'supplier': 'SupplierSerializer', 'stock_item': 'StockItemSerializer'}
 
 
 # --- Order Serializers ---
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
     facility_name = serializers.CharField(source='facility.name', read_only=True)
@@ -110,108 +131,196 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at', 'created_by']
+        expandable_fields = {
+            'patient': 'PatientSerializer',
+            'created_by': 'PublicUserSerializer',
+            'order_items': 'OrderItemSerializer',
+        }
 
 
 # --- OrderItem Serializers ---
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     stock_item_name = serializers.CharField(source='stock_item.name', read_only=True)
     class Meta:
         model = OrderItem
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {'order': 'OrderSerializer', 'stock_item': 'StockItemSerializer'}
 
 
 # --- Patient Serializers ---
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Patient
-        fields = '__all__'
+        exclude = ['search_key']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
 # --- Allergy Serializers ---
-class AllergySerializer(serializers.ModelSerializer):
+class AllergySerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_full_name = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Allergy
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        sparse_field_sources = {'patient_full_name': ['patient__first_name', 'patient__last_name']}
+        expandable_fields = {'patient': 'PatientSerializer'}
 
     def get_patient_full_name(self, obj):
         return obj.patient.get_full_name() if obj.patient else None
 
 
 # --- MedicalHistory Serializers ---
-class MedicalHistorySerializer(serializers.ModelSerializer):
+class MedicalHistorySerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_full_name = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = MedicalHistory
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        sparse_field_sources = {'patient_full_name': ['patient__first_name', 'patient__last_name']}
+        expandable_fields = {'patient': 'PatientSerializer'}
 
     def get_patient_full_name(self, obj):
         return obj.patient.get_full_name() if obj.patient else None
 
 
 # --- PastProcedure Serializers ---
-class PastProcedureSerializer(serializers.ModelSerializer):
+class PastProcedureSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_full_name = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = PastProcedure
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        sparse_field_sources = {'patient_full_name': ['patient__first_name', 'patient__last_name']}
+        expandable_fields = {'patient': 'PatientSerializer'}
 
     def get_patient_full_name(self, obj):
         return obj.patient.get_full_name() if obj.patient else None
 
 
 # --- PatientVisit Serializers ---
-class PatientVisitSerializer(serializers.ModelSerializer):
+class PatientVisitSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
     attending_physician_username = serializers.CharField(source='attending_physician.username', read_only=True)
     class Meta:
         model = PatientVisit
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {
+            'patient': 'PatientSerializer',
+            'attending_physician': 'PublicUserSerializer',
+            'facility': 'FacilitySerializer',
+            'vitals': 'VitalsSerializer',
+            'prescriptions': 'PrescriptionSerializer',
+        }
 
 
 # --- Vitals Serializers ---
-class VitalsSerializer(serializers.ModelSerializer):
-    patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
+class VitalsSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient_visit.patient.get_full_name', read_only=True)
     class Meta:
         model = Vitals
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        expandable_fields = {'patient_visit': 'PatientVisitSerializer'}
 
 
 # --- MEDICATION SERIALIZER ---
-class MedicationSerializer(serializers.ModelSerializer):
+class MedicationSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Medication
         fields = '__all__'
+        expandable_fields = {'stock_item': 'StockItemSerializer'}
 
 
 # --- PRESCRIPTION SERIALIZER ---
-class PrescriptionSerializer(serializers.ModelSerializer):
+class PrescriptionSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     medication_name = serializers.CharField(source='medication.name', read_only=True)
     patient_full_name = serializers.SerializerMethodField(read_only=True)
-    prescriber_username = serializers.CharField(source='prescriber.username', read_only=True)
+    prescriber_username = serializers.CharField(source='prescribed_by.username', read_only=True)
     dispensed_by_username = serializers.CharField(source='dispensed_by.username', read_only=True)
 
     class Meta:
         model = Prescription
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at', 'dispensed_by', 'dispensed_date']
+        sparse_field_sources = {'patient_full_name': ['patient_visit__patient__first_name', 'patient_visit__patient__last_name']}
+        fast_field_expressions = {'patient_full_name': patient_full_name_expression('patient_visit__patient')}
+        expandable_fields = {
+            'patient_visit': 'PatientVisitSerializer',
+            'medication': 'MedicationSerializer',
+            'prescribed_by': 'PublicUserSerializer',
+        }
 
     def get_patient_full_name(self, obj):
-        return obj.patient.get_full_name() if obj.patient else None
+        return obj.patient_visit.patient.get_full_name() if obj.patient_visit else None
+
+
+# --- Patient Chart Serializers ---
+# Chart sections leave out the patient columns, which the chart carries once at the top.
+class ChartAllergySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Allergy
+        exclude = ['patient']
+
+
+class ChartMedicalHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MedicalHistory
+        exclude = ['patient']
+
+
+class ChartPastProcedureSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PastProcedure
+        exclude = ['patient']
+
+
+class ChartVitalsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Vitals
+        exclude = ['patient_visit']
+
+
+class ChartPrescriptionSerializer(serializers.ModelSerializer):
+    medication_name = serializers.CharField(source='medication.name', read_only=True)
+    prescriber_username = serializers.CharField(source='prescribed_by.username', read_only=True)
+
+    class Meta:
+        model = Prescription
+        exclude = ['patient_visit']
+
+
+class ChartVisitSerializer(serializers.ModelSerializer):
+    attending_physician_username = serializers.CharField(source='attending_physician.username', read_only=True)
+    vitals = ChartVitalsSerializer(read_only=True)
+    prescriptions = ChartPrescriptionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PatientVisit
+        exclude = ['patient']
+
+
+class PatientChartSerializer(PatientSerializer):
+    """
+    A patient with the most recent entries of each chart section. The *_count
+    fields hold the section totals, so clients can tell when a section was cut short.
+    """
+    allergies = ChartAllergySerializer(source='recent_allergies', many=True, read_only=True)
+    medical_history = ChartMedicalHistorySerializer(source='recent_medical_history', many=True, read_only=True)
+    past_procedures = ChartPastProcedureSerializer(source='recent_past_procedures', many=True, read_only=True)
+    recent_visits = ChartVisitSerializer(many=True, read_only=True)
+    allergy_count = serializers.IntegerField(read_only=True)
+    medical_history_count = serializers.IntegerField(read_only=True)
+    past_procedure_count = serializers.IntegerField(read_only=True)
+    visit_count = serializers.IntegerField(read_only=True)
 
 
 # --- Adverse Drug Reaction (ADR) Serializer ---
-class AdverseDrugReactionSerializer(serializers.ModelSerializer):
+class AdverseDrugReactionSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_full_name = serializers.SerializerMethodField(read_only=True)
     medication_name = serializers.CharField(source='medication.name', read_only=True)
     reported_by_username = serializers.CharField(source='reported_by.username', read_only=True)
@@ -220,13 +329,19 @@ class AdverseDrugReactionSerializer(serializers.ModelSerializer):
         model = AdverseDrugReaction
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        sparse_field_sources = {'patient_full_name': ['patient__first_name', 'patient__last_name']}
+        expandable_fields = {
+            'patient': 'PatientSerializer',
+            'medication': 'MedicationSerializer',
+            'reported_by': 'PublicUserSerializer',
+        }
 
     def get_patient_full_name(self, obj):
         return obj.patient.get_full_name() if obj.patient else None
 
 
 # --- Adverse Event Following Immunization (AEFI) Serializer ---
-class AdverseEventFollowingImmunizationSerializer(serializers.ModelSerializer):
+class AdverseEventFollowingImmunizationSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_full_name = serializers.SerializerMethodField(read_only=True)
     reported_by_username = serializers.CharField(source='reported_by.username', read_only=True)
 
@@ -234,13 +349,15 @@ class AdverseEventFollowingImmunizationSerializer(serializers.ModelSerializer):
         model = AdverseEventFollowingImmunization
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        sparse_field_sources = {'patient_full_name': ['patient__first_name', 'patient__last_name']}
+        expandable_fields = {'patient': 'PatientSerializer', 'reported_by': 'PublicUserSerializer'}
 
     def get_patient_full_name(self, obj):
         return obj.patient.get_full_name() if obj.patient else None
 
 
 # --- Order History Serializer ---
-class OrderHistorySerializer(serializers.ModelSerializer):
+class OrderHistorySerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     order_id = serializers.CharField(source='order.id', read_only=True)
     changed_by_username = serializers.CharField(source='changed_by.username', read_only=True)
 
@@ -248,10 +365,11 @@ class OrderHistorySerializer(serializers.ModelSerializer):
         model = OrderHistory
         fields = '__all__'
         read_only_fields = ['id', 'change_date']
+        expandable_fields = {'order': 'OrderSerializer', 'changed_by': 'PublicUserSerializer'}
 
 
 # --- Payment Transaction Serializer ---
-class PaymentTransactionSerializer(serializers.ModelSerializer):
+class PaymentTransactionSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     patient_full_name = serializers.SerializerMethodField(read_only=True)
     prescription_id = serializers.CharField(source='prescription.id', read_only=True)
     processed_by_username = serializers.CharField(source='processed_by.username', read_only=True)
@@ -260,17 +378,92 @@ class PaymentTransactionSerializer(serializers.ModelSerializer):
         model = PaymentTransaction
         fields = '__all__' # Include all fields from the model
         read_only_fields = ['id', 'transaction_date', 'created_at', 'updated_at']
+        sparse_field_sources = {'patient_full_name': ['patient__first_name', 'patient__last_name']}
+        fast_field_expressions = {'patient_full_name': patient_full_name_expression('patient')}
+        expandable_fields = {
+            'patient': 'PatientSerializer',
+            'prescription': 'PrescriptionSerializer',
+            'processed_by': 'PublicUserSerializer',
+        }
 
     def get_patient_full_name(self, obj):
         return obj.patient.get_full_name() if obj.patient else None
 
 
 # --- Inventory History Serializer ---
-class InventoryHistorySerializer(serializers.ModelSerializer):
+class InventoryHistorySerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
     stock_item_name = serializers.CharField(source='stock_item.name', read_only=True)
     processed_by_username = serializers.CharField(source='processed_by.username', read_only=True)
 
     class Meta:
         model = InventoryHistory
         fields = '__all__'
-        read_only_fields = ['id', 'transaction_date', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'transaction_date', 'created_at', 'updated_at']
+        expandable_fields = {'stock_item': 'StockItemSerializer', 'processed_by': 'PublicUserSerializer'}
+
+
+# --- Pharmacovigilance Signal Serializer ---
+class PharmacovigilanceSignalSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PharmacovigilanceSignal
+        fields = '__all__'
+        read_only_fields = [field.name for field in PharmacovigilanceSignal._meta.fields]
+        expandable_fields = {'medication': 'MedicationSerializer'}
+
+
+# --- Duplicate Patient Candidate Serializer ---
+class DuplicatePatientCandidateSerializer(SparseFieldsetMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    patient_a_full_name = serializers.SerializerMethodField(read_only=True)
+    patient_b_full_name = serializers.SerializerMethodField(read_only=True)
+    reviewed_by_username = serializers.CharField(source='reviewed_by.username', read_only=True)
+
+    class Meta:
+        model = DuplicatePatientCandidate
+        fields = '__all__'
+        # Reviewers only set the status; the rest comes from detect_duplicate_patients.
+        read_only_fields = [field.name for field in DuplicatePatientCandidate._meta.fields if field.name != 'status']
+        sparse_field_sources = {
+            'patient_a_full_name': ['patient_a__first_name', 'patient_a__last_name'],
+            'patient_b_full_name': ['patient_b__first_name', 'patient_b__last_name'],
+        }
+        expandable_fields = {
+            'patient_a': 'PatientSerializer',
+            'patient_b': 'PatientSerializer',
+            'reviewed_by': 'PublicUserSerializer',
+        }
+
+    def get_patient_a_full_name(self, obj):
+        return obj.patient_a.get_full_name()
+
+    def get_patient_b_full_name(self, obj):
+        return obj.patient_b.get_full_name()
+
+
+# --- Report Job Serializer ---
+class ReportJobSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    requested_by_username = serializers.CharField(source='requested_by.username', read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report_type', 'params', 'output_format', 'status', 'requested_by', 'requested_by_username',
+            'facility', 'row_count', 'error', 'started_at', 'completed_at', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'requested_by', 'facility', 'row_count', 'error',
+            'started_at', 'completed_at', 'created_at', 'updated_at'
+        ]
+
+    def validate(self, data):
+        from .report_jobs import get_report_view_class # Avoid a circular import
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({"params": "Must be an object of report query parameters."})
+        try:
+            # Building the queryset is lazy, so this only validates the parameters.
+            get_report_view_class(data['report_type'])().get_job_queryset(params)
+        except KeyError as e:
+            raise serializers.ValidationError({"params": f"Missing required parameter {e}."})
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({"params": "Invalid parameter value. Dates must use YYYY-MM-DD."})
+        return data
@@ -1,9 +1,15 @@
 # healthlink-backend/api/signals.py
 
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Order, OrderItem, StockItem, OrderHistory, InventoryHistory, User
+from .models import Order, OrderItem, StockItem, Supplier, OrderHistory, InventoryHistory, PaymentTransaction, User, Role, Patient, Medication, PatientVisit, MedicalHistory, PastProcedure
+from .authentication import TOKEN_REVOKING_FIELDS, revoke_user_tokens
+from .autocomplete import autocomplete_row_changed, invalidate_autocomplete
+from .clinical_search import get_clinical_search_backend, index_clinical_records
+from .report_cache import invalidate_ledger_reports
+from .search import get_patient_search_backend
+from .sync import SYNCED_MODELS, record_changes, stored_facility_id
 
 # Helper to get the user context for signals
 def get_user_for_signal(kwargs, instance):
@@ -142,4 +148,99 @@ def log_inventory_history_on_delete(sender, instance, **kwargs):
         reason=f'Stock Item {instance.name} (ID: {instance.id}) was deleted. Quantity at deletion: {instance.current_stock}.', # Correctly maps to model's field
         processed_by=changed_by_user,
         transaction_date=timezone.now(),
-    )
\ No newline at end of file
+    )
+
+# Ledger writes invalidate cached reports for the facility that made them
+@receiver([post_save, post_delete], sender=InventoryHistory)
+@receiver([post_save, post_delete], sender=PaymentTransaction)
+def invalidate_cached_reports(sender, instance, **kwargs):
+    facility_ids = {instance.processed_by.facility_id if instance.processed_by_id else None}
+    if sender is InventoryHistory and instance.stock_item_id:
+        facility_ids.add(instance.stock_item.facility_id) # The facility holding the stock
+    invalidate_ledger_reports(facility_ids)
+
+# Stock item edits change the stock reports of the facility holding the item
+# and, when it moves, of the one it left (remembered by remember_sync_facility)
+@receiver([post_save, post_delete], sender=StockItem)
+def invalidate_stock_reports(sender, instance, **kwargs):
+    invalidate_ledger_reports({instance.facility_id, getattr(instance, '_sync_moved_from', None)})
+
+# pre_delete: the items' supplier is already cleared by post_delete
+@receiver([post_save, pre_delete], sender=Supplier)
+def invalidate_supplier_stock_reports(sender, instance, **kwargs):
+    facility_ids = set(StockItem.objects.filter(supplier=instance).values_list('facility_id', flat=True).distinct())
+    invalidate_ledger_reports(facility_ids or {None})
+
+# Change log for offline delta sync (see api/sync.py)
+@receiver(pre_save)
+def remember_sync_facility(sender, instance, raw=False, update_fields=None, **kwargs):
+    if sender in SYNCED_MODELS and not raw:
+        instance._sync_moved_from = stored_facility_id(sender, instance, update_fields)
+
+@receiver(post_save)
+def log_sync_change_on_save(sender, instance, raw=False, **kwargs):
+    if sender in SYNCED_MODELS and not raw:
+        record_changes(sender, [instance], 'upsert', moved_from=getattr(instance, '_sync_moved_from', None))
+
+@receiver(post_delete)
+def log_sync_change_on_delete(sender, instance, **kwargs):
+    if sender in SYNCED_MODELS:
+        record_changes(sender, [instance], 'delete')
+
+# Patient search index (see api/search.py)
+@receiver(post_save, sender=Patient)
+def index_patient_search_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_patient_search_backend().index([instance])
+
+@receiver(post_delete, sender=Patient)
+def remove_patient_search_on_delete(sender, instance, **kwargs):
+    get_patient_search_backend().remove([instance.pk])
+
+# Stock and medication autocomplete indexes (see api/autocomplete.py)
+@receiver(post_save, sender=StockItem)
+@receiver(post_save, sender=Medication)
+def invalidate_autocomplete_on_save(sender, instance, **kwargs):
+    if autocomplete_row_changed(instance):
+        invalidate_autocomplete()
+
+@receiver(post_delete, sender=StockItem)
+@receiver(post_delete, sender=Medication)
+def invalidate_autocomplete_on_delete(sender, instance, **kwargs):
+    invalidate_autocomplete()
+
+# Clinical full-text index (see api/clinical_search.py)
+@receiver(post_save, sender=PatientVisit)
+@receiver(post_save, sender=MedicalHistory)
+@receiver(post_save, sender=PastProcedure)
+def index_clinical_record_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_clinical_records([instance])
+
+@receiver(post_delete, sender=PatientVisit)
+@receiver(post_delete, sender=MedicalHistory)
+@receiver(post_delete, sender=PastProcedure)
+def remove_clinical_record_on_delete(sender, instance, **kwargs):
+    get_clinical_search_backend().remove([instance])
+
+# Tokens claiming a user's old role or facility (see api/authentication.py)
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_claim_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not {field.removesuffix('_id') for field in update_fields} & {field.removesuffix('_id') for field in TOKEN_REVOKING_FIELDS}:
+        return # e.g. the last_login update on every login
+    saved = User.objects.filter(pk=instance.pk).values_list(*TOKEN_REVOKING_FIELDS).first()
+    if saved is not None and saved != tuple(getattr(instance, field) for field in TOKEN_REVOKING_FIELDS):
+        revoke_user_tokens([instance.pk])
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_user_delete(sender, instance, **kwargs):
+    revoke_user_tokens([instance.pk])
+
+@receiver(pre_save, sender=Role)
+def revoke_tokens_on_role_rename(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if Role.objects.filter(pk=instance.pk).exclude(name=instance.name).exists():
+        revoke_user_tokens(User.objects.filter(role=instance).values_list('pk', flat=True))
@@ -0,0 +1,181 @@
+# healthlink-backend/api/sync.py
+
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChangeLogEntry, Medication, Patient, PatientVisit, Prescription, StockItem, Vitals
+from .serializers import (
+    MedicationSerializer, PatientSerializer, PatientVisitSerializer, PrescriptionSerializer,
+    StockItemSerializer, VitalsSerializer
+)
+
+
+DEFAULT_SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 5000
+# Change log entries read per round trip while streaming.
+SYNC_STREAM_CHUNK_SIZE = 1000
+
+# Models offline clients sync: serializer, select_related() lookups for it, and
+# the attribute holding the owning facility id (None for records every facility gets).
+SYNCED_MODELS = {
+    Patient: (PatientSerializer, (), None),
+    Medication: (MedicationSerializer, (), None),
+    StockItem: (StockItemSerializer, ('supplier',), 'facility_id'),
+    PatientVisit: (PatientVisitSerializer, ('patient', 'attending_physician'), 'facility_id'),
+    Vitals: (VitalsSerializer, ('patient_visit__patient',), 'patient_visit.facility_id'),
+    Prescription: (PrescriptionSerializer, ('medication', 'prescribed_by', 'patient_visit__patient'), 'patient_visit.facility_id'),
+}
+MODELS_BY_LABEL = {model._meta.model_name: model for model in SYNCED_MODELS}
+# Synced records whose facility is that of another: model -> (dependent model, relation to it).
+FACILITY_DEPENDENTS = {
+    PatientVisit: ((Vitals, 'patient_visit'), (Prescription, 'patient_visit')),
+}
+
+
+def _facility_id(instance, facility_attr):
+    if facility_attr is None:
+        return None
+    try:
+        return attrgetter(facility_attr)(instance)
+    except ObjectDoesNotExist:
+        return None
+
+
+def stored_facility_id(model, instance, update_fields=None):
+    """
+    The facility the saved row of `instance` belongs to, read before it's
+    overwritten. None for new and shared records, and when `update_fields`
+    leaves the facility alone.
+    """
+    facility_attr = SYNCED_MODELS[model][2] if model in SYNCED_MODELS else None
+    if facility_attr is None or instance._state.adding:
+        return None
+    relation = facility_attr.split('.')[0].removesuffix('_id')
+    if update_fields is not None and relation not in {field.removesuffix('_id') for field in update_fields}:
+        return None
+    return model._default_manager.filter(pk=instance.pk).values_list(facility_attr.replace('.', '__'), flat=True).first()
+
+
+def record_changes(model, instances, action, moved_from=None):
+    """
+    Appends change log entries for `instances` of `model`; a no-op for models that aren't synced.
+
+    `moved_from` is the facility an upserted record belonged to before the
+    save. If that has changed, its clients get a delete for the record and
+    for the records whose facility follows it, and the new facility gets them.
+    """
+    if model not in SYNCED_MODELS:
+        return
+    label, facility_attr = model._meta.model_name, SYNCED_MODELS[model][2]
+    entries = []
+    for instance in instances:
+        facility_id = _facility_id(instance, facility_attr)
+        moved = action == 'upsert' and moved_from is not None and moved_from != facility_id
+        if moved:
+            entries.append(ChangeLogEntry(model=label, object_id=instance.pk, action='delete', facility_id=moved_from))
+        entries.append(ChangeLogEntry(model=label, object_id=instance.pk, action=action, facility_id=facility_id))
+        if moved:
+            for dependent_model, relation in FACILITY_DEPENDENTS.get(model, ()):
+                dependent_label = dependent_model._meta.model_name
+                for object_id in dependent_model.objects.filter(**{relation: instance}).values_list('pk', flat=True):
+                    entries.append(ChangeLogEntry(model=dependent_label, object_id=object_id, action='delete', facility_id=moved_from))
+                    entries.append(ChangeLogEntry(model=dependent_label, object_id=object_id, action='upsert', facility_id=facility_id))
+    ChangeLogEntry.objects.bulk_create(entries)
+
+
+def committed_token(token):
+    """
+    The token up to which the changes logged after `token` can be handed out,
+    or None if all of them can.
+
+    Ids are allocated when an entry is inserted, not when its transaction
+    commits, so an entry can appear after later ones have been handed out.
+    A missing id followed by an entry younger than SYNC_COMMIT_GRACE_SECONDS
+    is taken to be uncommitted and the token stops before it; older gaps are
+    rolled back inserts.
+    """
+    grace = timedelta(seconds=getattr(settings, 'SYNC_COMMIT_GRACE_SECONDS', 60))
+    recent = list(
+        ChangeLogEntry.objects.filter(id__gt=token + 1, changed_at__gt=timezone.now() - grace)
+        .order_by('id').values_list('id', flat=True)
+    )
+    if not recent:
+        return None
+    present = set(ChangeLogEntry.objects.filter(id__in=[entry_id - 1 for entry_id in recent]).values_list('id', flat=True))
+    for entry_id in recent:
+        if entry_id - 1 not in present:
+            return entry_id - 1
+    return None
+
+
+def changes_since(token, facility_id=None):
+    """
+    (token, model, object_id, action) rows logged after `token`, oldest first.
+    With a facility, only its own records and the shared ones are included.
+    Entries logged after a change that may not have committed yet are held
+    back until it has (see committed_token()).
+    """
+    queryset = ChangeLogEntry.objects.filter(id__gt=token)
+    if (up_to := committed_token(token)) is not None:
+        queryset = queryset.filter(id__lte=up_to)
+    if facility_id is not None:
+        queryset = queryset.filter(Q(facility_id=facility_id) | Q(facility__isnull=True))
+    return queryset.order_by('id').values_list('id', 'model', 'object_id', 'action')
+
+
+def render_changes(entries):
+    """
+    The sync records for a run of change log entries, oldest first.
+
+    Only the newest entry per record is kept. Upserts carry the record's
+    current serialised state, read with one query per model; an upsert of a
+    record deleted since is dropped, as its tombstone comes later.
+    """
+    latest = {}
+    for entry in entries:
+        key = (entry[1], entry[2])
+        latest.pop(key, None) # Re-inserted so the record keeps its newest position
+        latest[key] = entry
+
+    upserted = defaultdict(set)
+    for _, label, object_id, action in latest.values():
+        if action == 'upsert':
+            upserted[label].add(object_id)
+    states = {}
+    for label, ids in upserted.items():
+        model = MODELS_BY_LABEL[label]
+        serializer_class, related, _ = SYNCED_MODELS[model]
+        objects = model.objects.select_related(*related).in_bulk(ids)
+        states[label] = dict(zip(objects, serializer_class(list(objects.values()), many=True).data))
+
+    records = []
+    for token, label, object_id, action in latest.values():
+        data = None
+        if action == 'upsert':
+            data = states[label].get(object_id)
+            if data is None:
+                continue
+        records.append({'token': token, 'model': label, 'id': object_id, 'action': action, 'data': data})
+    return records
+
+
+def iter_sync_stream(token, facility_id=None):
+    """
+    Yields every change after `token` as NDJSON lines, then a final
+    {"next_token": ...} line to resume from.
+    """
+    encoder = DjangoJSONEncoder()
+    entries = changes_since(token, facility_id).iterator(chunk_size=SYNC_STREAM_CHUNK_SIZE)
+    while chunk := list(islice(entries, SYNC_STREAM_CHUNK_SIZE)):
+        for record in render_changes(chunk):
+            yield encoder.encode(record) + '\n'
+        token = chunk[-1][0]
+    yield encoder.encode({'next_token': token}) + '\n'
@@ -1,13 +1,39 @@
 # healthlink-backend/api/tests.py
 
-from django.test import TestCase
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from django.utils import timezone
 from datetime import date, timedelta
+from decimal import Decimal
+import io
+from asgiref.sync import iscoroutinefunction
+import json
+import tempfile
+from unittest import mock
 
-from .models import User, Facility, Role, StockItem, InventoryHistory # Import InventoryHistory
+from .models import (
+    User, Facility, Role, StockItem, InventoryHistory, Patient, PatientVisit,
+    Medication, Prescription, PaymentTransaction, Supplier, SupplierStockItem,
+    Order, OrderItem, OrderHistory, Allergy, MedicalHistory, PastProcedure, Vitals,
+    AdverseDrugReaction, AdverseEventFollowingImmunization, PharmacovigilanceSignal, ChangeLogEntry,
+    DuplicatePatientCandidate, ReportJob, RevokedToken
+)
+from . import views
+from .authentication import ClaimsTokenObtainPairSerializer, reload_token_denylist, revoke_user_tokens
+from .clinical_search import get_clinical_search_backend
+from .analytics import FACILITY_METRICS, compare_facilities_ranked_in_python
+from .management.commands.benchmark_list_serializers import BENCHMARKED_VIEWS
+from .dedup import MAX_BLOCK_SIZE, SORTED_WINDOW, PatientRecord, block_pairs
+from .pharmacovigilance import disproportionality, normalise_reaction_terms
+from .report_jobs import claim_next_report_job
 from .serializers import StockItemSerializer
 # Ensure permissions are correctly imported if used in tests
 from .permissions import IsFacilityAdmin, IsPharmacist # Example imports, adjust if your views use others
@@ -380,4 +406,1526 @@ class StockItemTests(APITestCase):
         response = self.client.get(reverse('stockitem-list'), {'min_stock': 15, 'max_stock': 150}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1) # Only stock_item1 (100) within range for facility_admin1
-        self.assertEqual(response.data[0]['name'], self.stock_item1.name)
\ No newline at end of file
+        self.assertEqual(response.data[0]['name'], self.stock_item1.name)
+
+class ReportExportTests(APITestCase):
+
+    def setUp(self):
+        pharmacist_role, _ = Role.objects.get_or_create(name='Pharmacist')
+        self.pharmacist = User.objects.create(username='report_pharmacist', role=pharmacist_role)
+        self.client.force_authenticate(user=self.pharmacist)
+
+        self.paracetamol = StockItem.objects.create(name='Paracetamol 500mg', current_stock=100, unit='Tablet', reorder_level=20)
+        self.amoxicillin = StockItem.objects.create(name='Amoxicillin 250mg', current_stock=5, unit='Capsule', reorder_level=10)
+        InventoryHistory.objects.create(
+            stock_item=self.paracetamol, transaction_type='Out', quantity_change=-12,
+            new_stock_level=88, processed_by=self.pharmacist
+        )
+
+    def test_stock_level_report_streams_csv(self):
+        response = self.client.get(reverse('stock-level-report'), {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'name', 'current_stock'])
+        self.assertEqual(len(lines), 3) # Header + 2 stock items
+        self.assertIn('Amoxicillin 250mg', lines[1])
+
+    def test_medication_usage_report_streams_ndjson(self):
+        today = date.today().isoformat()
+        response = self.client.get(reverse('medication-usage-report'), {'format': 'ndjson', 'start_date': today, 'end_date': today})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['medication_name'], 'Paracetamol 500mg')
+        self.assertEqual(rows[0]['unit'], 'Tablet')
+        self.assertEqual(Decimal(rows[0]['total_dispensed_quantity']), Decimal('12'))
+
+
+class InsuranceDispensingReportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        nurse_role, _ = Role.objects.get_or_create(name='Nurse')
+        self.nurse = User.objects.create(username='insurance_nurse', role=nurse_role, facility=Facility.objects.create(name='Insurance Clinic'))
+        self.client.force_authenticate(user=self.nurse)
+
+        patient = Patient.objects.create(first_name='Amina', last_name='Uwase', date_of_birth=date(1990, 1, 1), gender='F')
+        visit = PatientVisit.objects.create(patient=patient, reason='Malaria symptoms')
+        medication = Medication.objects.create(name='Artemether')
+        prescription = Prescription.objects.create(
+            patient_visit=visit, medication=medication, dosage='1 tablet', frequency='Twice daily', duration_days=3
+        )
+        for amount, covered in ((Decimal('100.00'), Decimal('80.00')), (Decimal('50.00'), Decimal('40.00')), (Decimal('30.00'), Decimal('30.00'))):
+            PaymentTransaction.objects.create(
+                patient=patient, prescription=prescription, amount=amount, payment_method='Insurance',
+                amount_covered_by_insurance=covered, patient_paid_amount=amount - covered,
+                insurance_policy_number='RSSB-001', processed_by=self.nurse
+            )
+        PaymentTransaction.objects.create(patient=patient, amount=Decimal('20.00'), payment_method='Cash')
+
+    def test_report_is_paginated_with_aggregate_totals_in_two_queries(self):
+        today = date.today().isoformat()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('insurance-dispensing-report'), {'start_date': today, 'end_date': today, 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['totals']['total_amount_billed'], Decimal('180.00'))
+        self.assertEqual(response.data['totals']['total_covered_by_insurance'], Decimal('150.00'))
+        self.assertEqual(response.data['totals']['total_patient_paid'], Decimal('30.00'))
+        self.assertEqual(set(response.data['totals']), {'total_amount_billed', 'total_covered_by_insurance', 'total_patient_paid'})
+
+        row = response.data['results'][0]
+        self.assertEqual(row['patient_name'], 'Amina Uwase')
+        self.assertEqual(row['medication_name'], 'Artemether')
+        self.assertEqual(row['processed_by_username'], 'insurance_nurse')
+
+
+class ReportCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        pharmacist_role, _ = Role.objects.get_or_create(name='Pharmacist')
+        self.facility = Facility.objects.create(name='Kibagabaga Health Centre')
+        self.pharmacist = User.objects.create(username='cache_pharmacist', role=pharmacist_role, facility=self.facility)
+        self.client.force_authenticate(user=self.pharmacist)
+        self.stock_item = StockItem.objects.create(name='Paracetamol 500mg', current_stock=100, unit='Tablet')
+
+    def test_repeated_report_is_served_from_cache(self):
+        url = reverse('stock-level-report')
+        first = self.client.get(url, {'medication_name': 'para'})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'medication_name': 'para', 'format': ''})
+        self.assertEqual(first.data, second.data)
+
+    def test_ledger_write_invalidates_cached_report(self):
+        url = reverse('stock-level-report')
+        self.client.get(url)
+
+        self.stock_item.current_stock = 40
+        self.stock_item.save() # Signal writes an InventoryHistory row
+
+        response = self.client.get(url)
+        self.assertEqual(Decimal(response.data[0]['current_stock']), Decimal('40'))
+
+    def test_stock_report_covers_every_facility(self):
+        StockItem.objects.create(name='ORS', current_stock=10, facility=Facility.objects.create(name='Gisenyi Clinic'))
+        url = reverse('stock-level-report')
+        self.assertEqual({item['name'] for item in self.client.get(url).data}, {'Paracetamol 500mg', 'ORS'})
+
+        self.pharmacist.facility = None
+        self.pharmacist.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['name'] for item in response.data}, {'Paracetamol 500mg', 'ORS'})
+
+    def test_supplier_edit_invalidates_cached_report(self):
+        supplier = Supplier.objects.create(name='Kigali Pharma')
+        self.stock_item.supplier = supplier
+        self.stock_item.save()
+        url = reverse('stock-level-report')
+        self.client.get(url)
+
+        supplier.name = 'Kigali Pharma Ltd'
+        supplier.save()
+        self.assertEqual(self.client.get(url).data[0]['supplier_name'], 'Kigali Pharma Ltd')
+
+    def test_moving_stock_item_invalidates_the_previous_facility_report(self):
+        User.objects.create(username='cache_admin', is_superuser=True) # Logged as processing the edits, with no facility
+        self.stock_item.facility = self.facility
+        self.stock_item.expiry_date = date.today() + timedelta(days=10)
+        self.stock_item.save()
+        url = reverse('expiring-medications-report')
+        self.assertEqual(self.client.get(url, {'bucket': '0_30_days'}).data['count'], 1)
+
+        self.stock_item.facility = Facility.objects.create(name='Gisenyi Clinic')
+        self.stock_item.save()
+        self.assertEqual(self.client.get(url, {'bucket': '0_30_days'}).data['count'], 0)
+
+
+class ReportJobTests(APITestCase):
+
+    def setUp(self):
+        self.job_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.job_root.cleanup)
+        pharmacist_role, _ = Role.objects.get_or_create(name='Pharmacist')
+        self.pharmacist = User.objects.create(username='job_pharmacist', role=pharmacist_role)
+        self.client.force_authenticate(user=self.pharmacist)
+        stock_item = StockItem.objects.create(name='Paracetamol 500mg', current_stock=100, unit='Tablet')
+        InventoryHistory.objects.create(
+            stock_item=stock_item, transaction_type='Out', quantity_change=-12,
+            new_stock_level=88, processed_by=self.pharmacist
+        )
+
+    def test_submit_run_and_download_report_job(self):
+        today = date.today().isoformat()
+        response = self.client.post(reverse('report-job-list-create'), {
+            'report_type': 'medication-usage', 'params': {'start_date': today, 'end_date': today}, 'output_format': 'csv'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'Pending')
+        job_id = response.data['id']
+
+        response = self.client.get(reverse('report-job-download', args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        with self.settings(REPORT_JOB_ROOT=self.job_root.name):
+            call_command('run_report_jobs', once=True, stdout=io.StringIO())
+
+        response = self.client.get(reverse('report-job-detail', args=[job_id]))
+        self.assertEqual(response.data['status'], 'Completed')
+        self.assertEqual(response.data['row_count'], 1)
+
+        response = self.client.get(reverse('report-job-download', args=[job_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'medication_name,total_dispensed_quantity,unit')
+        self.assertTrue(lines[1].startswith('Paracetamol 500mg,'))
+
+    def test_submit_rejects_invalid_params(self):
+        response = self.client.post(reverse('report-job-list-create'), {
+            'report_type': 'insurance-dispensing', 'params': {'start_date': 'yesterday'}
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('params', response.data)
+
+    def test_stale_running_job_is_claimed_again(self):
+        params = {'start_date': date.today().isoformat(), 'end_date': date.today().isoformat()}
+        stale = ReportJob.objects.create(report_type='medication-usage', params=params, status='Running', requested_by=self.pharmacist)
+        running = ReportJob.objects.create(report_type='medication-usage', params=params, status='Running', requested_by=self.pharmacist)
+        ReportJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+
+        with self.settings(REPORT_JOB_STALE_SECONDS=3600):
+            self.assertEqual(claim_next_report_job(), stale)
+            self.assertIsNone(claim_next_report_job())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'Running')
+        self.assertGreater(stale.updated_at, timezone.now() - timedelta(minutes=1))
+        running.refresh_from_db()
+        self.assertEqual(running.status, 'Running')
+
+
+class FacilityDashboardTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        admin_role, _ = Role.objects.get_or_create(name='Facility Admin')
+        self.facility = Facility.objects.create(name='Muhima Hospital')
+        self.other_facility = Facility.objects.create(name='Nyamata Hospital')
+        self.admin = User.objects.create(username='dashboard_admin', role=admin_role, facility=self.facility)
+        self.client.force_authenticate(user=self.admin)
+
+        today = date.today()
+        StockItem.objects.create(name='Low', current_stock=5, reorder_level=10, facility=self.facility)
+        StockItem.objects.create(name='Out', current_stock=0, reorder_level=10, facility=self.facility)
+        StockItem.objects.create(name='Soon', current_stock=50, expiry_date=today + timedelta(days=20), facility=self.facility)
+        StockItem.objects.create(name='Later', current_stock=50, expiry_date=today + timedelta(days=75), facility=self.facility)
+        StockItem.objects.create(name='Elsewhere', current_stock=0, facility=self.other_facility)
+
+        patient = Patient.objects.create(first_name='Eric', last_name='Mugisha', date_of_birth=date(1985, 5, 5), gender='M')
+        visit = PatientVisit.objects.create(patient=patient, reason='Cough', facility=self.facility)
+        PatientVisit.objects.create(patient=patient, reason='Follow-up', facility=self.facility)
+        PatientVisit.objects.create(patient=patient, reason='Old visit', facility=self.facility, visit_date=timezone.now() - timedelta(days=3))
+        medication = Medication.objects.create(name='Amoxicillin')
+        Prescription.objects.create(patient_visit=visit, medication=medication, dosage='1 capsule', frequency='Daily', duration_days=5)
+        PaymentTransaction.objects.create(patient=patient, amount=Decimal('10.00'), payment_method='Cash', processed_by=self.admin)
+        PaymentTransaction.objects.create(patient=patient, amount=Decimal('30.00'), payment_method='Insurance', processed_by=self.admin)
+
+    def test_dashboard_numbers_in_two_queries_then_cached(self):
+        url = reverse('facility-dashboard', args=[self.facility.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock'], {
+            'low_stock_count': 1, 'out_of_stock_count': 1,
+            'expiring_in_30_days': 1, 'expiring_in_60_days': 1, 'expiring_in_90_days': 2,
+        })
+        self.assertEqual(response.data['todays_visits'], 2)
+        self.assertEqual(response.data['pending_prescriptions'], 1)
+        self.assertEqual(response.data['todays_revenue']['Cash'], Decimal('10.00'))
+        self.assertEqual(response.data['todays_revenue']['Insurance'], Decimal('30.00'))
+        self.assertEqual(response.data['todays_revenue']['total'], Decimal('40.00'))
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_facility_admin_cannot_view_other_facility(self):
+        response = self.client.get(reverse('facility-dashboard', args=[self.other_facility.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ExpiringMedicationsReportTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        pharmacist_role, _ = Role.objects.get_or_create(name='Pharmacist')
+        self.facility = Facility.objects.create(name='Ruhengeri Hospital')
+        other_facility = Facility.objects.create(name='Kabgayi Hospital')
+        self.pharmacist = User.objects.create(username='expiry_pharmacist', role=pharmacist_role, facility=self.facility)
+        self.client.force_authenticate(user=self.pharmacist)
+
+        today = date.today()
+        for name, days, stock in (('Expired', -5, 10), ('Soon A', 10, 4), ('Soon B', 30, 6), ('Quarter', 80, 20), ('Half', 150, 1), ('Beyond', 400, 1)):
+            StockItem.objects.create(
+                name=name, current_stock=stock, purchase_price=Decimal('2.50'),
+                expiry_date=today + timedelta(days=days), facility=self.facility
+            )
+        StockItem.objects.create(name='Other facility', current_stock=3, expiry_date=today + timedelta(days=5), facility=other_facility)
+
+    def test_bucket_summary_uses_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('expiring-medications-report'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['facilities']), 1)
+
+        buckets = response.data['facilities'][0]['buckets']
+        self.assertEqual(buckets['expired']['item_count'], 1)
+        self.assertEqual(buckets['0_30_days']['item_count'], 2)
+        self.assertEqual(buckets['0_30_days']['total_quantity'], Decimal('10'))
+        self.assertEqual(buckets['0_30_days']['value_at_purchase_price'], Decimal('25'))
+        self.assertEqual(buckets['31_60_days']['item_count'], 0)
+        self.assertEqual(buckets['61_90_days']['item_count'], 1)
+        self.assertEqual(buckets['91_180_days']['item_count'], 1)
+
+    def test_bucket_drill_down_is_paginated(self):
+        response = self.client.get(reverse('expiring-medications-report'), {'bucket': '0_30_days', 'page_size': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([item['name'] for item in response.data['results']], ['Soon A'])
+
+        response = self.client.get(reverse('expiring-medications-report'), {'bucket': 'someday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_super_admin_report_is_not_served_to_staff_of_their_facility(self):
+        admin = User.objects.create(username='expiry_admin', is_superuser=True, facility=self.facility)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse('expiring-medications-report'))
+        self.assertEqual(
+            [facility['facility_name'] for facility in response.data['facilities']], ['Kabgayi Hospital', 'Ruhengeri Hospital']
+        )
+
+        facility_admin = User.objects.create(
+            username='expiry_facility_admin', role=Role.objects.create(name='Facility Admin'), facility=self.facility
+        )
+        self.client.force_authenticate(user=facility_admin)
+        response = self.client.get(reverse('expiring-medications-report'))
+        self.assertEqual([facility['facility_name'] for facility in response.data['facilities']], ['Ruhengeri Hospital'])
+
+
+class FacilityComparisonTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create(username='regional_manager', is_superuser=True)
+        self.client.force_authenticate(user=self.manager)
+
+        self.busy = Facility.objects.create(name='Busy Hospital')
+        self.quiet = Facility.objects.create(name='Quiet Clinic')
+        cashier = User.objects.create(username='busy_cashier', facility=self.busy)
+        patient = Patient.objects.create(first_name='Grace', last_name='Ineza', date_of_birth=date(2000, 2, 2), gender='F')
+
+        item = StockItem.objects.create(name='ORS', current_stock=10, facility=self.busy)
+        InventoryHistory.objects.create(stock_item=item, transaction_type='Out', quantity_change=-10, new_stock_level=0, processed_by=cashier)
+        PaymentTransaction.objects.create(patient=patient, amount=Decimal('75.00'), payment_method='Cash', processed_by=cashier)
+        PatientVisit.objects.create(patient=patient, reason='Dehydration', facility=self.busy)
+        PatientVisit.objects.create(patient=patient, reason='Check-up', facility=self.quiet)
+
+    def test_window_ranking_matches_in_python_fallback(self):
+        today = date.today().isoformat()
+        response = self.client.get(reverse('facility-comparison'), {'start_date': today, 'end_date': today})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        busy, quiet = response.data['facilities']
+        self.assertEqual(busy['name'], 'Busy Hospital')
+        self.assertEqual(busy['stock_outs'], 1)
+        self.assertEqual(Decimal(busy['dispensing_volume']), Decimal('10'))
+        self.assertEqual(busy['revenue_rank'], 1)
+        self.assertEqual(busy['revenue_percentile'], 1.0)
+        self.assertEqual(quiet['revenue_rank'], 2)
+        self.assertEqual(busy['visits_rank'], quiet['visits_rank'])
+
+        fallback = compare_facilities_ranked_in_python(date.today(), date.today())
+        for window_row, fallback_row in zip(response.data['facilities'], fallback):
+            for metric in FACILITY_METRICS:
+                self.assertEqual(window_row[f'{metric}_rank'], fallback_row[f'{metric}_rank'])
+                self.assertAlmostEqual(window_row[f'{metric}_percentile'], fallback_row[f'{metric}_percentile'])
+
+
+class PharmacovigilanceSignalTests(APITestCase):
+
+    def setUp(self):
+        self.pharmacist = User.objects.create(username='pv_pharmacist', is_superuser=True)
+        self.client.force_authenticate(user=self.pharmacist)
+        patient = Patient.objects.create(first_name='Jean', last_name='Habimana', date_of_birth=date(1975, 3, 3), gender='M')
+
+        self.amoxicillin = Medication.objects.create(name='Amoxicillin')
+        paracetamol = Medication.objects.create(name='Paracetamol')
+        reports = [(self.amoxicillin, 'Skin rash; itching')] * 4 + [(self.amoxicillin, 'Nausea')] \
+            + [(paracetamol, 'Nausea')] * 6 + [(paracetamol, 'Headache')] * 4
+        for medication, description in reports:
+            AdverseDrugReaction.objects.create(patient=patient, medication=medication, reaction_description=description)
+        for description in ['Fever', 'fever', 'Swelling at injection site', 'Fever, swelling at injection site']:
+            AdverseEventFollowingImmunization.objects.create(patient=patient, immunization_name='BCG', event_description=description)
+
+    def test_normalise_reaction_terms(self):
+        self.assertEqual(normalise_reaction_terms(' Skin  Rash; itching.\nRASH / skin rash'), ['skin rash', 'itching', 'rash'])
+
+    def test_disproportionality_matches_hand_computed_table(self):
+        # a=4, b=1, c=0, d=10 gets the 0.5 correction: PRR = (4.5/6) / (0.5/11) = 16.5
+        stats = disproportionality([4], [5], [4], 15)
+        self.assertAlmostEqual(stats['prr'][0], 16.5)
+        self.assertAlmostEqual(stats['ror'][0], (4.5 * 10.5) / (1.5 * 0.5))
+        self.assertLess(stats['ror_lower'][0], stats['ror'][0])
+        self.assertGreater(stats['ror_upper'][0], stats['ror'][0])
+
+    def test_detection_persists_flagged_signals(self):
+        out = io.StringIO()
+        call_command('detect_pv_signals', stdout=out)
+        self.assertIn('ADR:', out.getvalue())
+
+        terms = set(PharmacovigilanceSignal.objects.filter(source='ADR').values_list('product_name', 'reaction_term'))
+        self.assertIn(('Amoxicillin', 'skin rash'), terms)
+        self.assertNotIn(('Paracetamol', 'nausea'), terms) # Reported with both medications
+
+        rash = PharmacovigilanceSignal.objects.get(product_name='Amoxicillin', reaction_term='skin rash')
+        self.assertEqual((rash.case_count, rash.product_report_count, rash.term_report_count, rash.total_report_count), (4, 5, 4, 15))
+        self.assertEqual(rash.medication, self.amoxicillin)
+
+        # Running again replaces rather than duplicates the stored signals.
+        call_command('detect_pv_signals', stdout=io.StringIO())
+        self.assertEqual(PharmacovigilanceSignal.objects.filter(product_name='Amoxicillin', reaction_term='skin rash').count(), 1)
+
+        response = self.client.get(reverse('pharmacovigilance-signal-list'), {'source': 'ADR', 'search': 'rash'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['reaction_term'], 'skin rash')
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Every list endpoint must run the same number of queries for one row as for a
+    full page, so related names in serializers cannot regress into N+1 lookups.
+    """
+    LIST_QUERY_BUDGET = 2 # COUNT(*) for pagination + the page itself
+    DETAIL_QUERY_BUDGET = 1
+
+    LIST_ENDPOINTS = [
+        'stockitem-list', 'supplierstockitem-list-create', 'order-list-create', 'orderitem-list-create',
+        'allergy-list-create', 'medicalhistory-list-create', 'pastprocedure-list-create',
+        'patientvisit-list-create', 'vitals-list-create', 'prescription-list-create',
+        'adversedrugreaction-list-create', 'adverseeventfollowingimmunization-list-create',
+        'orderhistory-list-create', 'paymenttransaction-list-create', 'inventoryhistory-list-create',
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='budget_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.rows = 0
+
+    def create_rows(self, count):
+        # Every row gets its own related objects, so a missing select_related costs one query per row.
+        for _ in range(count):
+            self.rows += 1
+            n = self.rows
+            user = User.objects.create(username=f'budget_user_{n}')
+            supplier = Supplier.objects.create(name=f'Supplier {n}')
+            patient = Patient.objects.create(first_name='Patient', last_name=str(n), date_of_birth=date(1990, 1, 1), gender='F')
+            item = StockItem.objects.create(name=f'Item {n}', supplier=supplier)
+            medication = Medication.objects.create(name=f'Medication {n}')
+            visit = PatientVisit.objects.create(patient=patient, reason='Review', attending_physician=user)
+            prescription = Prescription.objects.create(
+                patient_visit=visit, medication=medication, dosage='1 tablet', frequency='Daily', duration_days=5, prescribed_by=user
+            )
+            # bulk_create skips the order history signals
+            order, = Order.objects.bulk_create([Order(patient=patient, created_by=user)])
+            SupplierStockItem.objects.create(supplier=supplier, stock_item=item, supplied_price=Decimal('1.00'))
+            OrderItem.objects.bulk_create([OrderItem(order=order, stock_item=item, quantity=1, price_at_order=Decimal('1.00'))])
+            OrderHistory.objects.create(order=order, action='Created', changed_by=user)
+            Allergy.objects.create(patient=patient, allergen='Penicillin')
+            MedicalHistory.objects.create(patient=patient, condition='Asthma')
+            PastProcedure.objects.create(patient=patient, procedure_name='Appendectomy', procedure_date=date(2020, 1, 1))
+            Vitals.objects.create(patient_visit=visit, heart_rate=70)
+            AdverseDrugReaction.objects.create(patient=patient, medication=medication, reaction_description='Rash', reported_by=user)
+            AdverseEventFollowingImmunization.objects.create(patient=patient, immunization_name='BCG', event_description='Fever', reported_by=user)
+            PaymentTransaction.objects.create(patient=patient, prescription=prescription, amount=Decimal('5.00'), payment_method='Cash', processed_by=user)
+            InventoryHistory.objects.create(stock_item=item, transaction_type='In', quantity_change=5, new_stock_level=5, processed_by=user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return len(queries), response
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        self.create_rows(1)
+        single = {name: self.count_queries(reverse(name))[0] for name in self.LIST_ENDPOINTS}
+        self.create_rows(9)
+        for name in self.LIST_ENDPOINTS:
+            with self.subTest(endpoint=name):
+                queries, response = self.count_queries(reverse(name))
+                self.assertEqual(len(response.data['results']), 10)
+                self.assertEqual(queries, single[name])
+                self.assertLessEqual(queries, self.LIST_QUERY_BUDGET)
+
+    def test_detail_and_nested_views_stay_within_budget(self):
+        self.create_rows(3)
+        prescription = Prescription.objects.first()
+        for url in [
+            reverse('prescription-detail', args=[prescription.pk]),
+            reverse('paymenttransaction-detail', args=[PaymentTransaction.objects.first().pk]),
+            reverse('vitals-detail', args=[Vitals.objects.first().pk]),
+        ]:
+            with self.subTest(url=url):
+                queries, _ = self.count_queries(url)
+                self.assertLessEqual(queries, self.DETAIL_QUERY_BUDGET)
+
+        patient = prescription.patient_visit.patient
+        queries, response = self.count_queries(reverse('patient-prescriptions-list', args=[patient.pk]))
+        self.assertEqual(response.data['results'][0]['patient_full_name'], patient.get_full_name())
+        self.assertLessEqual(queries, self.LIST_QUERY_BUDGET)
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='sparse_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        supplier = Supplier.objects.create(name='Sparse Supplier')
+        StockItem.objects.create(name='Zinc', description='Long description ' * 50, supplier=supplier)
+        self.patient = Patient.objects.create(first_name='Alice', last_name='Mukamana', date_of_birth=date(1995, 6, 6), gender='F')
+        visit = PatientVisit.objects.create(patient=self.patient, reason='Fever')
+        Vitals.objects.create(patient_visit=visit, heart_rate=80)
+        PaymentTransaction.objects.create(patient=self.patient, amount=Decimal('8.00'), payment_method='Cash', notes='Paid at the front desk')
+
+    def get_with_sql(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_fields_trims_payload_and_columns(self):
+        response, sql = self.get_with_sql(reverse('stockitem-list'), {'fields': 'id,name,supplier_name'})
+        self.assertEqual(response.data['results'], [{'id': response.data['results'][0]['id'], 'name': 'Zinc', 'supplier_name': 'Sparse Supplier'}])
+        self.assertNotIn('"description"', sql)
+        self.assertIn('"api_supplier"."name"', sql)
+
+    def test_omit_keeps_method_field_sources(self):
+        response, sql = self.get_with_sql(reverse('paymenttransaction-list-create'), {'omit': 'notes'})
+        row = response.data['results'][0]
+        self.assertNotIn('notes', row)
+        self.assertEqual(row['patient_full_name'], 'Alice Mukamana')
+        self.assertNotIn('"notes"', sql)
+
+    def test_related_method_source_and_detail_views(self):
+        response = self.client.get(reverse('vitals-list-create'), {'fields': 'id,patient_name'})
+        self.assertEqual(response.data['results'][0]['patient_name'], 'Alice Mukamana')
+
+        response = self.client.get(reverse('patient-detail', args=[self.patient.pk]), {'fields': 'first_name'})
+        self.assertEqual(response.data, {'first_name': 'Alice'})
+
+        # Writes always use the full serializer.
+        response = self.client.patch(reverse('patient-detail', args=[self.patient.pk]) + '?fields=first_name', {'last_name': 'Uwera'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['last_name'], 'Uwera')
+
+
+class ExpansionTests(APITestCase):
+    """
+    ?expand= embeds related objects without adding queries per row.
+    """
+    def setUp(self):
+        self.admin = User.objects.create(username='expand_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.medication = Medication.objects.create(name='Artemether')
+        self.add_visits(1)
+
+    def add_visits(self, count):
+        for index in range(count):
+            patient = Patient.objects.create(first_name='Amina', last_name=f'Uwase {index}', date_of_birth=date(1990, 1, 1), gender='F')
+            visit = PatientVisit.objects.create(patient=patient, reason='Malaria symptoms', attending_physician=self.admin)
+            Vitals.objects.create(patient_visit=visit, heart_rate=80)
+            for dosage in ('1 tablet', '2 tablets'):
+                Prescription.objects.create(
+                    patient_visit=visit, medication=self.medication, dosage=dosage, frequency='Twice daily',
+                    duration_days=3, prescribed_by=self.admin
+                )
+
+    def count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_dotted_paths_embed_nested_objects(self):
+        response = self.client.get(reverse('prescription-list-create'), {'expand': 'medication,patient_visit.patient'})
+        row = response.data['results'][0]
+        self.assertEqual(row['medication']['name'], 'Artemether')
+        self.assertEqual(row['patient_visit']['patient']['first_name'], 'Amina')
+        self.assertEqual(row['patient_visit']['patient_name'], 'Amina Uwase 0')
+        # Relations that weren't asked for stay ids.
+        self.assertEqual(row['prescribed_by'], self.admin.pk)
+        self.assertEqual(row['patient_visit']['attending_physician'], self.admin.pk)
+
+    def test_to_many_and_reverse_relations(self):
+        response = self.client.get(reverse('patientvisit-list-create'), {'expand': 'vitals,prescriptions.medication'})
+        row = response.data['results'][0]
+        self.assertEqual(row['vitals']['heart_rate'], 80)
+        self.assertEqual(sorted(item['dosage'] for item in row['prescriptions']), ['1 tablet', '2 tablets'])
+        self.assertEqual(row['prescriptions'][0]['medication']['name'], 'Artemether')
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for url, expand in (
+            (reverse('prescription-list-create'), 'medication,prescribed_by,patient_visit.patient'),
+            (reverse('patientvisit-list-create'), 'patient,vitals,prescriptions.medication'),
+        ):
+            _, few = self.count_queries(url, {'expand': expand})
+            self.add_visits(5)
+            response, many = self.count_queries(url, {'expand': expand})
+            self.assertGreater(len(response.data['results']), 5)
+            self.assertEqual(few, many, expand)
+
+    def test_unknown_names_writes_and_sparse_fieldsets(self):
+        response = self.client.get(reverse('prescription-list-create'), {'expand': 'nonsense,medication.nonsense'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['medication']['name'], 'Artemether')
+
+        response = self.client.get(reverse('prescription-list-create'), {'expand': 'medication', 'fields': 'id,medication'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'medication'})
+        self.assertEqual(response.data['results'][0]['medication']['name'], 'Artemether')
+
+        # Writes keep the id fields.
+        patient = Patient.objects.first()
+        response = self.client.post(reverse('allergy-list-create') + '?expand=patient', {'patient': patient.pk, 'allergen': 'Penicillin'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['patient'], patient.pk)
+
+    def test_expanded_users_show_only_public_fields(self):
+        self.admin.email, self.admin.phone_number, self.admin.address = 'admin@example.org', '0788000000', 'Kigali'
+        self.admin.save()
+        pharmacist = User.objects.create(username='expand_pharmacist', role=Role.objects.create(name='Pharmacist'))
+        InventoryHistory.objects.create(
+            stock_item=StockItem.objects.create(name='Gauze'), transaction_type='In', quantity_change=5,
+            new_stock_level=5, processed_by=self.admin
+        )
+        self.client.force_authenticate(user=pharmacist)
+        self.assertEqual(self.client.get(reverse('user-list-create')).status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.get(reverse('inventoryhistory-list-create'), {'expand': 'processed_by'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['processed_by'], {
+            'id': self.admin.pk, 'username': 'expand_admin', 'first_name': '', 'last_name': '',
+        })
+
+
+class FastReadPathTests(APITestCase):
+    """
+    The compiled list fast path must render exactly what the serializer would.
+    """
+    FAST_VIEWS = {
+        'patientvisit-list-create': views.PatientVisitListCreateView,
+        'prescription-list-create': views.PrescriptionListCreateView,
+        'paymenttransaction-list-create': views.PaymentTransactionListCreateView,
+        'inventoryhistory-list-create': views.InventoryHistoryListCreateView,
+    }
+
+    def setUp(self):
+        self.admin = User.objects.create(username='fast_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        patient = Patient.objects.create(first_name='Alice', last_name='Mukamana', date_of_birth=date(1995, 6, 6), gender='F')
+        medication = Medication.objects.create(name='Amoxicillin')
+        item = StockItem.objects.create(name='Gauze')
+        whole_second = timezone.now().replace(microsecond=0)
+        visits = [
+            PatientVisit.objects.create(patient=patient, reason='Fever', attending_physician=self.admin),
+            PatientVisit.objects.create(patient=patient, reason='Review', visit_date=whole_second),
+        ]
+        for visit, prescriber in zip(visits, [self.admin, None]):
+            Prescription.objects.create(
+                patient_visit=visit, medication=medication, dosage='1 tablet', frequency='Daily', duration_days=5, prescribed_by=prescriber
+            )
+        PaymentTransaction.objects.create(patient=patient, amount=Decimal('8.50'), payment_method='Cash', processed_by=self.admin)
+        PaymentTransaction.objects.create(amount=Decimal('12'), payment_method='Insurance', transaction_date=whole_second)
+        InventoryHistory.objects.create(stock_item=item, transaction_type='Out', quantity_change=Decimal('-2.00'), new_stock_level=Decimal('3.00'))
+        InventoryHistory.objects.create(transaction_type='Adjustment', quantity_change=Decimal('1.25'), new_stock_level=Decimal('4.25'))
+
+    def serializer_output(self, view_class):
+        data = view_class.serializer_class(view_class.queryset.all(), many=True).data
+        return json.loads(JSONRenderer().render(data))
+
+    def test_fast_output_matches_serializer(self):
+        for url_name, view_class in self.FAST_VIEWS.items():
+            with self.subTest(url_name):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(json.loads(response.content)['results'], self.serializer_output(view_class))
+
+    @override_settings(TIME_ZONE='Africa/Kigali')
+    def test_fast_output_matches_serializer_outside_utc(self):
+        for url_name, view_class in self.FAST_VIEWS.items():
+            with self.subTest(url_name):
+                response = self.client.get(reverse(url_name))
+                results = json.loads(response.content)['results']
+                self.assertEqual(results, self.serializer_output(view_class))
+                self.assertTrue(all(value.endswith('+02:00') for row in results for key, value in row.items() if key.endswith(('_at', '_date')) and value and 'T' in value))
+
+    def test_fast_path_honours_sparse_fieldsets(self):
+        response = self.client.get(reverse('prescription-list-create'), {'fields': 'dosage,patient_full_name,prescriber_username'})
+        rows = json.loads(response.content)['results']
+        self.assertCountEqual(rows, [
+            {'dosage': '1 tablet', 'patient_full_name': 'Alice Mukamana', 'prescriber_username': 'fast_admin'},
+            {'dosage': '1 tablet', 'patient_full_name': 'Alice Mukamana'},
+        ])
+
+    def test_benchmark_command_checks_output(self):
+        out = io.StringIO()
+        call_command('benchmark_list_serializers', rows=20, repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), len(BENCHMARKED_VIEWS))
+        self.assertEqual(sum('(FastListMixin)' in line for line in lines), len(self.FAST_VIEWS))
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='keyset_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        # Every third row shares a timestamp, so pages must break ties on id.
+        now = timezone.now()
+        PaymentTransaction.objects.bulk_create([
+            PaymentTransaction(amount=Decimal('1.00'), payment_method='Cash', transaction_date=now - timedelta(minutes=index // 3))
+            for index in range(25)
+        ])
+        order, = Order.objects.bulk_create([Order(created_by=self.admin)])
+        OrderHistory.objects.bulk_create([
+            OrderHistory(order=order, action='Updated Status', change_date=now - timedelta(minutes=index // 3))
+            for index in range(25)
+        ])
+
+    def walk(self, url_name):
+        ids, pages, url = [], [], reverse(url_name) + '?page_size=10'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+            ids.extend(row['id'] for row in response.data['results'])
+            pages.append(len(response.data['results']))
+            url = response.data['next']
+        return ids, pages
+
+    def test_pages_follow_the_stable_ordering(self):
+        for url_name, model in [('paymenttransaction-list-create', PaymentTransaction), ('orderhistory-list-create', OrderHistory)]:
+            with self.subTest(url_name):
+                ids, pages = self.walk(url_name)
+                self.assertEqual(pages, [10, 10, 5])
+                self.assertEqual(ids, list(model.objects.values_list('id', flat=True)))
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get(reverse('paymenttransaction-list-create'))
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([row['id'] for row in back.data['results']], [row['id'] for row in first.data['results']])
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='conditional_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.patient = Patient.objects.create(first_name='Alice', last_name='Mukamana', date_of_birth=date(1995, 6, 6), gender='F')
+        Patient.objects.create(first_name='Eric', last_name='Mugisha', date_of_birth=date(1985, 5, 5), gender='M')
+
+    def test_detail_not_modified_until_updated(self):
+        url = reverse('patient-detail', args=[self.patient.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.client.patch(url, {'last_name': 'Uwera'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_validators_follow_the_filtered_queryset(self):
+        url = reverse('patient-list-create')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # One aggregate for the validators, whose count the paginator reuses, plus the page.
+        self.assertEqual(len(queries), 2)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+        Patient.objects.filter(first_name='Eric').delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        url = reverse('patient-list-create')
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, status.HTTP_200_OK)
+
+    def test_keyset_list_validators_cover_the_page(self):
+        url = reverse('paymenttransaction-list-create')
+        PaymentTransaction.objects.create(patient=self.patient, amount=Decimal('5.00'), payment_method='Cash')
+        with CaptureQueriesContext(connection) as queries:
+            etag = self.client.get(url)['ETag']
+        # The page is read once, for both the validators and the body.
+        self.assertEqual(len(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+
+        PaymentTransaction.objects.create(amount=Decimal('7.00'), payment_method='Card')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class PatientChartTests(APITestCase):
+    CHART_QUERIES = 6 # patient with section counts, then one prefetch per section
+
+    def setUp(self):
+        self.admin = User.objects.create(username='chart_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.patient = Patient.objects.create(first_name='Alice', last_name='Mukamana', date_of_birth=date(1995, 6, 6), gender='F')
+        self.medication = Medication.objects.create(name='Amoxicillin')
+        Allergy.objects.create(patient=self.patient, allergen='Penicillin')
+        MedicalHistory.objects.create(patient=self.patient, condition='Asthma')
+        PastProcedure.objects.create(patient=self.patient, procedure_name='Appendectomy', procedure_date=date(2015, 3, 1))
+
+    def add_visits(self, count):
+        now = timezone.now()
+        visits = PatientVisit.objects.bulk_create([
+            PatientVisit(patient=self.patient, reason='Review', attending_physician=self.admin, visit_date=now - timedelta(days=index))
+            for index in range(count)
+        ])
+        Vitals.objects.bulk_create([Vitals(patient_visit=visit, heart_rate=70) for visit in visits[::2]])
+        Prescription.objects.bulk_create([
+            Prescription(patient_visit=visit, medication=self.medication, dosage='1 tablet', frequency='Daily', duration_days=5)
+            for visit in visits
+        ])
+        return visits
+
+    def get_chart(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('patient-chart', args=[self.patient.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, len(queries)
+
+    def test_chart_sections(self):
+        visits = self.add_visits(2)
+        chart, _ = self.get_chart()
+        self.assertEqual(chart['first_name'], 'Alice')
+        self.assertEqual([row['allergen'] for row in chart['allergies']], ['Penicillin'])
+        self.assertEqual(chart['medical_history'][0]['condition'], 'Asthma')
+        self.assertEqual(chart['past_procedures'][0]['procedure_name'], 'Appendectomy')
+        latest, earlier = chart['recent_visits']
+        self.assertEqual(latest['id'], visits[0].pk)
+        self.assertEqual(latest['vitals']['heart_rate'], 70)
+        self.assertIsNone(earlier['vitals'])
+        self.assertEqual(latest['prescriptions'][0]['medication_name'], 'Amoxicillin')
+        self.assertEqual(latest['attending_physician_username'], 'chart_admin')
+
+    def test_query_count_is_fixed_and_sections_are_bounded(self):
+        self.add_visits(3)
+        _, small = self.get_chart()
+        self.add_visits(297)
+        with self.settings(PATIENT_CHART_SECTION_LIMIT=20):
+            chart, large = self.get_chart()
+        self.assertEqual(small, self.CHART_QUERIES)
+        self.assertEqual(large, self.CHART_QUERIES)
+        self.assertEqual(len(chart['recent_visits']), 20)
+        self.assertEqual(chart['visit_count'], 300)
+
+
+class BulkCreateTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='bulk_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        Patient.objects.create(first_name='Alice', last_name='Mukamana', date_of_birth=date(1995, 6, 6), gender='F', national_id='NID-1')
+
+    def patient(self, index, **overrides):
+        return {'first_name': 'Outreach', 'last_name': f'Patient {index}', 'date_of_birth': '1990-01-01', 'gender': 'F', **overrides}
+
+    def post(self, url_name, items):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse(url_name), items, format='json')
+        return response, len(queries)
+
+    def test_invalid_items_are_reported_without_aborting_valid_ones(self):
+        response, _ = self.post('patient-list-create', [
+            self.patient(0, national_id='NID-2'),
+            self.patient(1, national_id='NID-1'), # already registered
+            self.patient(2, national_id='NID-2'), # repeats item 0
+            self.patient(3, first_name=''),
+            self.patient(4),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([row['index'] for row in response.data['created']], [0, 4])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertIn('national_id', response.data['errors'][0]['errors'])
+        self.assertIn('first_name', response.data['errors'][2]['errors'])
+        self.assertEqual(Patient.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        visits = PatientVisit.objects.bulk_create([
+            PatientVisit(patient=Patient.objects.get(), reason='Outreach') for _ in range(40)
+        ])
+        counts = []
+        for batch in (visits[:4], visits[4:40]):
+            response, queries = self.post('vitals-list-create', [{'patient_visit': visit.pk, 'heart_rate': 72} for visit in batch])
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            counts.append(queries)
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Vitals.objects.count(), 40)
+
+        response, _ = self.post('vitals-list-create', [{'patient_visit': visits[0].pk}, {'patient_visit': 999999}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1])
+
+    def test_stock_items_open_their_inventory_ledger(self):
+        response, _ = self.post('stockitem-list', [
+            {'name': 'Gauze', 'current_stock': '40.00'}, {'name': 'Syringe', 'current_stock': '15.00'}
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(InventoryHistory.objects.values_list('stock_item__name', 'transaction_type', 'new_stock_level')),
+            [('Gauze', 'In', Decimal('40.00')), ('Syringe', 'In', Decimal('15.00'))]
+        )
+        self.assertEqual(StockItem.objects.get(name='Gauze').created_by, self.admin)
+
+
+class SyncChangesTests(APITestCase):
+
+    def setUp(self):
+        self.clinic, self.other_clinic = Facility.objects.bulk_create([Facility(name='Clinic A'), Facility(name='Clinic B')])
+        self.nurse = User.objects.create(username='sync_nurse', facility=self.clinic, role=Role.objects.create(name='Nurse'))
+        self.client.force_authenticate(user=self.nurse)
+        self.start = ChangeLogEntry.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        self.patient = Patient.objects.create(first_name='Alice', last_name='Mukamana', date_of_birth=date(1995, 6, 6), gender='F')
+        self.visit = PatientVisit.objects.create(patient=self.patient, reason='Fever', facility=self.clinic)
+        PatientVisit.objects.create(patient=self.patient, reason='Referral', facility=self.other_clinic)
+        self.vitals = Vitals.objects.create(patient_visit=self.visit, heart_rate=90)
+        self.patient.last_name = 'Uwera'
+        self.patient.save()
+
+    def sync(self, token, **params):
+        response = self.client.get(reverse('sync-changes'), {'since': token, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_changes_are_facility_scoped_and_deduplicated(self):
+        data = self.sync(self.start)
+        changes = [(change['model'], change['id'], change['action']) for change in data['changes']]
+        self.assertEqual(changes, [
+            ('patientvisit', self.visit.pk, 'upsert'), ('vitals', self.vitals.pk, 'upsert'), ('patient', self.patient.pk, 'upsert'),
+        ])
+        self.assertEqual(data['changes'][2]['data']['last_name'], 'Uwera')
+        self.assertFalse(data['has_more'])
+
+        vitals_pk = self.vitals.pk
+        self.vitals.delete()
+        later = self.sync(data['next_token'])
+        self.assertEqual(later['changes'], [
+            {'token': later['next_token'], 'model': 'vitals', 'id': vitals_pk, 'action': 'delete', 'data': None}
+        ])
+        self.assertEqual(self.sync(later['next_token'])['changes'], [])
+
+    def test_limit_pages_through_the_log(self):
+        first = self.sync(self.start, limit=2)
+        self.assertTrue(first['has_more'])
+        rest = self.sync(first['next_token'], limit=2)
+        models = [change['model'] for change in first['changes'] + rest['changes']]
+        # Records are deduplicated within a page; the patient changed on both.
+        self.assertEqual(models, ['patient', 'patientvisit', 'vitals', 'patient'])
+
+    def test_ndjson_stream_and_bulk_created_records(self):
+        self.client.force_authenticate(user=User.objects.create(username='sync_admin', is_superuser=True))
+        self.client.post(reverse('patient-list-create'), [
+            {'first_name': 'Outreach', 'last_name': str(index), 'date_of_birth': '1990-01-01', 'gender': 'M'} for index in range(3)
+        ], format='json')
+        response = self.client.get(reverse('sync-changes'), {'since': self.start, 'facility': self.other_clinic.pk, 'format': 'ndjson'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines[-1], {'next_token': ChangeLogEntry.objects.latest('id').id})
+        self.assertEqual([line['model'] for line in lines[:-1]], ['patientvisit', 'patient', 'patient', 'patient', 'patient'])
+
+    def test_changes_after_an_uncommitted_one_are_held_back(self):
+        token = self.sync(self.start)['next_token']
+        Patient.objects.create(first_name='Late', last_name='Commit', date_of_birth=date(1990, 1, 1), gender='M')
+        Patient.objects.create(first_name='Early', last_name='Commit', date_of_birth=date(1990, 1, 1), gender='M')
+        # The first insert's transaction hasn't committed yet.
+        ChangeLogEntry.objects.filter(id=token + 1).delete()
+
+        data = self.sync(token)
+        self.assertEqual((data['changes'], data['next_token']), ([], token))
+
+        # Past the grace period, the missing id is taken to be a rolled back insert.
+        ChangeLogEntry.objects.filter(id__gt=token).update(changed_at=timezone.now() - timedelta(minutes=5))
+        data = self.sync(token)
+        self.assertEqual([change['data']['first_name'] for change in data['changes']], ['Early'])
+
+    def test_records_moved_to_another_facility_are_deleted_from_the_old_one(self):
+        token = self.sync(self.start)['next_token']
+        self.visit.facility = self.other_clinic
+        self.visit.save()
+
+        changes = [(change['model'], change['id'], change['action']) for change in self.sync(token)['changes']]
+        self.assertEqual(changes, [('patientvisit', self.visit.pk, 'delete'), ('vitals', self.vitals.pk, 'delete')])
+
+        self.client.force_authenticate(user=User.objects.create(username='sync_admin', is_superuser=True))
+        data = self.sync(token, facility=self.other_clinic.pk)
+        changes = [(change['model'], change['id'], change['action']) for change in data['changes']]
+        self.assertEqual(changes, [('patientvisit', self.visit.pk, 'upsert'), ('vitals', self.vitals.pk, 'upsert')])
+        self.assertEqual(data['changes'][0]['data']['facility'], self.other_clinic.pk)
+
+
+class BatchTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='batch_admin', is_superuser=True)
+        Facility.objects.create(name='Kigali Clinic')
+        Role.objects.create(name='Nurse')
+
+    def batch(self, specs):
+        response = self.client.post(reverse('batch'), specs, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_sub_requests_run_in_order_with_one_authentication(self):
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as queries:
+            results = self.batch([
+                {'method': 'GET', 'path': '/api/facilities/'},
+                {'method': 'GET', 'path': '/api/roles/?search=Nurse'},
+                {'method': 'POST', 'path': '/api/patients/', 'body': {
+                    'first_name': 'Alice', 'last_name': 'Mukamana', 'date_of_birth': '1995-06-06', 'gender': 'F'
+                }},
+                {'method': 'GET', 'path': '/api/patients/'},
+                {'method': 'GET', 'path': '/api/nowhere/'},
+            ])
+        self.assertEqual([result['status'] for result in results], [200, 200, 201, 200, 404])
+        self.assertEqual(results[0]['body']['results'][0]['name'], 'Kigali Clinic')
+        self.assertEqual(results[3]['body']['results'][0]['first_name'], 'Alice')
+        user_lookups = [query for query in queries if 'FROM "api_user"' in query['sql']]
+        self.assertEqual(len(user_lookups), 1)
+
+    def test_sub_requests_keep_their_own_permissions_and_headers(self):
+        self.client.force_authenticate(user=User.objects.create(username='batch_clerk'))
+        results = self.batch([{'method': 'GET', 'path': '/api/patients/'}, {'method': 'POST', 'path': '/api/batch/', 'body': []}])
+        self.assertEqual([result['status'] for result in results], [403, 400])
+
+        self.client.force_authenticate(user=self.admin)
+        etag = self.batch([{'path': '/api/facilities/'}])[0]['headers']['ETag']
+        result, = self.batch([{'path': '/api/facilities/', 'headers': {'If-None-Match': etag}}])
+        self.assertEqual(result['status'], 304)
+
+
+@override_settings(ROOT_URLCONF='healthlink_backend.asgi_urls')
+class AsyncViewTests(APITestCase):
+    """
+    The ASGI profile's async variants answer exactly as the synchronous views do.
+    """
+    def setUp(self):
+        self.admin = User.objects.create(username='async_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        supplier = Supplier.objects.create(name='Async Supplier')
+        self.stock_item = StockItem.objects.create(
+            name='Zinc', supplier=supplier, current_stock=5, expiry_date=date.today() + timedelta(days=10)
+        )
+        self.patient = Patient.objects.create(first_name='Amina', last_name='Uwase', date_of_birth=date(1990, 1, 1), gender='F')
+        PaymentTransaction.objects.create(
+            patient=self.patient, amount=Decimal('20.00'), payment_method='Insurance',
+            amount_covered_by_insurance=Decimal('15.00'), patient_paid_amount=Decimal('5.00'), insurance_policy_number='RSSB-9'
+        )
+        today = date.today().isoformat()
+        self.urls = [
+            reverse('stockitem-list'), reverse('stockitem-detail', args=[self.stock_item.pk]),
+            reverse('patient-list-create'), reverse('patient-detail', args=[self.patient.pk]),
+            reverse('patient-detail', args=[999]), reverse('stockitem-list') + '?page=9',
+            reverse('stock-level-report'), reverse('expiring-medications-report'),
+            reverse('expiring-medications-report') + '?bucket=0_30_days',
+            reverse('medication-usage-report') + f'?start_date=2020-01-01&end_date={today}',
+            reverse('medication-usage-report'),
+            reverse('insurance-dispensing-report') + f'?start_date=2020-01-01&end_date={today}',
+        ]
+
+    def test_routes_are_async(self):
+        for url in self.urls[:4] + self.urls[6:]:
+            self.assertTrue(iscoroutinefunction(resolve(url.partition('?')[0]).func), url)
+
+    def test_responses_match_sync_views(self):
+        for url in self.urls:
+            response = self.client.get(url)
+            with override_settings(ROOT_URLCONF='healthlink_backend.urls'):
+                self.assertFalse(iscoroutinefunction(resolve(url.partition('?')[0]).func))
+                expected = self.client.get(url)
+            self.assertEqual(response.status_code, expected.status_code, url)
+            self.assertEqual(response.content, expected.content, url)
+            self.assertEqual(response.get('ETag'), expected.get('ETag'), url)
+
+    def test_conditional_get_and_writes(self):
+        url = reverse('patient-detail', args=[self.patient.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Writes on an async route run the synchronous handlers.
+        response = self.client.patch(url, {'last_name': 'Uwera'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('patient-list-create'), {
+            'first_name': 'Jean', 'last_name': 'Mugisha', 'date_of_birth': '1985-05-05', 'gender': 'M'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    async def test_streamed_export(self):
+        token = str(RefreshToken.for_user(self.admin).access_token)
+        response = await self.async_client.get(
+            reverse('insurance-dispensing-report'),
+            {'start_date': '2020-01-01', 'end_date': date.today().isoformat(), 'format': 'csv'},
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = [line async for line in response.streaming_content]
+        self.assertTrue(lines[0].startswith(b'transaction_id,transaction_date,patient_name'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn(b'Amina Uwase', lines[1])
+
+
+class PatientSearchTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='search_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.amina = Patient.objects.create(
+            first_name='Amina', last_name='Uwase', date_of_birth=date(1990, 1, 1), gender='F',
+            national_id='1 1990 7 0012345 1 23', phone_number='+250 788 123 456'
+        )
+        self.aminata = Patient.objects.create(first_name='Aminata', last_name='Diallo', date_of_birth=date(1985, 5, 5), gender='F')
+        self.elodie = Patient.objects.create(first_name='Élodie', last_name='Niyonsaba-Amin', date_of_birth=date(2001, 3, 3), gender='F')
+
+    def search(self, query):
+        response = self.client.get(reverse('patient-list-create'), {'name': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['id'] for row in response.data['results']]
+
+    def test_prefixes_of_any_token_match_and_exact_tokens_rank_first(self):
+        # 'Amin' is a whole token of Élodie's surname; the prefix matches follow in name order.
+        self.assertEqual(self.search('amin'), [self.elodie.pk, self.aminata.pk, self.amina.pk])
+        self.assertEqual(self.search('Amin'), self.search('amin'))
+        # 'amina' is a whole token of Amina's name and only a prefix of Aminata's.
+        self.assertEqual(self.search('amina'), [self.amina.pk, self.aminata.pk])
+        self.assertEqual(self.search('uwa amina'), [self.amina.pk])
+        self.assertEqual(self.search('elodie niyon'), [self.elodie.pk])
+        self.assertEqual(self.search('0788 123'), [])
+        self.assertEqual(self.search('250 788-123'), [self.amina.pk])
+        self.assertEqual(self.search('11990700'), [self.amina.pk])
+        self.assertNotIn('search_key', self.client.get(reverse('patient-list-create')).data['results'][0])
+
+    def test_index_follows_edits_deletes_and_bulk_creates(self):
+        self.amina.last_name = 'Ingabire'
+        self.amina.save(update_fields=['last_name'])
+        self.assertEqual(self.search('uwase'), [])
+        self.assertEqual(self.search('ingab'), [self.amina.pk])
+
+        self.aminata.delete()
+        self.assertEqual(self.search('diallo'), [])
+
+        response = self.client.post(reverse('patient-list-create'), [
+            {'first_name': 'Jean-Paul', 'last_name': 'Habimana', 'date_of_birth': '1970-02-02', 'gender': 'M'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.search('paul habi'), [response.data['created'][0]['id']])
+
+    @override_settings(PATIENT_SEARCH_BACKEND='fts5')
+    def test_fts5_backend_after_rebuild(self):
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(set(self.search('amin')), {self.amina.pk, self.aminata.pk, self.elodie.pk})
+        self.assertEqual(self.search('elodie niyon'), [self.elodie.pk])
+
+        patient = Patient.objects.create(first_name='Kwame', last_name='Mensah', date_of_birth=date(1999, 9, 9), gender='M')
+        self.assertEqual(self.search('kwa'), [patient.pk])
+        patient.delete()
+        self.assertEqual(self.search('kwa'), [])
+
+
+class ClinicalSearchTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='clinical_search_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.hospital = Facility.objects.create(name='Clinical Search Hospital')
+        self.clinic = Facility.objects.create(name='Clinical Search Clinic')
+        self.patient = Patient.objects.create(first_name='Amina', last_name='Uwase', date_of_birth=date(1990, 1, 1), gender='F')
+        now = timezone.now()
+        self.recent = PatientVisit.objects.create(
+            patient=self.patient, facility=self.hospital, visit_date=now - timedelta(days=3),
+            reason='High fevers and headache', diagnosis='Malaria (P. falciparum)', notes='Started on <ACT> regimen'
+        )
+        self.old = PatientVisit.objects.create(
+            patient=self.patient, facility=self.hospital, visit_date=now - timedelta(days=90),
+            reason='Cough', diagnosis='Suspected malaria, test negative'
+        )
+        self.elsewhere = PatientVisit.objects.create(
+            patient=self.patient, facility=self.clinic, visit_date=now - timedelta(days=1), reason='Fever', diagnosis='Malaria'
+        )
+        self.history = MedicalHistory.objects.create(patient=self.patient, condition='Malaria', notes='Two episodes as a child')
+        self.procedure = PastProcedure.objects.create(patient=self.patient, procedure_name='Appendectomy', procedure_date=date(2015, 6, 1))
+
+    def search(self, **params):
+        response = self.client.get(reverse('clinical-search'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def found(self, **params):
+        return {(row['type'], row['id']) for row in self.search(**params)['results']}
+
+    def test_finds_matches_across_models_with_highlighted_snippets(self):
+        self.assertEqual(self.found(q='malaria'), {
+            ('visit', self.recent.pk), ('visit', self.old.pk), ('visit', self.elsewhere.pk), ('medical_history', self.history.pk),
+        })
+        # Stemmed, so 'fever' also finds 'fevers'.
+        self.assertEqual(self.found(q='fever'), {('visit', self.recent.pk), ('visit', self.elsewhere.pk)})
+        self.assertEqual(self.found(q='fever headache'), {('visit', self.recent.pk)})
+        self.assertEqual(self.found(q='appendectomy'), {('past_procedure', self.procedure.pk)})
+
+        row = self.search(q='act regimen')['results'][0]
+        self.assertEqual((row['patient'], row['patient_name'], row['facility']), (self.patient.pk, 'Amina Uwase', self.hospital.pk))
+        self.assertIn('&lt;<mark>ACT</mark>&gt; <mark>regimen</mark>', row['snippet'])
+
+    def test_date_type_and_facility_filters(self):
+        last_month = {'start_date': (timezone.localdate() - timedelta(days=30)).isoformat(), 'end_date': timezone.localdate().isoformat()}
+        self.assertEqual(self.found(q='malaria', type='visit', **last_month), {('visit', self.recent.pk), ('visit', self.elsewhere.pk)})
+        self.assertEqual(self.found(q='malaria', type='medical_history'), {('medical_history', self.history.pk)})
+        newest_first = self.search(q='malaria', type='visit', ordering='-date')['results']
+        self.assertEqual([row['id'] for row in newest_first], [self.elsewhere.pk, self.recent.pk, self.old.pk])
+
+        # Staff see their own facility's visits and the patient-level records.
+        nurse = User.objects.create(username='clinical_search_nurse', facility=self.hospital, role=Role.objects.create(name='Nurse'))
+        self.client.force_authenticate(user=nurse)
+        self.assertEqual(self.found(q='malaria', facility=self.clinic.pk), {
+            ('visit', self.recent.pk), ('visit', self.old.pk), ('medical_history', self.history.pk),
+        })
+
+        page = self.search(q='malaria', ordering='-date', limit=2)
+        self.assertEqual(len(page['results']), 2)
+        self.assertEqual(len(self.client.get(page['next']).data['results']), 1)
+        self.assertEqual(self.client.get(reverse('clinical-search'), {'q': 'malaria', 'type': 'lab'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('clinical-search'), {'q': 'malaria', 'start_date': 'May'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_edits_deletes_bulk_creates_and_rebuilds(self):
+        self.old.diagnosis = 'Bronchitis'
+        self.old.save()
+        self.assertNotIn(('visit', self.old.pk), self.found(q='malaria'))
+        self.assertEqual(self.found(q='bronchitis'), {('visit', self.old.pk)})
+        self.history.delete()
+        self.assertNotIn(('medical_history', self.history.pk), self.found(q='malaria'))
+
+        response = self.client.post(reverse('pastprocedure-list-create'), [
+            {'patient': self.patient.pk, 'procedure_name': 'Cholecystectomy', 'procedure_date': '2020-01-01'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.found(q='cholecystectomy'), {('past_procedure', response.data['created'][0]['id'])})
+
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM api_clinical_search_fts")
+        self.assertEqual(self.found(q='malaria'), set())
+        call_command('rebuild_search_index', only='clinical', stdout=io.StringIO())
+        self.assertEqual(len(self.found(q='malaria')), 2)
+
+    @override_settings(CLINICAL_SEARCH_BACKEND='scan')
+    def test_scan_backend_matches_without_an_index(self):
+        self.assertEqual(self.found(q='malaria'), {
+            ('visit', self.recent.pk), ('visit', self.old.pk), ('visit', self.elsewhere.pk), ('medical_history', self.history.pk),
+        })
+        results = self.search(q='regimen act', facility=self.hospital.pk)['results']
+        self.assertEqual([row['id'] for row in results], [self.recent.pk])
+        self.assertIn('&lt;<mark>ACT</mark>&gt; <mark>regimen</mark>', results[0]['snippet'])
+
+    @override_settings(CLINICAL_SEARCH_BACKEND=None)
+    def test_default_backend_follows_the_database(self):
+        self.assertEqual(get_clinical_search_backend().name, 'fts5')
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertEqual(get_clinical_search_backend().name, 'scan')
+
+
+class StockAutocompleteTests(APITestCase):
+
+    def setUp(self):
+        self.central = Facility.objects.create(name='Autocomplete Central')
+        self.clinic = Facility.objects.create(name='Autocomplete Clinic')
+        self.admin = User.objects.create(username='autocomplete_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+        self.amoxicillin = StockItem.objects.create(name='Amoxicillin Syrup', facility=self.central)
+        self.coamoxiclav = StockItem.objects.create(name='Co-Amoxiclav 625mg', facility=self.clinic)
+        self.paracetamol = StockItem.objects.create(name='Paracétamol 500mg', facility=None)
+        self.medication = Medication.objects.create(name='Amoxicillin', stock_item=self.amoxicillin)
+
+    def lookup(self, **params):
+        response = self.client.get(reverse('autocomplete-stock'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {source: [row['id'] for row in rows] for source, rows in response.data.items()}
+
+    def test_matches_the_start_of_any_word_in_name_order(self):
+        self.assertEqual(self.lookup(q='AMOX'), {
+            'stock_items': [self.amoxicillin.pk, self.coamoxiclav.pk], 'medications': [self.medication.pk],
+        })
+        self.assertEqual(self.lookup(q='paracetamol 5')['stock_items'], [self.paracetamol.pk])
+        self.assertEqual(self.lookup(q='amox', limit=1)['stock_items'], [self.amoxicillin.pk])
+        self.assertEqual(self.lookup(q='moxi')['stock_items'], [])
+        self.assertEqual(self.client.get(reverse('autocomplete-stock')).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only_see_their_facility_and_shared_entries(self):
+        pharmacist = User.objects.create(
+            username='autocomplete_pharmacist', facility=self.clinic, role=Role.objects.create(name='Pharmacist')
+        )
+        self.client.force_authenticate(user=pharmacist)
+        self.assertEqual(self.lookup(q='amox', facility=self.central.pk), {'stock_items': [self.coamoxiclav.pk], 'medications': []})
+        self.assertEqual(self.lookup(q='para')['stock_items'], [self.paracetamol.pk])
+
+    def test_index_is_served_from_memory_until_a_write_bumps_its_version(self):
+        self.lookup(q='amox')
+        with CaptureQueriesContext(connection) as queries:
+            self.lookup(q='amox')
+        self.assertEqual(len(queries), 0)
+
+        # A stock level change leaves the entry as it is: no rebuild.
+        self.amoxicillin.current_stock = Decimal('40.00')
+        self.amoxicillin.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.lookup(q='amox')
+        self.assertEqual(len(queries), 0)
+
+        self.coamoxiclav.name = 'Augmentin 625mg'
+        self.coamoxiclav.save()
+        added = StockItem.objects.create(name='Amoxicillin Capsules', facility=self.central)
+        self.assertEqual(self.lookup(q='amox')['stock_items'], [added.pk, self.amoxicillin.pk])
+        self.assertEqual(self.lookup(q='augm')['stock_items'], [self.coamoxiclav.pk])
+
+
+class DuplicatePatientTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(username='dedup_admin', is_superuser=True)
+        self.client.force_authenticate(user=self.admin)
+
+    def patient(self, first_name, last_name, date_of_birth, gender='F', **fields):
+        return Patient.objects.create(
+            first_name=first_name, last_name=last_name, date_of_birth=date_of_birth, gender=gender, **fields
+        )
+
+    def candidate_pairs(self):
+        return {(c.patient_a_id, c.patient_b_id) for c in DuplicatePatientCandidate.objects.all()}
+
+    def test_pairs_sharing_a_block_are_scored_and_queued(self):
+        jean = self.patient('Jean', 'Habimana', date(1990, 3, 4), 'M', phone_number='0788 111 222')
+        jean_typo = self.patient('Jean', 'Habimanna', date(1990, 3, 4), 'M')
+        swapped = self.patient('Habimana', 'Jean', date(1990, 3, 4), 'M', phone_number='+0788111222')
+        marie = self.patient('Marie', 'Mukamana', date(1985, 1, 1))
+        marie_typo = self.patient('Marie', 'Nukamana', date(1985, 1, 1)) # Different surname code
+        # Same name, but two different registered IDs
+        self.patient('Grace', 'Uwase', date(2000, 5, 5), national_id='NID-1')
+        self.patient('Grace', 'Uwase', date(2000, 5, 5), national_id='NID-2')
+        # Born in another year: never compared
+        self.patient('Marie', 'Mukamana', date(1986, 1, 1))
+
+        call_command('detect_duplicate_patients', stdout=io.StringIO())
+        self.assertEqual(self.candidate_pairs(), {
+            (jean.pk, jean_typo.pk), (jean.pk, swapped.pk), (jean_typo.pk, swapped.pk), (marie.pk, marie_typo.pk),
+        })
+        self.assertEqual(DuplicatePatientCandidate.objects.get(patient_b=marie_typo).blocking_key, 'name:M600:1985-01-01:F')
+
+    def test_reviewed_pairs_keep_their_decision_on_the_next_run(self):
+        first = self.patient('Aline', 'Ingabire', date(1999, 9, 9))
+        second = self.patient('Alinne', 'Ingabire', date(1999, 9, 9))
+        call_command('detect_duplicate_patients', stdout=io.StringIO())
+        candidate = DuplicatePatientCandidate.objects.get()
+
+        response = self.client.patch(reverse('duplicate-patient-detail', args=[candidate.pk]), {'status': 'Dismissed', 'score': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        candidate.refresh_from_db()
+        self.assertEqual((candidate.status, candidate.reviewed_by), ('Dismissed', self.admin))
+        self.assertGreater(candidate.score, 0.9)
+
+        third = self.patient('Aline', 'Ingabiire', date(1999, 9, 9))
+        call_command('detect_duplicate_patients', stdout=io.StringIO())
+        self.assertEqual(DuplicatePatientCandidate.objects.get(patient_a=first, patient_b=second).status, 'Dismissed')
+        response = self.client.get(reverse('duplicate-patient-list'), {'status': 'Pending'})
+        self.assertEqual(
+            {(row['patient_a'], row['patient_b']) for row in response.data['results']},
+            {(first.pk, third.pk), (second.pk, third.pk)}
+        )
+        self.assertEqual(response.data['results'][0]['patient_b_full_name'], 'Aline Ingabiire')
+
+    def test_oversized_blocks_are_compared_by_sorted_neighbourhood(self):
+        records = [PatientRecord(index, f'given{index}', 'habimana', date(1990, 1, 1), 'M', '', '') for index in range(MAX_BLOCK_SIZE * 5)]
+        self.assertLessEqual(len(list(block_pairs(records))), len(records) * SORTED_WINDOW)
+        self.assertEqual(len(list(block_pairs(records[:10]))), 45)
+
+
+class PermissionResolutionTests(APITestCase):
+
+    def setUp(self):
+        self.clinic = Facility.objects.create(name='Permission Clinic')
+        self.nurse = User.objects.create_user(
+            username='permission_nurse', password='s3cret-pass', facility=self.clinic, role=Role.objects.create(name='Nurse')
+        )
+        StockItem.objects.create(name='Paracetamol 500mg', facility=self.clinic)
+
+    def assert_role_and_facility_loaded_with_user(self):
+        # The nurse is the last of five roles the autocomplete view's OR-chain tries.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('autocomplete-stock'), {'q': 'para'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.data['stock_items']], ['Paracetamol 500mg'])
+        user_lookups = [query['sql'] for query in queries if 'FROM "api_user"' in query['sql']]
+        self.assertEqual(len(user_lookups), 1)
+        self.assertIn('"api_role"', user_lookups[0])
+        self.assertFalse([query for query in queries if 'FROM "api_role"' in query['sql'] or 'FROM "api_facility"' in query['sql']])
+
+    def test_jwt_user_comes_with_role_and_facility(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.nurse).access_token}')
+        self.assert_role_and_facility_loaded_with_user()
+
+    def test_session_user_comes_with_role_and_facility(self):
+        self.assertTrue(self.client.login(username='permission_nurse', password='s3cret-pass'))
+        self.assert_role_and_facility_loaded_with_user()
+
+    def test_staff_without_a_facility_get_no_facility_scoped_data(self):
+        pharmacist = User.objects.create(username='permission_floating_pharmacist', role=Role.objects.create(name='Pharmacist'))
+        self.nurse.facility = None
+        self.nurse.save()
+        for user, url, params in [
+            (self.nurse, reverse('sync-changes'), {}),
+            (self.nurse, reverse('autocomplete-stock'), {'q': 'para', 'facility': self.clinic.pk}),
+            (self.nurse, reverse('clinical-search'), {'q': 'malaria'}),
+            (pharmacist, reverse('expiring-medications-report'), {}),
+        ]:
+            self.client.force_authenticate(user=user)
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_403_FORBIDDEN, url)
+
+
+class StatelessJWTTests(APITestCase):
+
+    def setUp(self):
+        self.clinic = Facility.objects.create(name='Stateless Clinic')
+        self.other_clinic = Facility.objects.create(name='Other Stateless Clinic')
+        self.nurse = User.objects.create_user(
+            username='stateless_nurse', password='s3cret-pass', facility=self.clinic, role=Role.objects.create(name='Nurse')
+        )
+        StockItem.objects.create(name='Paracetamol 500mg', facility=self.clinic)
+        StockItem.objects.create(name='Paracetamol 1g', facility=self.other_clinic)
+        # Revocations of earlier tests' users, whose ids are reused, stay in this process's denylist.
+        reload_token_denylist()
+
+    def obtain(self):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'stateless_nurse', 'password': 's3cret-pass'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def lookup(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(reverse('autocomplete-stock'), {'q': 'para'})
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_claims_authenticate_without_loading_the_user(self):
+        access = self.obtain()['access']
+        claims = AccessToken(access)
+        self.assertEqual((claims['role'], claims['facility_id'], claims['is_superuser']), ('Nurse', self.clinic.pk, False))
+
+        self.lookup(access) # Loads the token denylist
+        with CaptureQueriesContext(connection) as queries:
+            response = self.lookup(access)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Scoped to the facility the token claims.
+        self.assertEqual([row['name'] for row in response.data['stock_items']], ['Paracetamol 500mg'])
+        self.assertFalse([query for query in queries if '"api_user"' in query['sql'] or '"api_role"' in query['sql']])
+        self.assertEqual(response.wsgi_request.user.pk, self.nurse.pk)
+
+        # Tokens without the claims still work, by loading the user.
+        self.assertEqual(self.lookup(RefreshToken.for_user(self.nurse).access_token).status_code, status.HTTP_200_OK)
+
+    def test_logout_revokes_the_access_and_refresh_tokens(self):
+        tokens = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        response = self.client.post(reverse('logout'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.lookup(tokens['access']).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_changing_a_claimed_field_revokes_earlier_tokens(self):
+        refresh = ClaimsTokenObtainPairSerializer.get_token(self.nurse)
+        access = refresh.access_token
+        for token in (refresh, access):
+            token.set_iat(at_time=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.lookup(access).status_code, status.HTTP_200_OK)
+
+        self.nurse.last_login = timezone.now()
+        self.nurse.save(update_fields=['last_login'])
+        self.assertEqual(self.lookup(access).status_code, status.HTTP_200_OK)
+
+        self.nurse.facility = self.other_clinic
+        self.nurse.save()
+        self.assertEqual(self.lookup(access).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.lookup(self.obtain()['access'])
+        self.assertEqual([row['name'] for row in response.data['stock_items']], ['Paracetamol 1g'])
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_changing_the_password_revokes_earlier_tokens(self):
+        refresh = ClaimsTokenObtainPairSerializer.get_token(self.nurse)
+        access = refresh.access_token
+        for token in (refresh, access):
+            token.set_iat(at_time=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.lookup(access).status_code, status.HTTP_200_OK)
+
+        self.nurse.set_password('n3w-secret-pass')
+        self.nurse.save(update_fields=['password'])
+        self.assertEqual(self.lookup(access).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_revocation_applies_to_tokens_issued_in_the_same_second(self):
+        revoked_at = timezone.now().replace(microsecond=500000) - timedelta(minutes=1)
+        with mock.patch('rest_framework_simplejwt.tokens.aware_utcnow', return_value=revoked_at - timedelta(milliseconds=100)):
+            before = ClaimsTokenObtainPairSerializer.get_token(self.nurse).access_token
+            without_issue_time = RefreshToken.for_user(self.nurse).access_token
+        with mock.patch('rest_framework_simplejwt.tokens.aware_utcnow', return_value=revoked_at + timedelta(milliseconds=100)):
+            after = ClaimsTokenObtainPairSerializer.get_token(self.nurse).access_token
+        self.assertEqual({before['iat'], without_issue_time['iat'], after['iat']}, {int(revoked_at.timestamp())})
+
+        with mock.patch('django.utils.timezone.now', return_value=revoked_at):
+            revoke_user_tokens([self.nurse.pk])
+        self.assertEqual(self.lookup(before).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.lookup(without_issue_time).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.lookup(after).status_code, status.HTTP_200_OK)
+
+    def test_denylist_is_reloaded_from_the_table(self):
+        access = AccessToken(self.obtain()['access'])
+        self.assertEqual(self.lookup(access).status_code, status.HTTP_200_OK)
+        # As revoked by another process: seen once this process reloads the denylist.
+        RevokedToken.objects.create(jti=access['jti'], expires_at=timezone.now() + timedelta(hours=1))
+        with override_settings(JWT_DENYLIST_REFRESH_SECONDS=3600):
+            self.assertEqual(self.lookup(access).status_code, status.HTTP_200_OK)
+        with override_settings(JWT_DENYLIST_REFRESH_SECONDS=0):
+            self.assertEqual(self.lookup(access).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -10,14 +10,15 @@ from rest_framework import status # Import status for use in APIRoot if needed
 from .views import (
     UserRegistrationView, UserLoginView, UserLogoutView,
     UserListView, UserDetailView,
-    FacilityListCreateView, FacilityRetrieveUpdateDestroyView,
+    FacilityListCreateView, FacilityRetrieveUpdateDestroyView, FacilityDashboardView,
     RoleListCreateView, RoleRetrieveUpdateDestroyView,
     StockItemViewSet, # This is a ViewSet
     SupplierListCreateView, SupplierRetrieveUpdateDestroyView,
     SupplierStockItemListCreateView, SupplierStockItemRetrieveUpdateDestroyView,
     OrderListCreateView, OrderRetrieveUpdateDestroyView,
     OrderItemListCreateView, OrderItemRetrieveUpdateDestroyView,
-    PatientListCreateView, PatientRetrieveUpdateDestroyView,
+    PatientListCreateView, PatientRetrieveUpdateDestroyView, PatientChartView,
+    DuplicatePatientCandidateListView, DuplicatePatientCandidateReviewView,
     AllergyListCreateView, AllergyRetrieveUpdateDestroyView,
     MedicalHistoryListCreateView, MedicalHistoryRetrieveUpdateDestroyView,
     PastProcedureListCreateView, PastProcedureRetrieveUpdateDestroyView,
@@ -34,7 +35,10 @@ from .views import (
     ReorderSuggestionView, DirectSupplierOrderingView,
     MedicationDispenseView,
     StockLevelReportView, MedicationUsageReportView, ExpiringMedicationsReportView,
-    InsuranceDispensingReportView
+    InsuranceDispensingReportView,
+    ReportJobListCreateView, ReportJobRetrieveView, ReportJobDownloadView,
+    FacilityComparisonView, PharmacovigilanceSignalListView, SyncChangesView,
+    BatchView, StockAutocompleteView, ClinicalSearchView
 )
 
 # Create a router and register ViewSets with it.
@@ -61,6 +65,7 @@ class APIRoot(APIView):
             'orders': reverse('order-list-create', request=request, format=format),
             'order-items': reverse('orderitem-list-create', request=request, format=format),
             'patients': reverse('patient-list-create', request=request, format=format),
+            'patient-duplicates': reverse('duplicate-patient-list', request=request, format=format),
             'allergies': reverse('allergy-list-create', request=request, format=format),
             'medical-history': reverse('medicalhistory-list-create', request=request, format=format),
             'past-procedures': reverse('pastprocedure-list-create', request=request, format=format),
@@ -80,6 +85,13 @@ class APIRoot(APIView):
             'reports-medication-usage': reverse('medication-usage-report', request=request, format=format),
             'reports-expiring-medications': reverse('expiring-medications-report', request=request, format=format),
             'reports-insurance-dispensing': reverse('insurance-dispensing-report', request=request, format=format),
+            'report-jobs': reverse('report-job-list-create', request=request, format=format),
+            'analytics-facility-comparison': reverse('facility-comparison', request=request, format=format),
+            'pharmacovigilance-signals': reverse('pharmacovigilance-signal-list', request=request, format=format),
+            'sync-changes': reverse('sync-changes', request=request, format=format),
+            'batch': reverse('batch', request=request, format=format),
+            'autocomplete-stock': reverse('autocomplete-stock', request=request, format=format),
+            'search-clinical': reverse('clinical-search', request=request, format=format),
         })
 
 
@@ -95,6 +107,7 @@ urlpatterns = [
 
     path('facilities/', FacilityListCreateView.as_view(), name='facility-list-create'),
     path('facilities/<int:pk>/', FacilityRetrieveUpdateDestroyView.as_view(), name='facility-detail'),
+    path('facilities/<int:pk>/dashboard/', FacilityDashboardView.as_view(), name='facility-dashboard'),
 
     path('roles/', RoleListCreateView.as_view(), name='role-list-create'),
     path('roles/<int:pk>/', RoleRetrieveUpdateDestroyView.as_view(), name='role-detail'),
@@ -113,6 +126,9 @@ urlpatterns = [
 
     path('patients/', PatientListCreateView.as_view(), name='patient-list-create'),
     path('patients/<int:pk>/', PatientRetrieveUpdateDestroyView.as_view(), name='patient-detail'),
+    path('patients/<int:pk>/chart/', PatientChartView.as_view(), name='patient-chart'),
+    path('patients/duplicates/', DuplicatePatientCandidateListView.as_view(), name='duplicate-patient-list'),
+    path('patients/duplicates/<int:pk>/', DuplicatePatientCandidateReviewView.as_view(), name='duplicate-patient-detail'),
 
     path('allergies/', AllergyListCreateView.as_view(), name='allergy-list-create'),
     path('allergies/<int:pk>/', AllergyRetrieveUpdateDestroyView.as_view(), name='allergy-detail'),
@@ -164,6 +180,27 @@ urlpatterns = [
     path('reports/expiring-medications/', ExpiringMedicationsReportView.as_view(), name='expiring-medications-report'),
     path('reports/insurance-dispensing/', InsuranceDispensingReportView.as_view(), name='insurance-dispensing-report'),
 
+    # Regional Analytics
+    path('analytics/facilities/', FacilityComparisonView.as_view(), name='facility-comparison'),
+
+    # Pharmacovigilance (signals are computed by the detect_pv_signals management command)
+    path('pharmacovigilance/signals/', PharmacovigilanceSignalListView.as_view(), name='pharmacovigilance-signal-list'),
+
+    # Background Report Jobs (computed by the run_report_jobs management command)
+    path('report-jobs/', ReportJobListCreateView.as_view(), name='report-job-list-create'),
+    path('report-jobs/<int:pk>/', ReportJobRetrieveView.as_view(), name='report-job-detail'),
+    path('report-jobs/<int:pk>/download/', ReportJobDownloadView.as_view(), name='report-job-download'),
+
+    # Offline Delta Sync
+    path('sync/changes/', SyncChangesView.as_view(), name='sync-changes'),
+
+    # Batched Sub-requests
+    path('batch/', BatchView.as_view(), name='batch'),
+
+    # As-you-type lookups
+    path('autocomplete/stock/', StockAutocompleteView.as_view(), name='autocomplete-stock'),
+    path('search/clinical/', ClinicalSearchView.as_view(), name='clinical-search'),
+
     # Include router URLs at the end. This will add /stockitems/ and /stockitems/<pk>/
     path('', include(router.urls)), # <--- ADDED THIS LINE
 ]
\ No newline at end of file
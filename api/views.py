@@ -6,11 +6,22 @@ from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, PermissionDenied
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Q # For complex queries
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.db.models import (
+    Q, F, Sum, Count, Value, OuterRef, Subquery, Case, When, CharField, DecimalField, Prefetch
+) # For complex queries
+from django.db.models.functions import Coalesce, Concat
 from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta, date # Import date for filtering
+from datetime import timedelta, date, datetime, time # Import date for filtering
+from decimal import Decimal
 
 
 from .models import (
@@ -18,7 +29,8 @@ from .models import (
     Order, OrderItem, Patient, Allergy, MedicalHistory, PastProcedure,
     PatientVisit, Vitals, Medication, Prescription,
     AdverseDrugReaction, AdverseEventFollowingImmunization,
-    OrderHistory, PaymentTransaction, InventoryHistory
+    OrderHistory, PaymentTransaction, InventoryHistory, ReportJob, PharmacovigilanceSignal,
+    DuplicatePatientCandidate
 )
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, UserLoginSerializer,
@@ -28,11 +40,33 @@ from .serializers import (
     PatientVisitSerializer, VitalsSerializer,
     MedicationSerializer, PrescriptionSerializer,
     AdverseDrugReactionSerializer, AdverseEventFollowingImmunizationSerializer,
-    OrderHistorySerializer, PaymentTransactionSerializer, InventoryHistorySerializer
+    OrderHistorySerializer, PaymentTransactionSerializer, InventoryHistorySerializer,
+    ReportJobSerializer, PharmacovigilanceSignalSerializer, PatientChartSerializer,
+    DuplicatePatientCandidateSerializer
 )
 from .permissions import (
-    IsSuperAdmin, IsFacilityAdmin, IsDoctor, IsNurse, IsPharmacist
+    IsSuperAdmin, IsFacilityAdmin, IsDoctor, IsNurse, IsPharmacist, IsRegionalManager, effective_facility_id
 )
+from .exports import ReportExportMixin, NDJSONStreamRenderer
+from .pagination import (
+    ReportPagination, TransactionDateCursorPagination, ChangeDateCursorPagination, VisitDateCursorPagination
+)
+from .report_cache import cached_report, get_report_cache, get_report_version, invalidate_ledger_reports
+from .report_jobs import get_report_view_class
+from .analytics import count_subquery, sum_subquery, compare_facilities
+from .fast_serializers import FastListMixin
+from .conditional import ConditionalGetMixin
+from .bulk import BulkCreateMixin
+from .batch import run_batch
+from .authentication import revoke_token
+from .autocomplete import DEFAULT_AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, autocomplete, invalidate_autocomplete
+from .clinical_search import (
+    CLINICAL_TYPES, DEFAULT_CLINICAL_SEARCH_LIMIT, MAX_CLINICAL_SEARCH_LIMIT,
+    get_clinical_search_backend, index_clinical_records
+)
+from .filters import PatientFilter
+from .search import index_patients, patient_search_key
+from .sync import DEFAULT_SYNC_PAGE_SIZE, MAX_SYNC_PAGE_SIZE, changes_since, iter_sync_stream, render_changes
 
 
 # --- Authentication & User Management ---
@@ -60,9 +94,18 @@ class UserLogoutView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
+        # A JWT stays valid until it expires unless revoked: revoke the access
+        # token of this request and the refresh token, if one is sent.
+        if isinstance(request.auth, AccessToken):
+            revoke_token(request.auth)
+        if request.data.get('refresh'):
+            try:
+                revoke_token(RefreshToken(request.data['refresh']))
+            except TokenError:
+                return Response({"detail": "Invalid refresh token."}, status=status.HTTP_400_BAD_REQUEST)
         try:
             # Delete the user's token to log them out
-            request.user.auth_token.delete()
+            Token.objects.filter(user=request.user).delete()
             logout(request)
             return Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -80,32 +123,103 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # --- Facility Views ---
-class FacilityListCreateView(generics.ListCreateAPIView):
+class FacilityListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Facility.objects.all()
     serializer_class = FacilitySerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin]
 
-class FacilityRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class FacilityRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Facility.objects.all()
     serializer_class = FacilitySerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin]
 
 
+class FacilityDashboardView(APIView):
+    """
+    Headline numbers for a facility admin's landing page, in two queries:
+    one for the facility row with correlated visit/revenue/prescription
+    subqueries, and one conditional aggregate over the facility's stock.
+    Results are cached briefly and dropped as soon as the facility's
+    stock or payment ledger changes.
+    """
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin]
+
+    def get(self, request, pk, *args, **kwargs):
+        if not request.user.is_superuser and request.user.facility_id != pk:
+            raise PermissionDenied("You can only view the dashboard of your own facility.")
+
+        cache = get_report_cache()
+        cache_key = f'facility-dashboard:{pk}:v{get_report_version(pk)}'
+        dashboard = cache.get(cache_key)
+        if dashboard is None:
+            dashboard = self.build_dashboard(pk)
+            if dashboard is None:
+                return Response({"detail": "Facility not found."}, status=status.HTTP_404_NOT_FOUND)
+            cache.set(cache_key, dashboard, timeout=getattr(settings, 'FACILITY_DASHBOARD_CACHE_TIMEOUT', 30))
+        return Response(dashboard, status=status.HTTP_200_OK)
+
+    def build_dashboard(self, facility_id):
+        today = timezone.localdate()
+        day_start = timezone.make_aware(datetime.combine(today, time.min))
+        day_end = day_start + timedelta(days=1)
+
+        todays_payments = PaymentTransaction.objects.filter(
+            processed_by__facility=OuterRef('pk'), transaction_date__gte=day_start, transaction_date__lt=day_end
+        )
+        payment_methods = [method for method, _ in PaymentTransaction.PAYMENT_METHOD_CHOICES]
+        revenue_annotations = {
+            f'revenue_{index}': sum_subquery(todays_payments.filter(payment_method=method), 'amount')
+            for index, method in enumerate(payment_methods)
+        }
+
+        facility = Facility.objects.filter(pk=facility_id).annotate(
+            todays_visits=count_subquery(PatientVisit.objects.filter(
+                facility=OuterRef('pk'), visit_date__gte=day_start, visit_date__lt=day_end
+            )),
+            pending_prescriptions=count_subquery(Prescription.objects.filter(
+                patient_visit__facility=OuterRef('pk'), is_dispensed=False
+            )),
+            **revenue_annotations
+        ).values('id', 'name', 'todays_visits', 'pending_prescriptions', *revenue_annotations).first()
+        if facility is None:
+            return None
+
+        stock = StockItem.objects.filter(facility_id=facility_id, is_active=True).aggregate(
+            low_stock_count=Count('id', filter=Q(current_stock__gt=0, current_stock__lte=F('reorder_level'))),
+            out_of_stock_count=Count('id', filter=Q(current_stock__lte=0)),
+            expiring_in_30_days=Count('id', filter=Q(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=30))),
+            expiring_in_60_days=Count('id', filter=Q(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=60))),
+            expiring_in_90_days=Count('id', filter=Q(expiry_date__gte=today, expiry_date__lte=today + timedelta(days=90))),
+        )
+
+        revenue = {method: facility[f'revenue_{index}'] for index, method in enumerate(payment_methods)}
+        revenue['total'] = sum(revenue.values(), Decimal('0.00'))
+        return {
+            "facility_id": facility['id'],
+            "facility_name": facility['name'],
+            "date": today.isoformat(),
+            "stock": stock,
+            "todays_visits": facility['todays_visits'],
+            "todays_revenue": revenue,
+            "pending_prescriptions": facility['pending_prescriptions'],
+        }
+
+
 # --- Role Views ---
-class RoleListCreateView(generics.ListCreateAPIView):
+class RoleListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin]
 
-class RoleRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class RoleRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin]
 
 
 # --- StockItem Views ---
-class StockItemViewSet(viewsets.ModelViewSet):
-    queryset = StockItem.objects.all()
+class StockItemViewSet(BulkCreateMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = StockItem.objects.select_related('supplier')
     serializer_class = StockItemSerializer
     permission_classes = [IsAuthenticated, IsPharmacist | IsSuperAdmin | IsFacilityAdmin | IsDoctor | IsNurse]
 
@@ -115,6 +229,25 @@ class StockItemViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save(changed_by_user=self.request.user)
 
+    def perform_bulk_create(self, instances):
+        user = self.request.user
+        for instance in instances:
+            instance.created_by = instance.last_updated_by = user
+        instances = super().perform_bulk_create(instances)
+        # bulk_create() skips the post_save signals that open each item's inventory
+        # ledger and invalidate cached reports and autocomplete, so do that once for the batch.
+        InventoryHistory.objects.bulk_create([
+            InventoryHistory(
+                stock_item=instance, transaction_type='In', quantity_change=instance.current_stock,
+                new_stock_level=instance.current_stock, processed_by=user,
+                reason=f'Stock Item {instance.name} (ID: {instance.id}) created with initial stock: {instance.current_stock}.'
+            )
+            for instance in instances
+        ])
+        invalidate_ledger_reports({user.facility_id, *(instance.facility_id for instance in instances)})
+        invalidate_autocomplete()
+        return instances
+
     @action(detail=False, methods=['get'], url_path='by-barcode/(?P<barcode_value>[^/.]+)')
     def by_barcode(self, request, barcode_value=None):
         """
@@ -131,32 +264,32 @@ class StockItemViewSet(viewsets.ModelViewSet):
 
 
 # --- Supplier Views ---
-class SupplierListCreateView(generics.ListCreateAPIView):
+class SupplierListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class SupplierRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SupplierRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- SupplierStockItem Views ---
-class SupplierStockItemListCreateView(generics.ListCreateAPIView):
-    queryset = SupplierStockItem.objects.all()
+class SupplierStockItemListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = SupplierStockItem.objects.select_related('supplier', 'stock_item')
     serializer_class = SupplierStockItemSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class SupplierStockItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = SupplierStockItem.objects.all()
+class SupplierStockItemRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = SupplierStockItem.objects.select_related('supplier', 'stock_item')
     serializer_class = SupplierStockItemSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- Order Views ---
-class OrderListCreateView(generics.ListCreateAPIView):
-    queryset = Order.objects.all()
+class OrderListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = Order.objects.select_related('created_by')
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
@@ -164,111 +297,192 @@ class OrderListCreateView(generics.ListCreateAPIView):
         # Automatically set created_by to the requesting user
         serializer.save(created_by=self.request.user)
 
-class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Order.objects.all()
+class OrderRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Order.objects.select_related('created_by')
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- OrderItem Views ---
-class OrderItemListCreateView(generics.ListCreateAPIView):
-    queryset = OrderItem.objects.all()
+class OrderItemListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = OrderItem.objects.select_related('stock_item')
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class OrderItemRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = OrderItem.objects.all()
+class OrderItemRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = OrderItem.objects.select_related('stock_item')
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- Patient Views ---
-class PatientListCreateView(generics.ListCreateAPIView):
+class PatientListCreateView(BulkCreateMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
+    filterset_class = PatientFilter
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class PatientRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+    def perform_bulk_create(self, instances):
+        # bulk_create() skips Patient.save() and the signal that indexes it for search.
+        for instance in instances:
+            instance.search_key = patient_search_key(instance)
+        instances = super().perform_bulk_create(instances)
+        index_patients(instances)
+        return instances
+
+class PatientRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
+class DuplicatePatientCandidateListView(generics.ListAPIView):
+    """
+    Pairs of patient records that may be the same person, most similar first.
+    Candidates are found in batch by `python manage.py detect_duplicate_patients`;
+    filter with ?status=Pending to get the review queue.
+    """
+    queryset = DuplicatePatientCandidate.objects.select_related('patient_a', 'patient_b', 'reviewed_by')
+    serializer_class = DuplicatePatientCandidateSerializer
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin]
+    filterset_fields = ['status', 'patient_a', 'patient_b']
+
+
+class DuplicatePatientCandidateReviewView(generics.RetrieveUpdateAPIView):
+    """
+    Confirms or dismisses a duplicate candidate by setting its status.
+    """
+    queryset = DuplicatePatientCandidate.objects.select_related('patient_a', 'patient_b', 'reviewed_by')
+    serializer_class = DuplicatePatientCandidateSerializer
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin]
+
+    def perform_update(self, serializer):
+        reviewed = serializer.validated_data.get('status', serializer.instance.status) != 'Pending'
+        serializer.save(
+            reviewed_by=self.request.user if reviewed else None,
+            reviewed_at=timezone.now() if reviewed else None
+        )
+
+
+class PatientChartView(generics.RetrieveAPIView):
+    """
+    A patient's chart in one response: demographics plus the most recent
+    entries of every clinical section. Each section is one prefetch query
+    sliced per patient, so the query count doesn't grow with the chart.
+    """
+    serializer_class = PatientChartSerializer
+    permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
+
+    def get_queryset(self):
+        limit = getattr(settings, 'PATIENT_CHART_SECTION_LIMIT', 20)
+        visits = PatientVisit.objects.select_related('attending_physician', 'vitals').order_by('-visit_date', '-id')
+        prescriptions = Prescription.objects.select_related('medication', 'prescribed_by').order_by('-prescription_date', '-id')
+        return Patient.objects.annotate(
+            allergy_count=count_subquery(Allergy.objects.filter(patient=OuterRef('pk'))),
+            medical_history_count=count_subquery(MedicalHistory.objects.filter(patient=OuterRef('pk'))),
+            past_procedure_count=count_subquery(PastProcedure.objects.filter(patient=OuterRef('pk'))),
+            visit_count=count_subquery(PatientVisit.objects.filter(patient=OuterRef('pk'))),
+        ).prefetch_related(
+            Prefetch('allergies', queryset=Allergy.objects.order_by('allergen')[:limit], to_attr='recent_allergies'),
+            Prefetch(
+                'medical_history', queryset=MedicalHistory.objects.order_by('-diagnosis_date', '-id')[:limit],
+                to_attr='recent_medical_history'
+            ),
+            Prefetch(
+                'past_procedures', queryset=PastProcedure.objects.order_by('-procedure_date', '-id')[:limit],
+                to_attr='recent_past_procedures'
+            ),
+            Prefetch('visits', queryset=visits[:limit], to_attr='recent_visits'),
+            Prefetch('recent_visits__prescriptions', queryset=prescriptions),
+        )
+
 # --- Allergy Views ---
-class AllergyListCreateView(generics.ListCreateAPIView):
-    queryset = Allergy.objects.all()
+class AllergyListCreateView(BulkCreateMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = Allergy.objects.select_related('patient')
     serializer_class = AllergySerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
-class AllergyRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Allergy.objects.all()
+class AllergyRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Allergy.objects.select_related('patient')
     serializer_class = AllergySerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
 
+class ClinicalSearchIndexMixin:
+    """
+    Indexes bulk created visits, medical history and past procedures for
+    clinical search; bulk_create() skips the post_save signal that would.
+    """
+    def perform_bulk_create(self, instances):
+        instances = super().perform_bulk_create(instances)
+        index_clinical_records(instances)
+        return instances
+
+
 # --- MedicalHistory Views ---
-class MedicalHistoryListCreateView(generics.ListCreateAPIView):
-    queryset = MedicalHistory.objects.all()
+class MedicalHistoryListCreateView(ClinicalSearchIndexMixin, BulkCreateMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = MedicalHistory.objects.select_related('patient')
     serializer_class = MedicalHistorySerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
-class MedicalHistoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = MedicalHistory.objects.all()
+class MedicalHistoryRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MedicalHistory.objects.select_related('patient')
     serializer_class = MedicalHistorySerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
 
 # --- PastProcedure Views ---
-class PastProcedureListCreateView(generics.ListCreateAPIView):
-    queryset = PastProcedure.objects.all()
+class PastProcedureListCreateView(ClinicalSearchIndexMixin, BulkCreateMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = PastProcedure.objects.select_related('patient')
     serializer_class = PastProcedureSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
-class PastProcedureRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = PastProcedure.objects.all()
+class PastProcedureRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = PastProcedure.objects.select_related('patient')
     serializer_class = PastProcedureSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
 
 # --- PatientVisit Views ---
-class PatientVisitListCreateView(generics.ListCreateAPIView):
-    queryset = PatientVisit.objects.all()
+class PatientVisitListCreateView(ClinicalSearchIndexMixin, BulkCreateMixin, ConditionalGetMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = PatientVisit.objects.select_related('patient', 'attending_physician')
     serializer_class = PatientVisitSerializer
+    pagination_class = VisitDateCursorPagination
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
-class PatientVisitRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = PatientVisit.objects.all()
+class PatientVisitRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = PatientVisit.objects.select_related('patient', 'attending_physician')
     serializer_class = PatientVisitSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
 
 # --- Vitals Views ---
-class VitalsListCreateView(generics.ListCreateAPIView):
-    queryset = Vitals.objects.all()
+class VitalsListCreateView(BulkCreateMixin, generics.ListCreateAPIView):
+    queryset = Vitals.objects.select_related('patient_visit__patient')
     serializer_class = VitalsSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
 class VitalsRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Vitals.objects.all()
+    queryset = Vitals.objects.select_related('patient_visit__patient')
     serializer_class = VitalsSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
 
 
 # --- Medication Views ---
-class MedicationListCreateView(generics.ListCreateAPIView):
+class MedicationListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     queryset = Medication.objects.all()
     serializer_class = MedicationSerializer
     permission_classes = [IsAuthenticated, IsPharmacist | IsSuperAdmin | IsFacilityAdmin | IsDoctor | IsNurse]
 
-class MedicationRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class MedicationRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Medication.objects.all()
     serializer_class = MedicationSerializer
     permission_classes = [IsAuthenticated, IsPharmacist | IsSuperAdmin | IsFacilityAdmin | IsDoctor | IsNurse]
 
 
 # --- Prescription Views ---
-class PrescriptionListCreateView(generics.ListCreateAPIView):
-    queryset = Prescription.objects.all()
+class PrescriptionListCreateView(ConditionalGetMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = Prescription.objects.select_related('medication', 'patient_visit__patient', 'prescribed_by')
     serializer_class = PrescriptionSerializer
     permission_classes = [IsAuthenticated, IsPharmacist | IsSuperAdmin | IsFacilityAdmin | IsDoctor]
 
@@ -278,76 +492,81 @@ class PrescriptionListCreateView(generics.ListCreateAPIView):
         else:
             serializer.save()
 
-class PrescriptionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Prescription.objects.all()
+class PrescriptionRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Prescription.objects.select_related('medication', 'patient_visit__patient', 'prescribed_by')
     serializer_class = PrescriptionSerializer
     permission_classes = [IsAuthenticated, IsPharmacist | IsSuperAdmin | IsFacilityAdmin | IsDoctor]
 
-class PatientPrescriptionListView(generics.ListAPIView):
+class PatientPrescriptionListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = PrescriptionSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
     def get_queryset(self):
-        patient_id = self.kwargs['patient_id']
-        return Prescription.objects.filter(patient__id=patient_id).order_by('-prescribed_date')
+        patient_id = self.kwargs['patient_pk']
+        return Prescription.objects.filter(patient_visit__patient_id=patient_id).select_related(
+            'medication', 'patient_visit__patient', 'prescribed_by'
+        ).order_by('-prescription_date')
 
 
 # --- Adverse Drug Reaction (ADR) Views ---
-class AdverseDrugReactionListCreateView(generics.ListCreateAPIView):
-    queryset = AdverseDrugReaction.objects.all()
+class AdverseDrugReactionListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = AdverseDrugReaction.objects.select_related('patient', 'medication', 'reported_by')
     serializer_class = AdverseDrugReactionSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class AdverseDrugReactionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = AdverseDrugReaction.objects.all()
+class AdverseDrugReactionRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = AdverseDrugReaction.objects.select_related('patient', 'medication', 'reported_by')
     serializer_class = AdverseDrugReactionSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- Adverse Event Following Immunization (AEFI) Views ---
-class AdverseEventFollowingImmunizationListCreateView(generics.ListCreateAPIView):
-    queryset = AdverseEventFollowingImmunization.objects.all()
+class AdverseEventFollowingImmunizationListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = AdverseEventFollowingImmunization.objects.select_related('patient', 'reported_by')
     serializer_class = AdverseEventFollowingImmunizationSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class AdverseEventFollowingImmunizationRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = AdverseEventFollowingImmunization.objects.all()
+class AdverseEventFollowingImmunizationRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = AdverseEventFollowingImmunization.objects.select_related('patient', 'reported_by')
     serializer_class = AdverseEventFollowingImmunizationSerializer
     permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- Order History Views ---
-class OrderHistoryListCreateView(generics.ListCreateAPIView):
-    queryset = OrderHistory.objects.all()
+class OrderHistoryListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = OrderHistory.objects.select_related('order', 'changed_by')
     serializer_class = OrderHistorySerializer
+    pagination_class = ChangeDateCursorPagination
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class OrderHistoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = OrderHistory.objects.all()
+class OrderHistoryRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = OrderHistory.objects.select_related('order', 'changed_by')
     serializer_class = OrderHistorySerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
 
 # --- Payment Transaction Views ---
-class PaymentTransactionListCreateView(generics.ListCreateAPIView):
-    queryset = PaymentTransaction.objects.all()
+class PaymentTransactionListCreateView(ConditionalGetMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = PaymentTransaction.objects.select_related('patient', 'prescription', 'processed_by')
     serializer_class = PaymentTransactionSerializer
+    pagination_class = TransactionDateCursorPagination
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsNurse]
 
-class PaymentTransactionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = PaymentTransaction.objects.all()
+class PaymentTransactionRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = PaymentTransaction.objects.select_related('patient', 'prescription', 'processed_by')
     serializer_class = PaymentTransactionSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsNurse]
 
 
 # --- Inventory History Views ---
-class InventoryHistoryListCreateView(generics.ListCreateAPIView):
-    queryset = InventoryHistory.objects.all()
+class InventoryHistoryListCreateView(ConditionalGetMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = InventoryHistory.objects.select_related('stock_item', 'processed_by')
     serializer_class = InventoryHistorySerializer
+    pagination_class = TransactionDateCursorPagination
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
-class InventoryHistoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = InventoryHistory.objects.all()
+class InventoryHistoryRetrieveUpdateDestroyView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = InventoryHistory.objects.select_related('stock_item', 'processed_by')
     serializer_class = InventoryHistorySerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
 
@@ -363,7 +582,7 @@ class ReorderSuggestionView(generics.ListAPIView):
         three_months_from_now = date.today() + timedelta(days=90)
         
         # Q objects allow for complex OR queries
-        queryset = StockItem.objects.filter(
+        queryset = StockItem.objects.select_related('supplier').filter(
             Q(current_stock__lt=Q('min_stock_level')) | Q(expiry_date__lte=three_months_from_now, expiry_date__isnull=False)
         ).distinct().order_by('name') # Use distinct to avoid duplicates if an item meets both criteria
         
@@ -583,13 +802,44 @@ class MedicationDispenseView(APIView):
 
 
 # --- Inventory Reporting ---
-class StockLevelReportView(generics.ListAPIView):
+STOCK_ITEM_EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('name', 'name'),
+    ('current_stock', 'current_stock'),
+    ('unit', 'unit'),
+    ('reorder_level', 'reorder_level'),
+    ('expiry_date', 'expiry_date'),
+    ('purchase_price', 'purchase_price'),
+    ('sale_price', 'sale_price'),
+    ('supplier_name', 'supplier__name'),
+    ('location', 'location'),
+    ('is_active', 'is_active'),
+)
+
+
+def parse_report_date_range(query_params):
+    """
+    The (start_date, end_date) a report request asks for; raises ParseError when missing or malformed.
+    """
+    start_date_str = query_params.get('start_date')
+    end_date_str = query_params.get('end_date')
+    if not start_date_str or not end_date_str:
+        raise ParseError("Both 'start_date' and 'end_date' query parameters are required (YYYY-MM-DD).")
+    try:
+        return date.fromisoformat(start_date_str), date.fromisoformat(end_date_str)
+    except ValueError:
+        raise ParseError("Invalid date format. Please use YYYY-MM-DD.")
+
+
+class StockLevelReportView(ReportExportMixin, generics.ListAPIView):
     serializer_class = StockItemSerializer
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
+    export_columns = STOCK_ITEM_EXPORT_COLUMNS
+    export_filename = 'stock-level-report'
 
     def get_queryset(self):
         # By default, return all stock items
-        queryset = StockItem.objects.all().order_by('name')
+        queryset = StockItem.objects.select_related('supplier').order_by('name')
 
         # Filter by minimum stock level
         min_stock_level_param = self.request.query_params.get('min_stock_level', None)
@@ -616,77 +866,106 @@ class StockLevelReportView(generics.ListAPIView):
 
         return queryset
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
+    def stock_level_response(self, items):
+        if not items:
             return Response({"detail": "No stock items match the criteria."}, status=status.HTTP_200_OK)
 
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_serializer(items, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @cached_report
+    def list(self, request, *args, **kwargs):
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.stream_export(self.get_queryset(), export_format)
 
-class MedicationUsageReportView(generics.ListAPIView):
-    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsDoctor]
-
-    def get(self, request, *args, **kwargs):
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        if not start_date_str or not end_date_str:
-            return Response({"detail": "Both 'start_date' and 'end_date' query parameters are required (YYYY-MM-DD)."},
-                            status=status.HTTP_400_BAD_REQUEST)
+        return self.stock_level_response(list(self.get_queryset()))
 
-        try:
-            start_date = date.fromisoformat(start_date_str)
-            end_date = date.fromisoformat(end_date_str)
-        except ValueError:
-            return Response({"detail": "Invalid date format. Please use YYYY-MM-DD."},
-                            status=status.HTTP_400_BAD_REQUEST)
 
+class MedicationUsageReportView(ReportExportMixin, generics.ListAPIView):
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsDoctor]
+    export_columns = (
+        ('medication_name', 'stock_item__name'),
+        ('total_dispensed_quantity', 'total_dispensed_quantity'),
+        ('unit', 'stock_item__unit'),
+    )
+    export_filename = 'medication-usage-report'
+
+    def get_usage_queryset(self, start_date, end_date):
         # Filter inventory history for 'Out' transactions within the date range
         # and group by stock item to sum up dispensed quantities
-        usage_data = InventoryHistory.objects.filter(
+        return InventoryHistory.objects.filter(
             transaction_type='Out',
             transaction_date__date__range=[start_date, end_date]
-        ).values('stock_item__name', 'stock_item__unit_of_measure').annotate(
-            total_dispensed_quantity=models.Sum(models.F('quantity_change') * -1) # Convert negative to positive
+        ).values('stock_item__name', 'stock_item__unit').annotate(
+            total_dispensed_quantity=Sum(F('quantity_change') * -1) # Convert negative to positive
         ).order_by('stock_item__name')
 
-        if not usage_data.exists():
+    def get_job_queryset(self, params):
+        # Used by background report jobs; raises KeyError/ValueError on bad params.
+        return self.get_usage_queryset(date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date']))
+
+    def usage_response(self, usage_rows):
+        if not usage_rows:
             return Response({"detail": "No medication usage data found for the specified period."},
                             status=status.HTTP_200_OK)
 
         report = []
-        for item in usage_data:
+        for item in usage_rows:
             report.append({
                 "medication_name": item['stock_item__name'],
                 "total_dispensed_quantity": item['total_dispensed_quantity'],
-                "unit_of_measure": item['stock_item__unit_of_measure']
+                "unit_of_measure": item['stock_item__unit']
             })
 
         return Response(report, status=status.HTTP_200_OK)
 
+    @cached_report
+    def get(self, request, *args, **kwargs):
+        usage_data = self.get_usage_queryset(*parse_report_date_range(request.query_params))
 
-class ExpiringMedicationsReportView(generics.ListAPIView):
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.stream_export(usage_data, export_format)
+
+        return self.usage_response(list(usage_data))
+
+
+# Expiry horizon buckets as (label, first day, last day) offsets from today.
+EXPIRY_BUCKETS = (
+    ('expired', None, -1),
+    ('0_30_days', 0, 30),
+    ('31_60_days', 31, 60),
+    ('61_90_days', 61, 90),
+    ('91_180_days', 91, 180),
+)
+EXPIRY_HORIZON_DAYS = EXPIRY_BUCKETS[-1][2]
+
+
+class ExpiringMedicationsReportView(ReportExportMixin, generics.ListAPIView):
+    """
+    Without `bucket`, returns item counts, quantities and value at purchase
+    price per expiry bucket and facility, from one grouped aggregate.
+    With `?bucket=<label>`, returns the matching stock items, paginated.
+    """
     serializer_class = StockItemSerializer
+    pagination_class = ReportPagination
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist]
+    export_columns = STOCK_ITEM_EXPORT_COLUMNS
+    export_filename = 'expiring-medications-report'
+    report_facility_scoped = True # Cached per facility, see get_queryset()
 
     def get_queryset(self):
-        # Default to showing medications expiring within the next 6 months
-        months = self.request.query_params.get('months', 6)
-        try:
-            months = int(months)
-            if months < 0:
-                months = 0 # Ensure non-negative
-        except ValueError:
-            months = 6 # Fallback to default
-
-        expiry_threshold_date = date.today() + timedelta(days=months * 30) # Approximate months
-
+        today = date.today()
         queryset = StockItem.objects.filter(
-            expiry_date__lte=expiry_threshold_date,
-            expiry_date__isnull=False # Ensure expiry_date is not null
-        ).order_by('expiry_date')
+            expiry_date__isnull=False, # Ensure expiry_date is not null
+            expiry_date__lte=today + timedelta(days=EXPIRY_HORIZON_DAYS)
+        )
+
+        # Staff only see their own facility; super admins may pick one
+        facility_id = effective_facility_id(self.request)
+        if facility_id is not None:
+            queryset = queryset.filter(facility_id=facility_id)
 
         # Optional: filter by minimum current stock (e.g., only show if > 0)
         min_stock = self.request.query_params.get('min_stock', None)
@@ -697,25 +976,190 @@ class ExpiringMedicationsReportView(generics.ListAPIView):
             except ValueError:
                 pass # Ignore invalid min_stock parameter
 
-        return queryset
+        bucket = self.request.query_params.get('bucket')
+        for label, first_day, last_day in EXPIRY_BUCKETS:
+            if label == bucket:
+                if first_day is not None:
+                    queryset = queryset.filter(expiry_date__gte=today + timedelta(days=first_day))
+                queryset = queryset.filter(expiry_date__lte=today + timedelta(days=last_day))
+
+        # Matches the (facility, expiry_date) index
+        return queryset.select_related('supplier').order_by('facility_id', 'expiry_date', 'id')
+
+    def get_bucket(self, request):
+        bucket = request.query_params.get('bucket')
+        if bucket is not None and bucket not in [label for label, _, _ in EXPIRY_BUCKETS]:
+            raise ParseError(f"Invalid bucket. Choose one of: {', '.join(label for label, _, _ in EXPIRY_BUCKETS)}.")
+        return bucket
+
+    def get_bucket_summary_rows(self, queryset):
+        today = date.today()
+        bucket_case = Case(
+            *[
+                When(expiry_date__lte=today + timedelta(days=last_day), then=Value(label))
+                for label, _, last_day in EXPIRY_BUCKETS
+            ],
+            output_field=CharField(),
+        )
+        return queryset.order_by().annotate(expiry_bucket=bucket_case).values(
+            'facility_id', 'facility__name', 'expiry_bucket'
+        ).annotate(
+            item_count=Count('id'),
+            total_quantity=Sum('current_stock'),
+            value_at_purchase_price=Sum(
+                F('current_stock') * F('purchase_price'), output_field=DecimalField(max_digits=14, decimal_places=2)
+            ),
+        )
+
+    def get_bucket_summary(self, rows):
+        facilities = {}
+        for row in rows:
+            facility = facilities.setdefault(row['facility_id'], {
+                "facility_id": row['facility_id'],
+                "facility_name": row['facility__name'],
+                "buckets": {
+                    label: {"item_count": 0, "total_quantity": Decimal('0.00'), "value_at_purchase_price": Decimal('0.00')}
+                    for label, _, _ in EXPIRY_BUCKETS
+                },
+            })
+            facility['buckets'][row['expiry_bucket']] = {
+                "item_count": row['item_count'],
+                "total_quantity": row['total_quantity'] or Decimal('0.00'),
+                "value_at_purchase_price": row['value_at_purchase_price'] or Decimal('0.00'),
+            }
+        return sorted(facilities.values(), key=lambda facility: facility['facility_name'] or '')
+
+    def bucket_summary_response(self, rows):
+        return Response({
+            "as_of": date.today().isoformat(),
+            "buckets": [label for label, _, _ in EXPIRY_BUCKETS],
+            "facilities": self.get_bucket_summary(rows),
+        }, status=status.HTTP_200_OK)
 
+    @cached_report
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
-            return Response({"detail": "No expiring medications found for the specified criteria."}, status=status.HTTP_200_OK)
+        bucket = self.get_bucket(request)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.stream_export(self.get_queryset(), export_format)
+
+        if bucket:
+            page = self.paginate_queryset(self.get_queryset())
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
 
+        return self.bucket_summary_response(self.get_bucket_summary_rows(self.get_queryset()))
 
-class InsuranceDispensingReportView(generics.ListAPIView):
+
+class InsuranceDispensingReportView(ReportExportMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsNurse]
+    pagination_class = ReportPagination
+    report_fields = (
+        'transaction_id', 'transaction_date', 'patient_name', 'patient_id', 'medication_name',
+        'total_amount_billed', 'amount_covered_by_insurance', 'patient_paid_amount',
+        'insurance_policy_number', 'processed_by_username',
+    )
+    export_columns = tuple((field, field) for field in report_fields)
+    export_filename = 'insurance-dispensing-report'
+
+    def get_report_queryset(self, start_date, end_date, patient_id=None, insurance_policy_number=None):
+        # Filter payment transactions where payment_method is 'Insurance'
+        # and within the specified date range.
+        queryset = PaymentTransaction.objects.filter(
+            payment_method='Insurance',
+            transaction_date__date__range=[start_date, end_date]
+        )
+        if patient_id is not None:
+            queryset = queryset.filter(patient_id=patient_id)
+        if insurance_policy_number:
+            queryset = queryset.filter(insurance_policy_number__icontains=insurance_policy_number)
+        return queryset
 
+    def get_report_rows(self, queryset):
+        # Project only the report columns; the joins to patient, medication and
+        # processing user are resolved in the same SELECT.
+        return queryset.values(
+            'transaction_date', 'patient_id', 'amount_covered_by_insurance',
+            'patient_paid_amount', 'insurance_policy_number',
+            transaction_id=F('id'),
+            patient_name=Concat('patient__first_name', Value(' '), 'patient__last_name'),
+            medication_name=Coalesce('prescription__medication__name', Value('N/A')),
+            total_amount_billed=F('amount'),
+            processed_by_username=Coalesce('processed_by__username', Value('N/A')),
+        ).order_by('-transaction_date', '-id')
+
+    def get_job_queryset(self, params):
+        # Used by background report jobs; raises KeyError/ValueError on bad params.
+        patient_id = params.get('patient_id')
+        queryset = self.get_report_queryset(
+            date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date']),
+            int(patient_id) if patient_id else None, params.get('policy_number'),
+        )
+        return self.get_report_rows(queryset)
+
+    def get_request_queryset(self, request):
+        start_date, end_date = parse_report_date_range(request.query_params)
+        patient_id = request.query_params.get('patient_id')
+        if patient_id:
+            try:
+                patient_id = int(patient_id)
+            except ValueError:
+                raise ParseError("Invalid patient_id. Must be an integer.")
+        return self.get_report_queryset(start_date, end_date, patient_id or None, request.query_params.get('policy_number'))
+
+    def get_total_aggregates(self):
+        # Totals and the row count come from a single aggregate; the count is
+        # reused by the paginator so the page itself is the only other query.
+        return dict(
+            transaction_count=Count('id'),
+            total_amount_billed=Coalesce(Sum('amount'), Value(Decimal('0.00'))),
+            total_covered_by_insurance=Coalesce(Sum('amount_covered_by_insurance'), Value(Decimal('0.00'))),
+            total_patient_paid=Coalesce(Sum('patient_paid_amount'), Value(Decimal('0.00'))),
+        )
+
+    @cached_report
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_request_queryset(request)
+        rows = self.get_report_rows(queryset)
+
+        export_format = self.get_export_format(request)
+        if export_format:
+            return self.stream_export(rows, export_format)
+
+        totals = queryset.aggregate(**self.get_total_aggregates())
+        page = self.paginator.paginate_counted_queryset(rows, request, totals.pop('transaction_count'), view=self)
+        response = self.get_paginated_response(page)
+        response.data['totals'] = totals
+        return response
+
+
+# --- Pharmacovigilance ---
+class PharmacovigilanceSignalListView(generics.ListAPIView):
+    """
+    Disproportionality signals flagged over the ADR and AEFI reports, strongest first.
+    Signals are recomputed in batch by `python manage.py detect_pv_signals`.
+    """
+    queryset = PharmacovigilanceSignal.objects.all()
+    serializer_class = PharmacovigilanceSignalSerializer
+    permission_classes = [IsAuthenticated, IsDoctor | IsPharmacist | IsSuperAdmin | IsFacilityAdmin]
+    filterset_fields = ['source', 'medication']
+    search_fields = ['product_name', 'reaction_term']
+
+
+# --- Regional Analytics ---
+class FacilityComparisonView(APIView):
+    """
+    Ranks facilities by stock-outs, dispensing volume, revenue and visits over a period.
+    Expects start_date and end_date (YYYY-MM-DD) and optionally facilities=1,2,3.
+    Rank 1 is the facility with the highest value; percentiles run from 0 (lowest) to 1.
+    """
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsRegionalManager]
+
+    @cached_report
     def get(self, request, *args, **kwargs):
         start_date_str = request.query_params.get('start_date')
         end_date_str = request.query_params.get('end_date')
-        patient_id = request.query_params.get('patient_id')
-        insurance_policy_number = request.query_params.get('policy_number')
 
         if not start_date_str or not end_date_str:
             return Response({"detail": "Both 'start_date' and 'end_date' query parameters are required (YYYY-MM-DD)."},
@@ -728,40 +1172,225 @@ class InsuranceDispensingReportView(generics.ListAPIView):
             return Response({"detail": "Invalid date format. Please use YYYY-MM-DD."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # Filter payment transactions where payment_method is 'Insurance'
-        # and within the specified date range.
-        queryset = PaymentTransaction.objects.filter(
-            payment_method='Insurance',
-            transaction_date__date__range=[start_date, end_date]
-        ).select_related('patient', 'prescription__medication').order_by('-transaction_date')
-
-        if patient_id:
+        facility_ids = None
+        facilities_param = request.query_params.get('facilities')
+        if facilities_param:
             try:
-                queryset = queryset.filter(patient__id=patient_id)
+                facility_ids = [int(facility_id) for facility_id in facilities_param.split(',')]
             except ValueError:
-                return Response({"detail": "Invalid patient_id. Must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"detail": "Invalid facilities. Use a comma-separated list of facility IDs."},
+                                status=status.HTTP_400_BAD_REQUEST)
 
-        if insurance_policy_number:
-            queryset = queryset.filter(insurance_policy_number__icontains=insurance_policy_number)
+        return Response({
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "facilities": compare_facilities(start_date, end_date, facility_ids),
+        }, status=status.HTTP_200_OK)
 
-        if not queryset.exists():
-            return Response({"detail": "No insurance dispensing records found for the specified criteria."},
-                            status=status.HTTP_200_OK)
 
-        report_data = []
-        for transaction in queryset:
-            report_data.append({
-                "transaction_id": transaction.id,
-                "transaction_date": transaction.transaction_date.isoformat(),
-                "patient_name": transaction.patient.get_full_name(),
-                "patient_id": transaction.patient.id,
-                "medication_name": transaction.prescription.medication.name if transaction.prescription and transaction.prescription.medication else "N/A",
-                "quantity_dispensed": transaction.prescription.quantity_dispensed if transaction.prescription else "N/A",
-                "total_amount_billed": transaction.amount,
-                "amount_covered_by_insurance": transaction.amount_covered_by_insurance,
-                "patient_paid_amount": transaction.patient_paid_amount,
-                "insurance_policy_number": transaction.insurance_policy_number,
-                "processed_by": transaction.processed_by.username if transaction.processed_by else "N/A"
-            })
+# --- Background Report Jobs ---
+class ReportJobListCreateView(generics.ListCreateAPIView):
+    """
+    Queues a report to be computed by the `run_report_jobs` worker and lists the caller's jobs.
+    """
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsDoctor | IsNurse]
+
+    def get_queryset(self):
+        queryset = ReportJob.objects.select_related('requested_by')
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(requested_by=self.request.user)
 
-        return Response(report_data, status=status.HTTP_200_OK)
\ No newline at end of file
+    def perform_create(self, serializer):
+        # A job may only be queued by someone allowed to run the report directly.
+        report_view = get_report_view_class(serializer.validated_data['report_type'])()
+        for permission in report_view.permission_classes:
+            if not permission().has_permission(self.request, report_view):
+                raise PermissionDenied("You do not have permission to run this report.")
+        serializer.save(requested_by=self.request.user, facility=self.request.user.facility)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+class ReportJobRetrieveView(generics.RetrieveAPIView):
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsPharmacist | IsDoctor | IsNurse]
+
+    def get_queryset(self):
+        queryset = ReportJob.objects.select_related('requested_by')
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(requested_by=self.request.user)
+
+
+class ReportJobDownloadView(ReportJobRetrieveView):
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != 'Completed':
+            return Response({"detail": f"Report job is {job.status.lower()}; nothing to download yet.", "status": job.status},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            result = open(job.result_file, 'rb')
+        except OSError:
+            return Response({"detail": "Report file is no longer available."}, status=status.HTTP_410_GONE)
+        content_type = 'text/csv' if job.output_format == 'csv' else 'application/x-ndjson'
+        return FileResponse(result, as_attachment=True, filename=f'{job.report_type}-{job.id}.{job.output_format}', content_type=content_type)
+
+
+# --- Sync Views ---
+class SyncChangesView(APIView):
+    """
+    Delta sync for offline clients: records created, updated or deleted since
+    the change token `?since=` (0 for a full download), oldest first.
+
+    JSON responses hold up to `?limit=` changes with the `next_token` to pass
+    next time; `?format=ndjson` streams every pending change instead, ending
+    with a {"next_token": ...} line. Staff receive their own facility's records
+    plus the shared ones (patients, medications); super admins may pick a
+    facility with `?facility=`.
+    """
+    permission_classes = [IsAuthenticated, IsSuperAdmin | IsFacilityAdmin | IsDoctor | IsNurse | IsPharmacist]
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONStreamRenderer]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            token = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', DEFAULT_SYNC_PAGE_SIZE)), MAX_SYNC_PAGE_SIZE)
+        except ValueError:
+            return Response({"detail": "since and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if token < 0 or limit < 1:
+            return Response({"detail": "since must be 0 or more and limit at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Staff only sync their own facility; super admins may pick one
+        facility_id = effective_facility_id(request)
+
+        if getattr(request.accepted_renderer, 'format', None) == NDJSONStreamRenderer.format:
+            return StreamingHttpResponse(
+                iter_sync_stream(token, facility_id),
+                content_type=f'{NDJSONStreamRenderer.media_type}; charset={NDJSONStreamRenderer.charset}',
+            )
+
+        entries = list(changes_since(token, facility_id)[:limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        return Response({
+            "changes": render_changes(entries),
+            "next_token": entries[-1][0] if entries else token,
+            "has_more": has_more,
+        })
+
+
+# --- Batch Views ---
+class BatchView(APIView):
+    """
+    Runs a JSON array of {method, path, body, headers} sub-requests against this
+    API in one round trip, e.g. [{"method": "GET", "path": "/api/facilities/"}].
+    Responds with their {status, headers, body} results in the same order; each
+    sub-request is checked by its own view's permissions.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        specs = request.data
+        if not isinstance(specs, list) or not specs:
+            return Response({"detail": "Expected a non-empty list of sub-requests."}, status=status.HTTP_400_BAD_REQUEST)
+        max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(specs) > max_requests:
+            return Response(
+                {"detail": f"A batch may contain at most {max_requests} sub-requests."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(run_batch(request, specs), status=status.HTTP_200_OK)
+
+
+# --- Autocomplete Views ---
+class StockAutocompleteView(APIView):
+    """
+    As-you-type lookup of stock items and medications: ?q= matches the start
+    of any word of the name, e.g. ?q=amox&limit=5. Served from an in-memory
+    index per process (see api/autocomplete.py). Staff see their own
+    facility's entries plus the shared ones; super admins may pick a facility
+    with `?facility=`.
+    """
+    permission_classes = [IsAuthenticated, IsPharmacist | IsSuperAdmin | IsFacilityAdmin | IsDoctor | IsNurse]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_AUTOCOMPLETE_LIMIT)), MAX_AUTOCOMPLETE_LIMIT)
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"detail": "limit must be at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Staff only see their own facility; super admins may pick one
+        facility_id = effective_facility_id(request)
+
+        return Response(autocomplete(query, limit, facility_id))
+
+
+# --- Clinical Search Views ---
+class ClinicalSearchView(APIView):
+    """
+    Full-text search over visit reasons, diagnoses and notes, medical history
+    and past procedures: ?q=malaria, optionally with start_date/end_date
+    (YYYY-MM-DD, inclusive), type (comma-separated: visit, medical_history,
+    past_procedure), ordering=-date for newest first, and limit/offset.
+    Snippets are HTML-escaped with the matches in <mark> tags. Staff see
+    their own facility's visits plus the patient-level records; super admins
+    may pick a facility with `?facility=`.
+    """
+    permission_classes = [IsAuthenticated, IsDoctor | IsNurse | IsSuperAdmin | IsFacilityAdmin]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        query = params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(params.get('limit', DEFAULT_CLINICAL_SEARCH_LIMIT)), MAX_CLINICAL_SEARCH_LIMIT)
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            return Response({"detail": "limit and offset must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or offset < 0:
+            return Response({"detail": "limit must be at least 1 and offset not negative."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else None
+            end_date = date.fromisoformat(params['end_date']) if params.get('end_date') else None
+        except ValueError:
+            return Response({"detail": "Invalid date format. Please use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        types = [kind.strip() for kind in params.get('type', '').split(',') if kind.strip()]
+        unknown = [kind for kind in types if kind not in CLINICAL_TYPES]
+        if unknown:
+            return Response(
+                {"detail": f"Unknown type {unknown[0]!r}; choose from {', '.join(CLINICAL_TYPES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ordering = params.get('ordering', 'rank')
+        if ordering not in ('rank', '-date'):
+            return Response({"detail": "ordering must be 'rank' or '-date'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Staff only see their own facility; super admins may pick one
+        facility_id = effective_facility_id(request)
+
+        # One extra result tells whether there is a next page.
+        results = get_clinical_search_backend().search(
+            query, facility_id=facility_id, start_date=start_date, end_date=end_date, types=types,
+            ordering=ordering, limit=limit + 1, offset=offset
+        )
+        next_url = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+
+        patients = Patient.objects.only('first_name', 'last_name').in_bulk({result['patient'] for result in results})
+        for result in results:
+            patient = patients.get(result['patient'])
+            result['patient_name'] = patient.get_full_name() if patient else None
+        return Response({"next": next_url, "results": results})
@@ -3,6 +3,9 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Uses the ASGI profile (healthlink_backend.settings_asgi), which serves the
+read-heavy and report endpoints through their async variants.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -11,6 +14,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthlink_backend.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthlink_backend.settings_asgi')
 
 application = get_asgi_application()
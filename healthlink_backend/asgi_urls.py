@@ -0,0 +1,10 @@
+# healthlink_backend/asgi_urls.py
+# URLconf of the ASGI profile: the async API variants shadow their synchronous routes.
+from django.urls import path, include
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.async_urls')),
+    *sync_urlpatterns,
+]
@@ -104,6 +104,67 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per-process; point this at a shared backend (file-based,
+# memcached, redis) when running more than one worker so report
+# invalidation reaches every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'healthlink-default',
+    }
+}
+
+# Cached report bodies expire after this many seconds even if no ledger
+# write has invalidated them.
+REPORT_CACHE_ALIAS = 'default'
+REPORT_CACHE_TIMEOUT = 300
+FACILITY_DASHBOARD_CACHE_TIMEOUT = 30
+
+# Delta sync holds back changes logged after one that may still be
+# uncommitted; a missing change log id older than this is a rolled back insert.
+SYNC_COMMIT_GRACE_SECONDS = 60
+
+# Where background report jobs (python manage.py run_report_jobs) write their output.
+REPORT_JOB_ROOT = BASE_DIR / 'report_jobs'
+# A running report job not updated for this long is taken to have lost its
+# worker and is queued again; keep it above the longest report's run time.
+REPORT_JOB_STALE_SECONDS = 3600
+
+# Pharmacovigilance signal thresholds (python manage.py detect_pv_signals).
+PV_SIGNAL_MIN_CASES = 3
+PV_SIGNAL_MIN_PRR = 2.0
+PV_SIGNAL_MIN_CHI_SQUARED = 4.0
+
+# Entries returned per section by /patients/<id>/chart/ (most recent first).
+PATIENT_CHART_SECTION_LIMIT = 20
+
+# Largest JSON array accepted by the bulk create endpoints.
+BULK_CREATE_MAX_ITEMS = 500
+
+# /batch/: sub-requests per batch, and threads for runs of read-only sub-requests
+# (1 keeps every sub-request on the request thread and its DB connection).
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 1
+
+# Patient search (?name= on /patients/): 'btree' for prefix matching on the
+# indexed token table, or 'fts5' for SQLite full-text search ranked by bm25.
+# Run python manage.py rebuild_search_index after switching to 'fts5'.
+PATIENT_SEARCH_BACKEND = 'btree'
+
+# Clinical notes search (/search/clinical/): 'fts5' for SQLite full-text
+# search, or 'scan' for substring matching on databases without FTS5.
+# None picks 'fts5' on SQLite and 'scan' elsewhere.
+# Run python manage.py rebuild_search_index after switching to 'fts5'.
+CLINICAL_SEARCH_BACKEND = None
+
+# Lowest similarity (0-1) at which python manage.py detect_duplicate_patients
+# queues a pair of patient records for review.
+DEDUP_MIN_SCORE = 0.9
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -147,7 +208,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.JWTAuthentication', # simplejwt's, loading role and facility with the user
         'rest_framework.authentication.SessionAuthentication',
         # 'rest_framework.authentication.TokenAuthentication', # Keep or remove based on your preference
     ),
@@ -159,6 +220,8 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
+        'api.fieldsets.ExpansionFilter', # ?expand= select_related / prefetch_related plan
+        'api.fieldsets.SparseFieldsetFilter', # ?fields= / ?omit= column projection; keep last
     ),
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
@@ -169,6 +232,16 @@ REST_FRAMEWORK = {
 # Specify the custom user model
 AUTH_USER_MODEL = 'api.User'
 
+# Session users are loaded with their role and facility, like JWT users.
+AUTHENTICATION_BACKENDS = ['api.authentication.SelectRelatedModelBackend']
+
+# Authenticate JWTs from their signed role, facility and super admin claims
+# instead of loading the user on every request. Revoked tokens are refused in
+# either mode; each process reloads the denylist every
+# JWT_DENYLIST_REFRESH_SECONDS, so a revocation made elsewhere applies within that.
+JWT_STATELESS_AUTH = False
+JWT_DENYLIST_REFRESH_SECONDS = 30
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(hours=1),  # Set to 1 hour for easier testing
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -193,6 +266,8 @@ SIMPLE_JWT = {
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
     "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_OBTAIN_SERIALIZER": "api.authentication.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.authentication.ClaimsTokenRefreshSerializer",
 
     "JTI_CLAIM": "jti",
 
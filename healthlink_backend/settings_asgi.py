@@ -0,0 +1,17 @@
+"""
+ASGI deployment profile for healthlink_backend.
+
+Serves the read-heavy and report endpoints through their async variants
+(api/async_views.py), so a slow report awaits the database instead of holding
+one of a fixed number of worker threads. Run it under an ASGI server, e.g.
+
+    uvicorn healthlink_backend.asgi:application --workers 4
+
+healthlink_backend/asgi.py selects this module unless DJANGO_SETTINGS_MODULE
+is already set.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+ROOT_URLCONF = 'healthlink_backend.asgi_urls'